@@ -0,0 +1,144 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+class UserCache:
+    """
+    Thread-safe LRU of user rows with a time to live.
+
+    Rows are stored as field values and every hit builds a new instance,
+    so a request mutating request.user can't leak into another one.
+    Entries are dropped when the user is saved or deleted (see the receivers
+    in accounts.models); the TTL bounds how long another process, or a
+    queryset update that sends no signal, can serve a stale row.
+
+    Lookups pass the `iat` of the token, and a row read before the token
+    was issued is a miss: a token issued after a password change or a
+    reactivation in another process is checked against a row read since,
+    up to the one second resolution of `iat`.
+    """
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped by every invalidation, a row read before one is not stored
+        self.generation = 0
+
+    def get(self, user_id, issued_at=None):
+        # Tokens carry the id as a string, keys are normalized to match
+        user_id = str(user_id)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            expires, read_at, db, field_names, values = entry
+            if expires <= time.monotonic():
+                del self.entries[user_id]
+                return None
+            if issued_at is not None and read_at < issued_at:
+                return None
+            self.entries.move_to_end(user_id)
+        return get_user_model().from_db(db, field_names, values)
+
+    def stamp(self):
+        """
+        Take before reading a row to `set`: the generation, so a row read
+        across an invalidation isn't stored, and the time of the read.
+        """
+        with self.lock:
+            return self.generation, time.time()
+
+    def set(self, user_id, user, stamp):
+        user_id = str(user_id)
+        generation, read_at = stamp
+        fields = user._meta.concrete_fields
+        entry = (
+            time.monotonic() + self.ttl,
+            read_at,
+            user._state.db,
+            [field.attname for field in fields],
+            [getattr(user, field.attname) for field in fields],
+        )
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[user_id] = entry
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+user_cache = UserCache(
+    max_size=getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+)
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from `user_cache`, so
+    authenticated requests only query the database for their own data.
+    The active and password-change checks still run on every request.
+
+    `aauthenticate` is the same for async views: token validation doesn't
+    touch the database and a cache miss reads the user with the async ORM.
+    """
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        user = user_cache.get(user_id, validated_token.get('iat')) if user_id is not None else None
+        if user is None:
+            stamp = user_cache.stamp()
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user, stamp)
+            return user
+        return self.check_user(user, validated_token)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        user = user_cache.get(user_id, validated_token.get('iat'))
+        if user is None:
+            stamp = user_cache.stamp()
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, user, stamp)
+        return self.check_user(user, validated_token)
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
@@ -0,0 +1,64 @@
+"""
+Helpers of the user typeahead (`/users/lookup/?q=`).
+
+Names are matched on their normalized form, stored in UserLookupKey, with
+an index range scan: `key >= prefix AND key < next_prefix`. Results for a
+prefix are the same for everyone and cached under a global version that
+is replaced whenever a user's names change.
+"""
+
+import hashlib
+import unicodedata
+import uuid
+
+from django.db import transaction
+
+from project_management.response_cache import get_cache
+
+VERSION_KEY = 'user-lookup-version'
+RESULTS_KEY = 'user-lookup:{}:{}:{}'
+
+
+def normalize_lookup(value):
+    """
+    Case and accent insensitive form of a name: decomposed, stripped of
+    combining marks, casefolded and with whitespace collapsed.
+    """
+    decomposed = unicodedata.normalize('NFKD', value)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def prefix_range(prefix):
+    """
+    Bounds of the keys starting with `prefix`, lower inclusive, upper exclusive.
+    """
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def get_lookup_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump_version():
+    get_cache().set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def invalidate_lookups():
+    """
+    Drop every cached lookup result, now and again on commit, like
+    invalidate_user_lists.
+    """
+    _bump_version()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(_bump_version)
+
+
+def get_results_key(prefix, limit):
+    digest = hashlib.sha1(prefix.encode()).hexdigest()
+    return RESULTS_KEY.format(get_lookup_version(), limit, digest)
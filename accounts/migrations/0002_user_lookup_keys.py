@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:37
+
+import unicodedata
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalize(value):
+    decomposed = unicodedata.normalize('NFKD', value)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def create_lookup_keys(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserLookupKey = apps.get_model('accounts', 'UserLookupKey')
+    users = User.objects.order_by('pk').values_list('pk', 'username', 'first_name', 'last_name')
+    batch = []
+    for pk, username, first_name, last_name in users.iterator(chunk_size=2000):
+        names = [username, first_name, last_name, f'{first_name} {last_name}']
+        batch += [UserLookupKey(user_id=pk, key=key[:255]) for key in {normalize(name) for name in names} if key]
+        if len(batch) >= 2000:
+            UserLookupKey.objects.bulk_create(batch)
+            batch = []
+    UserLookupKey.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLookupKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lookup_keys', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['key', 'user'], name='user_lookup_key_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'key'), name='unique_user_lookup_key')],
+            },
+        ),
+        migrations.RunPython(create_lookup_keys, migrations.RunPython.noop),
+    ]
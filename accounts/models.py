@@ -1,7 +1,10 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from project_management.response_cache import invalidate_user_lists
+from .authentication import user_cache
+from .lookup import invalidate_lookups, normalize_lookup, prefix_range
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -13,6 +16,66 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s profile"
 
+class UserLookupKey(models.Model):
+    """
+    Normalized names a user can be found by: the username, first name, last
+    name and full name. The typeahead matches prefixes with a range scan of
+    the (key, user) index, which icontains can't use.
+    """
+    LOOKUP_FIELDS = ('username', 'first_name', 'last_name')
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='lookup_keys')
+    key = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['key', 'user'], name='user_lookup_key_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_user_lookup_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} -> {self.user_id}"
+
+    @classmethod
+    def keys_for(cls, user):
+        names = [user.username, user.first_name, user.last_name, f'{user.first_name} {user.last_name}']
+        return {key[:255] for key in map(normalize_lookup, names) if key}
+
+    @classmethod
+    def build(cls, users):
+        """
+        Unsaved keys of `users`, for bulk inserts.
+        """
+        return [cls(user_id=user.pk, key=key) for user in users for key in cls.keys_for(user)]
+
+    @classmethod
+    def sync(cls, user):
+        """
+        Replace the keys of `user` if its names changed.
+        """
+        keys = cls.keys_for(user)
+        existing = set(cls.objects.filter(user=user).values_list('key', flat=True))
+        if keys != existing:
+            cls.objects.filter(user=user, key__in=existing - keys).delete()
+            cls.objects.bulk_create([cls(user=user, key=key) for key in keys - existing])
+            invalidate_lookups()
+
+    @classmethod
+    def match(cls, prefix, limit, user_ids=None):
+        """
+        Ids of up to `limit` users with a name starting with `prefix`,
+        ordered by the matching name. `user_ids` restricts the search.
+        """
+        low, high = prefix_range(prefix)
+        keys = cls.objects.filter(key__gte=low, key__lt=high)
+        if user_ids is not None:
+            keys = keys.filter(user_id__in=user_ids)
+        # A user has at most four keys, this many rows hold `limit` users
+        matched = keys.order_by('key', 'user_id').values_list('user_id', flat=True)[:limit * 4]
+        return list(dict.fromkeys(matched))[:limit]
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -20,4 +83,36 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save() 
\ No newline at end of file
+    instance.profile.save()
+
+@receiver(pre_save, sender=User)
+def load_previous_is_active(sender, instance, update_fields=None, **kwargs):
+    if not instance._state.adding and (update_fields is None or 'is_active' in update_fields):
+        instance._previous_is_active = User.objects.filter(
+            pk=instance.pk
+        ).values_list('is_active', flat=True).first()
+
+@receiver(post_save, sender=User)
+def sync_lookup_keys(sender, instance, update_fields=None, **kwargs):
+    # Logins only save last_login
+    if update_fields is None or set(update_fields) & set(UserLookupKey.LOOKUP_FIELDS):
+        UserLookupKey.sync(instance)
+    # Inactive users are left out of the results, which don't change keys
+    previous_is_active = getattr(instance, '_previous_is_active', None)
+    if previous_is_active is not None and previous_is_active != instance.is_active:
+        invalidate_lookups()
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_lookups(sender, instance, **kwargs):
+    invalidate_lookups()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+@receiver(post_save, sender=User)
+def reset_user_lists(sender, instance, created, **kwargs):
+    # Ids can be reused after a rollback, a new user starts without cached lists
+    if created:
+        invalidate_user_lists([instance.pk])
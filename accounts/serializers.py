@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from project_management.serializers import DynamicFieldsMixin
 from .models import UserProfile
 
 class UserProfileSerializer(serializers.ModelSerializer):
@@ -7,7 +8,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = UserProfile
         fields = ['bio', 'position', 'created_at', 'updated_at']
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer(read_only=True)
     password = serializers.CharField(write_only=True)
 
@@ -28,7 +29,7 @@ class UserSerializer(serializers.ModelSerializer):
         )
         return user
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserUpdateSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer()
 
     class Meta:
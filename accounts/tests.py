@@ -1,8 +1,16 @@
+import time
+from unittest import mock
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from datetime import date
+from projects.models import Project
+from .authentication import user_cache
 from .models import UserProfile
 
 class AccountsTests(TestCase):
@@ -62,4 +70,97 @@ class AccountsTests(TestCase):
         self.user.refresh_from_db()
         self.profile.refresh_from_db()
         self.assertEqual(self.user.first_name, 'Updated')
-        self.assertEqual(self.profile.position, 'Developer') 
\ No newline at end of file
+        self.assertEqual(self.profile.position, 'Developer') 
+
+    def test_cached_jwt_authentication(self):
+        """Test token users are cached and invalidated when the user changes"""
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse('user-profile')
+        user_table = User._meta.db_table
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(any(f'FROM "{user_table}"' in query['sql'] for query in queries))
+
+        # Saving the user drops the cached row
+        self.user.first_name = 'Changed'
+        self.user.save()
+        self.assertEqual(self.client.get(url).data['first_name'], 'Changed')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # An update that sends no signal, as from another process, leaves
+        # the cached row behind until the TTL. Tokens issued after the row
+        # was read skip it
+        self.user.is_active = True
+        self.user.save()
+        token = AccessToken.for_user(self.user)
+        token['iat'] = int(time.time()) - 60
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with mock.patch.object(user_cache, 'stamp', return_value=(user_cache.generation, time.time() - 30)):
+            self.client.get(url)
+        User.objects.filter(pk=self.user.pk).update(first_name='Updated')
+        self.assertEqual(self.client.get(url).data['first_name'], 'Changed')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(self.client.get(url).data['first_name'], 'Updated')
+
+    def test_user_lookup(self):
+        """Test the typeahead matches name prefixes and ranks project members first"""
+        names = [('zoe', 'Zoë', 'Ångström'), ('zack', 'Zack', 'Smith'), ('zed', 'Zed', 'Zimmer')]
+        zoe, zack, zed = [
+            User.objects.create_user(username=username, first_name=first, last_name=last, password='pass12345')
+            for username, first, last in names
+        ]
+        project = Project.objects.create(
+            title='Project', description='Description', manager=self.user,
+            start_date=date.today(), end_date=date.today()
+        )
+        project.members.add(zed)
+        self.client.force_authenticate(user=self.user)
+        url = reverse('user-lookup')
+
+        def lookup(query):
+            response = self.client.get(f'{url}?{query}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [user['username'] for user in response.data]
+
+        self.assertEqual(lookup('q=Z'), ['zack', 'zed', 'zoe'])
+        self.assertEqual(lookup('q=angs'), ['zoe'])
+        self.assertEqual(lookup('q=ZOE ang'), ['zoe'])
+        self.assertEqual(lookup('q=smi'), ['zack'])
+        self.assertEqual(lookup('q='), [])
+        self.assertEqual(lookup(f'q=z&project={project.id}'), ['zed', 'zack', 'zoe'])
+        self.assertEqual(lookup(f'q=z&project={project.id}&limit=2'), ['zed', 'zack'])
+        response = self.client.get(f'{url}?q=z')
+        self.assertEqual(response.data[0], {'id': zack.id, 'username': 'zack', 'name': 'Zack Smith'})
+
+        # Hot prefixes are served from the cache until a name changes
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(lookup('q=z'), ['zack', 'zed', 'zoe'])
+        self.assertEqual(len(queries), 0)
+        zack.first_name, zack.last_name = 'Adam', 'Jones'
+        zack.save()
+        self.assertEqual(lookup('q=z'), ['zack', 'zed', 'zoe'])
+        self.assertEqual(lookup('q=smi'), [])
+        self.assertEqual(lookup('q=jon'), ['zack'])
+
+        # Deactivated users leave the cached results, and come back
+        zed.is_active = False
+        zed.save()
+        self.assertEqual(lookup('q=z'), ['zack', 'zoe'])
+        zed.is_active = True
+        zed.save(update_fields=['is_active'])
+        self.assertEqual(lookup('q=z'), ['zack', 'zed', 'zoe'])
+
+        other = Project.objects.create(
+            title='Other', description='Description', manager=zoe,
+            start_date=date.today(), end_date=date.today()
+        )
+        self.assertEqual(self.client.get(f'{url}?q=z&project={other.id}').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(f'{url}?q=z&limit=100').status_code, status.HTTP_400_BAD_REQUEST)
+
@@ -1,11 +1,12 @@
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import RegisterView, UserProfileView, UserListView
+from .views import RegisterView, UserProfileView, UserListView, UserLookupView
 
 urlpatterns = [
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('users/profile/', UserProfileView.as_view(), name='user-profile'),
+    path('users/lookup/', UserLookupView.as_view(), name='user-lookup'),
     path('users/', UserListView.as_view(), name='user-list'),
 ] 
\ No newline at end of file
@@ -1,7 +1,12 @@
 from rest_framework import generics, permissions, status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth.models import User
+from projects.models import ProjectMembership
+from project_management.response_cache import cache_stats, get_cache
+from .lookup import get_results_key, normalize_lookup
+from .models import UserLookupKey
 from .serializers import UserSerializer, UserUpdateSerializer
 
 class RegisterView(generics.CreateAPIView):
@@ -17,7 +22,84 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 class UserListView(generics.ListAPIView):
-    queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAuthenticated,)
-    search_fields = ['username', 'first_name', 'last_name', 'email'] 
\ No newline at end of file
+    search_fields = ['username', 'first_name', 'last_name', 'email']
+
+    def get_queryset(self):
+        queryset = User.objects.all()
+        if UserSerializer.wants(self.request, 'profile'):
+            queryset = queryset.select_related('profile')
+        return queryset
+
+class UserLookupView(generics.GenericAPIView):
+    """
+    Typeahead for assignee and member pickers: users whose username, first,
+    last or full name starts with `?q=`, as id, username and name only.
+    `?project=` puts the project's members first, `?limit=` caps the
+    results. Results for a prefix are cached for everyone.
+    """
+    permission_classes = (permissions.IsAuthenticated,)
+    default_limit = 10
+    max_limit = 20
+    cache_timeout = 300
+
+    def get(self, request, *args, **kwargs):
+        prefix = normalize_lookup(request.query_params.get('q', ''))
+        limit = self.get_int_param('limit', self.default_limit)
+        if not 1 <= limit <= self.max_limit:
+            raise ValidationError({'limit': f'Must be between 1 and {self.max_limit}.'})
+        project_id = self.get_int_param('project', None)
+        if project_id is not None and not ProjectMembership.objects.filter(
+            project_id=project_id, user=request.user
+        ).exists():
+            raise NotFound('Project not found.')
+        if not prefix:
+            return Response([])
+
+        cache = get_cache()
+        key = get_results_key(prefix, limit)
+        results = cache.get(key)
+        cache_stats.record(type(self).__name__, results is not None)
+        if results is None:
+            results = self.get_users(UserLookupKey.match(prefix, limit))
+            cache.set(key, results, self.cache_timeout)
+
+        if project_id is not None:
+            member_ids = UserLookupKey.match(
+                prefix, limit, ProjectMembership.objects.filter(project_id=project_id).values('user_id')
+            )
+            users = {user['id']: user for user in results}
+            users.update((user['id'], user) for user in self.get_users(
+                [user_id for user_id in member_ids if user_id not in users]
+            ))
+            members = [users[user_id] for user_id in member_ids if user_id in users]
+            results = members + [user for user in results if user['id'] not in member_ids]
+        return Response(results[:limit])
+
+    def get_int_param(self, name, default):
+        value = self.request.query_params.get(name)
+        if value is None:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({name: 'A valid integer is required.'})
+
+    def get_users(self, user_ids):
+        """
+        The lookup projection of `user_ids`, in the same order.
+        """
+        if not user_ids:
+            return []
+        rows = User.objects.filter(pk__in=user_ids, is_active=True).values('id', 'username', 'first_name', 'last_name')
+        users = {
+            row['id']: {
+                'id': row['id'],
+                'username': row['username'],
+                'name': f"{row['first_name']} {row['last_name']}".strip(),
+            }
+            for row in rows
+        }
+        return [users[user_id] for user_id in user_ids if user_id in users]
+
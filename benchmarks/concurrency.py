@@ -0,0 +1,114 @@
+"""
+Sync against async notification views under concurrent polling.
+
+Both versions of each read endpoint are served from NOTIFICATION_URLCONF
+through Django's async request handler, the code path of an ASGI server,
+to `concurrency` clients requesting at once. Everything runs in this
+process: the synchronous views and the async views' queries all run in
+the one thread that owns the database connection, so the comparison shows
+how much of a request each version keeps off that thread.
+"""
+
+import asyncio
+import json
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.test import AsyncClient
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from notifications.models import Notification, NotificationCounter
+from .suite import percentile
+
+NOTIFICATION_URLCONF = 'benchmarks.notification_urls'
+
+class NotificationBenchmark:
+    """
+    Sends `requests` requests to every endpoint in each version, as `user`,
+    by default the user with the most unread notifications. An endpoint
+    fails when its two versions answer differently.
+    """
+    def __init__(self, user=None, requests=500, concurrency=50):
+        self.requests = requests
+        self.concurrency = concurrency
+        self.user = user or self.busiest_user()
+        self.notification = Notification.objects.filter(recipient=self.user).first()
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def busiest_user(self):
+        counter = NotificationCounter.objects.select_related('user').order_by('-unread_count').first()
+        if counter is None:
+            raise ValueError('No notifications to benchmark, run seed_load first.')
+        return counter.user
+
+    def endpoints(self):
+        """
+        Return [(label, url name, kwargs, query string)].
+        """
+        endpoints = [
+            ('notification-list', 'notification-list', {}, ''),
+            ('notification-list?cursor=', 'notification-list', {}, '?cursor='),
+            ('unread-notification-count', 'unread-notification-count', {}, ''),
+        ]
+        if self.notification is not None:
+            endpoints.append(('notification-update', 'notification-update', {'pk': self.notification.pk}, ''))
+        return endpoints
+
+    def run(self):
+        # The async test client always sends Host: testserver
+        allowed_hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(ROOT_URLCONF=NOTIFICATION_URLCONF, ALLOWED_HOSTS=allowed_hosts):
+            return async_to_sync(self.arun)()
+
+    async def arun(self):
+        client = AsyncClient()
+        results = []
+        for label, name, kwargs, query in self.endpoints():
+            result = {'name': label, 'failures': []}
+            payloads = {}
+            for variant in ('sync', 'async'):
+                url = reverse(f'{variant}-{name}', kwargs=kwargs, urlconf=NOTIFICATION_URLCONF) + query
+                # The first request also warms the response cache
+                response = await client.get(url, headers=self.headers)
+                if response.status_code != 200:
+                    result['failures'].append(f'{url} answered {response.status_code}')
+                    continue
+                payloads[variant] = self.payload(response)
+                result[variant] = await self.measure(client, url)
+            if len(payloads) == 2 and payloads['sync'] != payloads['async']:
+                result['failures'].append('sync and async views answered differently')
+            results.append(result)
+        return results
+
+    def payload(self, response):
+        data = json.loads(response.content)
+        # Links point at each version's own URL
+        if isinstance(data, dict):
+            data.pop('next', None)
+            data.pop('previous', None)
+        return data
+
+    async def measure(self, client, url):
+        timings = []
+        remaining = self.requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                await client.get(url, headers=self.headers)
+                timings.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - started
+        return {
+            'requests_per_second': round(len(timings) / elapsed, 1),
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+        }
@@ -0,0 +1,65 @@
+import json
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks.suite import BenchmarkSuite
+
+class Command(BaseCommand):
+    help = (
+        'Time every API route and check its SQL query budget. Fails when a '
+        'route goes over budget or its p95 regresses against --baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--user', help='Username to run as, defaults to the manager of the largest project')
+        parser.add_argument('--password', help="The user's password, enables the login benchmark")
+        parser.add_argument('--baseline', help='JSON results of a previous run to compare p95 latency against')
+        parser.add_argument('--save', help='Write the results as JSON to this file')
+        parser.add_argument('--max-regression', type=float, default=0.25,
+                            help='Allowed p95 increase over the baseline, as a fraction')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'User {options["user"]} does not exist')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline_file:
+                baseline = {result['name']: result for result in json.load(baseline_file)}
+
+        try:
+            suite = BenchmarkSuite(
+                user=user,
+                password=options['password'],
+                iterations=options['iterations'],
+                baseline=baseline,
+                max_regression=options['max_regression'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        results = suite.run()
+
+        self.stdout.write(f'{"route":32} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8}')
+        for result in results:
+            if 'skipped' in result:
+                line = f'{result["name"]:32} skipped: {result["skipped"]}'
+            elif 'p50_ms' in result:
+                line = (f'{result["name"]:32} {result["p50_ms"]:9.2f} {result["p95_ms"]:9.2f} '
+                        f'{result["queries"]:>4}/{result["budget"]:<3}')
+            else:
+                line = f'{result["name"]:32}'
+            self.stdout.write(line)
+            for failure in result['failures']:
+                self.stdout.write(self.style.ERROR(f'    {failure}'))
+
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+
+        failed = [result['name'] for result in results if result['failures']]
+        if failed:
+            raise CommandError(f'{len(failed)} routes failed: {", ".join(failed)}')
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} routes within budget'))
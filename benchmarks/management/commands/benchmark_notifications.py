@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from benchmarks.concurrency import NotificationBenchmark
+
+class Command(BaseCommand):
+    help = (
+        'Compare the sync and async notification views under concurrent '
+        'requests, reporting throughput and p50/p95 latency of each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and version')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--user', help='Username to run as, defaults to the user with the most unread notifications')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'User {options["user"]} does not exist')
+
+        try:
+            benchmark = NotificationBenchmark(
+                user=user,
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        results = benchmark.run()
+
+        self.stdout.write(
+            f'{"endpoint":28} {"version":7} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9}'
+        )
+        for result in results:
+            for variant in ('sync', 'async'):
+                if variant in result:
+                    timing = result[variant]
+                    self.stdout.write(
+                        f'{result["name"]:28} {variant:7} {timing["requests_per_second"]:9.1f} '
+                        f'{timing["p50_ms"]:9.2f} {timing["p95_ms"]:9.2f}'
+                    )
+            for failure in result['failures']:
+                self.stdout.write(self.style.ERROR(f'    {failure}'))
+
+        failed = [result['name'] for result in results if result['failures']]
+        if failed:
+            raise CommandError(f'{len(failed)} endpoints failed: {", ".join(failed)}')
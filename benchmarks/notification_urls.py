@@ -0,0 +1,23 @@
+"""
+URLconf serving the sync and async notification views side by side, for
+the notification benchmark.
+"""
+
+from django.urls import path
+from notifications.views import (
+    NotificationListView, NotificationUpdateView, UnreadNotificationCountView,
+    AsyncNotificationListView, AsyncNotificationUpdateView, AsyncUnreadNotificationCountView
+)
+
+def variant(prefix, list_view, update_view, unread_count_view):
+    return [
+        path(f'{prefix}/notifications/', list_view.as_view(), name=f'{prefix}-notification-list'),
+        path(f'{prefix}/notifications/<int:pk>/', update_view.as_view(), name=f'{prefix}-notification-update'),
+        path(f'{prefix}/notifications/unread-count/', unread_count_view.as_view(),
+             name=f'{prefix}-unread-notification-count'),
+    ]
+
+urlpatterns = (
+    variant('sync', NotificationListView, NotificationUpdateView, UnreadNotificationCountView)
+    + variant('async', AsyncNotificationListView, AsyncNotificationUpdateView, AsyncUnreadNotificationCountView)
+)
@@ -0,0 +1,238 @@
+"""
+Synthetic data for load testing.
+
+Rows are written with bulk_create in batches, so model signals don't run.
+Everything they would have maintained (profiles, project memberships,
+dashboard stats, activity counters, unread counters and the search index)
+is written or rebuilt here instead.
+"""
+
+import random
+import secrets
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from accounts.models import UserLookupKey, UserProfile
+from notifications.models import Notification, NotificationCounter, ProjectReadWatermark
+from projects.models import Project, ProjectLog, ProjectMembership
+from search.backends import get_search_backend
+from tasks.models import Task, Comment, TaskLog, rebuild_activity_counters, rebuild_project_stats
+
+# Vocabulary of generated titles and text, short enough to make search hits likely
+WORDS = (
+    'api backend bug build cache client deploy design docs feature fix frontend '
+    'index login migration mobile onboarding payment performance release report '
+    'review schema search security sprint test upgrade'
+).split()
+
+class SeedLoader:
+    """
+    Generates `users`, `projects`, `tasks`, `comments` and `notifications`
+    rows. Tasks are spread over the projects and assigned to their members,
+    comments over the tasks; every batch is written in its own transaction
+    so memory stays bounded by `batch_size` whatever the volumes.
+    """
+    STATUSES = [status for status, _ in Task.STATUS_CHOICES]
+    NOTIFICATION_TYPES = [kind for kind, _ in Notification.NOTIFICATION_TYPES]
+
+    def __init__(self, users, projects, tasks, comments, notifications,
+                 members_per_project=8, batch_size=5000, password='seed-password',
+                 seed=None, log=None):
+        self.counts = {
+            'users': users,
+            'projects': projects,
+            'tasks': tasks,
+            'comments': comments,
+            'notifications': notifications,
+        }
+        self.members_per_project = members_per_project
+        self.batch_size = batch_size
+        self.password = password
+        self.random = random.Random(seed)
+        self.log = log or (lambda message: None)
+        self.run = secrets.token_hex(3)
+        self.search = get_search_backend()
+
+    def load(self):
+        if self.counts['users'] < 1 or (self.counts['tasks'] and self.counts['projects'] < 1):
+            raise ValueError('Seeding needs at least one user, and a project for tasks.')
+        self.user_ids = self.create_users()
+        self.project_members = self.create_projects()
+        self.task_range = self.create_tasks()
+        self.create_notifications()
+        self.rebuild_derived()
+        return self.counts
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield range(start, min(start + self.batch_size, total))
+
+    def create_users(self):
+        # Hashing is the slow part of creating users, they all share one
+        password = make_password(self.password)
+        user_ids = []
+        for batch in self.batches(self.counts['users']):
+            users = [
+                User(username=f'seed-{self.run}-{i}', email=f'seed-{self.run}-{i}@example.com',
+                     first_name='Seed', last_name=f'User {i}', password=password)
+                for i in batch
+            ]
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+                UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+                UserLookupKey.objects.bulk_create(UserLookupKey.build(users))
+            user_ids += [user.pk for user in users]
+        self.log(f'{len(user_ids)} users')
+        return user_ids
+
+    def create_projects(self):
+        """
+        Return {project_id: [member user ids]}, the manager first.
+        """
+        project_members = {}
+        today = date.today()
+        for batch in self.batches(self.counts['projects']):
+            projects = []
+            members = []
+            for i in batch:
+                team = self.random.sample(self.user_ids, min(len(self.user_ids), self.members_per_project + 1))
+                projects.append(Project(
+                    title=f'Project {i} {self.random.choice(WORDS)}',
+                    description=self.sentence(),
+                    manager_id=team[0],
+                    start_date=today - timedelta(days=self.random.randint(0, 365)),
+                    end_date=today + timedelta(days=self.random.randint(0, 365)),
+                ))
+                members.append(team)
+
+            with transaction.atomic():
+                Project.objects.bulk_create(projects)
+                through = Project.members.through
+                through.objects.bulk_create([
+                    through(project_id=project.pk, user_id=user_id)
+                    for project, team in zip(projects, members) for user_id in team[1:]
+                ])
+                ProjectMembership.objects.bulk_create([
+                    ProjectMembership(
+                        user_id=user_id, project_id=project.pk,
+                        role=ProjectMembership.ROLE_MANAGER if index == 0 else ProjectMembership.ROLE_MEMBER
+                    )
+                    for project, team in zip(projects, members) for index, user_id in enumerate(team)
+                ])
+                ProjectReadWatermark.objects.bulk_create([
+                    ProjectReadWatermark(user_id=user_id, project_id=project.pk)
+                    for project, team in zip(projects, members) for user_id in team[1:]
+                ])
+                ProjectLog.objects.bulk_create([
+                    ProjectLog(project=project, user_id=project.manager_id, action='created',
+                               details=f'Project "{project.title}" was created')
+                    for project in projects
+                ])
+                self.search.index(projects)
+            project_members.update({project.pk: team for project, team in zip(projects, members)})
+        self.log(f'{len(project_members)} projects')
+        return project_members
+
+    def create_tasks(self):
+        """
+        Create tasks with their logs and comments, return the range of task ids.
+        """
+        project_ids = list(self.project_members)
+        total_tasks = self.counts['tasks']
+        comments_left = self.counts['comments']
+        first_id = last_id = None
+        today = date.today()
+
+        for batch in self.batches(total_tasks):
+            tasks = []
+            for i in batch:
+                project_id = self.random.choice(project_ids)
+                tasks.append(Task(
+                    title=f'Task {i} {self.random.choice(WORDS)}',
+                    description=self.sentence(),
+                    project_id=project_id,
+                    assigned_to_id=self.random.choice(self.project_members[project_id]),
+                    status=self.random.choice(self.STATUSES),
+                    due_date=today + timedelta(days=self.random.randint(-60, 120)),
+                    is_pinned=self.random.random() < 0.05,
+                ))
+
+            # Comments are spread evenly over the remaining batches
+            remaining_tasks = total_tasks - batch.start
+            batch_comments = comments_left * len(batch) // remaining_tasks
+            comments_left -= batch_comments
+
+            with transaction.atomic():
+                Task.objects.bulk_create(tasks)
+                TaskLog.objects.bulk_create([
+                    TaskLog(task=task, user_id=task.assigned_to_id, action='created',
+                            details=f'Task "{task.title}" was created')
+                    for task in tasks
+                ])
+                comments = []
+                for _ in range(batch_comments):
+                    task = self.random.choice(tasks)
+                    comments.append(Comment(
+                        task=task,
+                        user_id=self.random.choice(self.project_members[task.project_id]),
+                        content=self.sentence()
+                    ))
+                for start in range(0, len(comments), self.batch_size):
+                    chunk = comments[start:start + self.batch_size]
+                    Comment.objects.bulk_create(chunk)
+                    self.search.index(chunk)
+                self.search.index(tasks)
+
+            first_id = tasks[0].pk if first_id is None else first_id
+            last_id = tasks[-1].pk
+            self.log(f'{batch.stop}/{total_tasks} tasks')
+
+        # Comments need tasks, none are left over otherwise
+        self.counts['comments'] -= comments_left
+        return (first_id, last_id) if first_id is not None else None
+
+    def create_notifications(self):
+        task_type = ContentType.objects.get_for_model(Task)
+        project_type = ContentType.objects.get_for_model(Project)
+        project_ids = list(self.project_members)
+        total = self.counts['notifications']
+
+        for batch in self.batches(total):
+            notifications = []
+            for _ in batch:
+                kind = self.random.choice(self.NOTIFICATION_TYPES)
+                # Project events are broadcasts, stored once per project
+                recipient_id, project_id = self.random.choice(self.user_ids), None
+                if kind.startswith('task') and self.task_range:
+                    content_type, object_id = task_type, self.random.randint(*self.task_range)
+                else:
+                    content_type, object_id = project_type, self.random.choice(project_ids)
+                    recipient_id, project_id = None, object_id
+                notifications.append(Notification(
+                    recipient_id=recipient_id,
+                    project_id=project_id,
+                    notification_type=kind,
+                    title=kind.replace('_', ' ').capitalize(),
+                    message=self.sentence(),
+                    is_read=project_id is None and self.random.random() < 0.7,
+                    content_type=content_type,
+                    object_id=object_id,
+                ))
+            Notification.objects.bulk_create(notifications)
+            self.log(f'{batch.stop}/{total} notifications')
+
+    def rebuild_derived(self):
+        project_ids = list(self.project_members)
+        for start in range(0, len(project_ids), 500):
+            rebuild_project_stats(project_ids[start:start + 500])
+            rebuild_activity_counters(project_ids[start:start + 500])
+        for start in range(0, len(self.user_ids), 500):
+            NotificationCounter.rebuild(self.user_ids[start:start + 500])
+        self.log('Rebuilt project stats, activity counters and unread counters')
+
+    def sentence(self):
+        return ' '.join(self.random.choices(WORDS, k=self.random.randint(4, 12))).capitalize() + '.'
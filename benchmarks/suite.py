@@ -0,0 +1,210 @@
+"""
+Endpoint benchmark suite.
+
+Every named route under /api/v1/ must have an entry in ROUTES, either a
+query budget or the reason it is skipped, so new endpoints can't go
+unmeasured. Each route is requested `iterations` times through the test
+client with a real access token; the suite reports p50/p95 latency and the
+largest number of SQL queries a request ran, and fails a route that goes
+over its budget or whose p95 regressed past a baseline.
+"""
+
+import statistics
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from notifications.models import Notification
+from projects.models import Project, ProjectMembership
+from tasks.models import Comment
+
+API_PREFIX = 'api/v1/'
+
+class Route:
+    """
+    How to benchmark one named route. `kwargs` maps the fixtures to the
+    URL arguments, `data` builds the request body from them.
+    """
+    def __init__(self, budget=None, method='get', kwargs=None, query='', data=None, skip=None):
+        self.budget = budget
+        self.method = method
+        self.kwargs = kwargs or (lambda fixtures: {})
+        self.query = query
+        self.data = data
+        self.skip = skip
+
+def project_kwargs(fixtures):
+    return {'pk': fixtures['project'].pk}
+
+def task_kwargs(fixtures):
+    return {'pk': fixtures['task'].pk}
+
+ROUTES = {
+    'api-root': Route(budget=1),
+    'register': Route(skip='creates a user on every request'),
+    'token_obtain_pair': Route(budget=2, method='post', data=lambda fixtures: {
+        'username': fixtures['user'].username,
+        'password': fixtures['password'],
+    }),
+    'token_refresh': Route(budget=1, method='post', data=lambda fixtures: {
+        'refresh': fixtures['refresh'],
+    }),
+    'user-profile': Route(budget=2),
+    'user-list': Route(budget=2),
+    'user-lookup': Route(budget=2, query='?q=seed'),
+    'project-list': Route(budget=4),
+    'project-detail': Route(budget=3, kwargs=project_kwargs),
+    'project-logs': Route(budget=4, kwargs=project_kwargs),
+    'project-export': Route(budget=8, kwargs=project_kwargs),
+    'project-members': Route(skip='adds or removes members on every request'),
+    'project-stats': Route(budget=5, kwargs=project_kwargs),
+    'task-list': Route(budget=4),
+    'task-detail': Route(budget=3, kwargs=task_kwargs),
+    # Re-applies the tasks' current status, still logged and broadcast
+    'task-bulk': Route(budget=10, method='patch', data=lambda fixtures: [
+        {'id': task.pk, 'status': task.status} for task in fixtures['tasks']
+    ]),
+    'task-comments': Route(budget=5, kwargs=lambda fixtures: {'task_id': fixtures['task'].pk}),
+    'comment-detail': Route(budget=4, kwargs=lambda fixtures: {
+        'task_id': fixtures['comment'].task_id,
+        'pk': fixtures['comment'].pk,
+    }),
+    'notification-list': Route(budget=6),
+    'notification-update': Route(budget=1, kwargs=lambda fixtures: {'pk': fixtures['notification'].pk}),
+    'mark-all-notifications-read': Route(budget=5, method='post'),
+    'unread-notification-count': Route(budget=1),
+    'notification-stream-ticket': Route(budget=1, method='post'),
+    'notification-stream': Route(skip='long-lived Server-Sent Events stream'),
+    'cache-stats': Route(skip='staff only, reports in-process counters'),
+}
+
+def api_routes():
+    """
+    Return {name: pattern} of the named routes under API_PREFIX.
+    Format suffix variants of the router URLs are left out.
+    """
+    routes = {}
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            route = prefix + str(pattern.pattern)
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns, route)
+            elif isinstance(pattern, URLPattern) and pattern.name and 'format' not in pattern.pattern.regex.groupindex:
+                if route.lstrip('^').startswith(API_PREFIX):
+                    routes.setdefault(pattern.name, route)
+
+    walk(get_resolver().url_patterns, '')
+    return routes
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+class BenchmarkSuite:
+    """
+    Runs ROUTES as `user`, by default the manager of the project with the
+    most tasks. `baseline` maps route names to a previous run's results;
+    a route fails when its p95 exceeds the baseline by more than
+    `max_regression` (a fraction) and `min_regression_ms`.
+    """
+    def __init__(self, user=None, password=None, iterations=20, baseline=None,
+                 max_regression=0.25, min_regression_ms=2.0):
+        self.iterations = iterations
+        self.baseline = baseline or {}
+        self.max_regression = max_regression
+        self.min_regression_ms = min_regression_ms
+        self.fixtures = self.load_fixtures(user)
+        self.fixtures['password'] = password
+        self.client = APIClient(SERVER_NAME=self.server_name())
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.fixtures["access"]}')
+
+    def server_name(self):
+        # The test client's default host is only allowed under the test runner
+        hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host.lstrip('.*')]
+        return hosts[0] if hosts else 'localhost'
+
+    def load_fixtures(self, user):
+        projects = Project.objects.order_by(F('task_stats__task_count').desc(nulls_last=True), 'pk')
+        if user is not None:
+            projects = projects.filter(id__in=ProjectMembership.project_ids_for(user))
+        project = projects.select_related('manager').first()
+        if project is None:
+            raise ValueError('No project to benchmark, run seed_load first.')
+        user = user or project.manager
+
+        task = project.tasks.annotate(size=Count('comments')).order_by('-size', 'pk').first()
+        refresh = RefreshToken.for_user(user)
+        return {
+            'user': user,
+            'project': project,
+            'task': task,
+            'tasks': list(project.tasks.order_by('pk')[:50]),
+            # Comments can only be read back by their author
+            'comment': Comment.objects.filter(user=user, task__project=project).first(),
+            'notification': Notification.objects.filter(recipient=user).first(),
+            'refresh': str(refresh),
+            'access': str(refresh.access_token),
+        }
+
+    def run(self):
+        results = []
+        for name, pattern in sorted(api_routes().items()):
+            route = ROUTES.get(name)
+            if route is None:
+                results.append({'name': name, 'failures': [f'no benchmark declared for {pattern}']})
+            elif route.skip:
+                results.append({'name': name, 'skipped': route.skip, 'failures': []})
+            else:
+                results.append(self.run_route(name, route))
+        return results
+
+    def run_route(self, name, route):
+        result = {'name': name, 'failures': []}
+        try:
+            url = reverse(name, kwargs=route.kwargs(self.fixtures)) + route.query
+        except (AttributeError, TypeError):
+            result['skipped'] = 'no fixture rows for this route'
+            return result
+        body = route.data(self.fixtures) if route.data else None
+        if isinstance(body, dict) and any(value is None for value in body.values()):
+            result['skipped'] = 'no credentials for this route'
+            return result
+
+        timings = []
+        queries = 0
+        for _ in range(self.iterations):
+            data = route.data(self.fixtures) if route.data else None
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(self.client, route.method)(url, data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(captured))
+            if not 200 <= response.status_code < 300:
+                result['failures'].append(f'{url} answered {response.status_code}')
+                break
+
+        result.update({
+            'url': url,
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'queries': queries,
+            'budget': route.budget,
+        })
+        if queries > route.budget:
+            result['failures'].append(f'{queries} queries, budget is {route.budget}')
+
+        previous = self.baseline.get(name, {}).get('p95_ms')
+        if previous is not None:
+            limit = max(previous * (1 + self.max_regression), previous + self.min_regression_ms)
+            if result['p95_ms'] > limit:
+                result['failures'].append(f'p95 {result["p95_ms"]}ms regressed from {previous}ms')
+        return result
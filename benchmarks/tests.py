@@ -0,0 +1,66 @@
+import io
+from django.core.management import call_command
+from django.db.models import Sum
+from django.test import TestCase
+from notifications.models import Notification, NotificationCounter, ProjectReadWatermark
+from projects.models import Project, ProjectMembership
+from search.backends import get_search_backend
+from tasks.models import Task, Comment, ProjectTaskStats
+from .concurrency import NotificationBenchmark
+from .suite import ROUTES, BenchmarkSuite, api_routes
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        call_command(
+            'seed_load', users=20, projects=3, tasks=60, comments=150,
+            notifications=100, members_per_project=4, seed=1, stdout=io.StringIO()
+        )
+
+    def test_seed_load(self):
+        """Test seeded rows come with the tables their signals would maintain"""
+        self.assertEqual(Task.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 150)
+        self.assertEqual(Notification.objects.count(), 100)
+
+        self.assertEqual(ProjectMembership.objects.count(), 3 * 5)
+        self.assertEqual(ProjectReadWatermark.objects.count(), 3 * 4)
+        for project in Project.objects.all():
+            self.assertTrue(project.is_member(project.manager))
+        self.assertEqual(ProjectTaskStats.objects.aggregate(total=Sum('task_count'))['total'], 60)
+        self.assertEqual(
+            NotificationCounter.objects.aggregate(total=Sum('unread_count'))['total'],
+            Notification.objects.filter(recipient__isnull=False, is_read=False).count()
+        )
+
+        task = Task.objects.first()
+        pks = get_search_backend().search(Task, task.title)
+        if pks is not None:
+            self.assertIn(task.pk, pks)
+
+    def test_every_route_is_benchmarked(self):
+        """Test every API route declares a query budget or a reason to skip it"""
+        self.assertEqual(set(api_routes()) - set(ROUTES), set())
+
+    def test_benchmark_budgets(self):
+        """Test every benchmarked route stays within its query budget"""
+        results = BenchmarkSuite(iterations=2, password='seed-password').run()
+        self.assertEqual([(result['name'], result['failures']) for result in results if result['failures']], [])
+        measured = {result['name'] for result in results if 'queries' in result}
+        self.assertIn('task-list', measured)
+        self.assertIn('token_obtain_pair', measured)
+        self.assertIn('task-bulk', measured)
+
+    def test_latency_regression(self):
+        """Test a p95 far above the baseline fails the route"""
+        baseline = {'api-root': {'p95_ms': 0.0001}}
+        results = BenchmarkSuite(iterations=2, baseline=baseline, min_regression_ms=0).run()
+        failures = {result['name']: result['failures'] for result in results}
+        self.assertTrue(any('regressed' in failure for failure in failures['api-root']))
+
+    def test_notification_benchmark(self):
+        """Test the sync and async notification views are measured and answer alike"""
+        results = NotificationBenchmark(requests=4, concurrency=2).run()
+        self.assertEqual([(result['name'], result['failures']) for result in results if result['failures']], [])
+        for result in results:
+            self.assertGreater(result['sync']['requests_per_second'], 0)
+            self.assertGreater(result['async']['requests_per_second'], 0)
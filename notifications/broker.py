@@ -0,0 +1,95 @@
+"""
+Publish/subscribe used to push notifications to connected clients.
+
+The default broker only reaches subscribers in the current process. Set
+NOTIFICATIONS_BROKER to the dotted path of a class with the same interface
+(publish, has_subscribers, subscribe) to move delivery to an external
+broker when running several workers.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = 'notifications.broker.InProcessBroker'
+
+def user_topic(user_id):
+    return f'user:{user_id}'
+
+def project_topic(project_id):
+    return f'project:{project_id}'
+
+# Published to a user's topic when the projects they follow change, so
+# their open streams subscribe to the new set of project topics
+RESUBSCRIBE = {'resubscribe': True}
+
+class Subscription:
+    """
+    Messages published to a set of topics, consumed from a single event loop.
+    """
+    def __init__(self, broker, topics, maxsize):
+        self.broker = broker
+        self.topics = tuple(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def deliver(self, message):
+        # Runs on the subscriber's loop. A client that can't keep up loses
+        # messages instead of growing the queue; it can resync from the list.
+        if not self.queue.full():
+            self.queue.put_nowait(message)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+class InProcessBroker:
+    """
+    Fans published messages out to asyncio subscribers of this process.
+    publish() is thread-safe, so it can be called from sync request code.
+    An idle subscription is just a queue waiting on its event loop.
+    """
+    queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, topics):
+        subscription = Subscription(self, topics, self.queue_size)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscriptions.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[topic]
+
+    def has_subscribers(self, topic):
+        return topic in self._subscriptions
+
+    def publish(self, topic, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(topic, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The subscriber's loop is closed, the connection is gone
+                self.unsubscribe(subscription)
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'NOTIFICATIONS_BROKER', DEFAULT_BROKER))()
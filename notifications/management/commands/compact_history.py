@@ -0,0 +1,70 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from project_management.retention import POLICIES, get_policies
+
+class Command(BaseCommand):
+    help = (
+        'Delete notifications and activity logs older than their retention '
+        'period (HISTORY_RETENTION_DAYS), in primary key batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--policy', action='append', default=[], metavar='NAME=DAYS',
+                            help=f'Override a retention period, "none" keeps the rows. '
+                                 f'Policies: {", ".join(POLICIES)}')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Primary keys covered by each delete transaction')
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help='Seconds to sleep after each batch that deleted rows, to let live writes through')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='VACUUM afterwards to return the freed pages (SQLite locks the database meanwhile)')
+        parser.add_argument('--analyze', action='store_true',
+                            help='ANALYZE afterwards to refresh the query planner statistics')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        for policy in get_policies(self.parse_overrides(options['policy'])):
+            total = 0
+            started = time.perf_counter()
+            for first, last, deleted, seconds in policy.compact(options['batch_size']):
+                if deleted or options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'{policy.name}: pk {first}-{last}: {deleted} rows in {seconds * 1000:.1f} ms'
+                    )
+                if deleted:
+                    total += deleted
+                    time.sleep(options['pause'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{policy.name}: removed {total} rows older than {policy.days} days '
+                f'in {time.perf_counter() - started:.1f}s'
+            ))
+
+        for statement in ('VACUUM', 'ANALYZE'):
+            if options[statement.lower()]:
+                self.run_maintenance(statement)
+
+    def parse_overrides(self, values):
+        overrides = {}
+        for value in values:
+            name, _, days = value.partition('=')
+            if name not in POLICIES:
+                raise CommandError(f'Unknown policy "{name}", choose from {", ".join(POLICIES)}')
+            if days.lower() == 'none':
+                overrides[name] = None
+            elif days.isdigit():
+                overrides[name] = int(days)
+            else:
+                raise CommandError(f'--policy {value}: expected NAME=DAYS')
+        return overrides
+
+    def run_maintenance(self, statement):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.stderr.write(f'{statement} skipped, not supported on {connection.vendor}')
+            return
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(statement)
+        self.stdout.write(f'{statement} in {time.perf_counter() - started:.1f}s')
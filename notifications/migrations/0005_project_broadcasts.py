@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def create_watermarks(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    ProjectReadWatermark = apps.get_model('notifications', 'ProjectReadWatermark')
+    members = (
+        Project.members.through.objects
+        .exclude(user_id=F('project__manager_id'))
+        .values_list('user_id', 'project_id')
+        .order_by('pk')
+    )
+    batch = []
+    for user_id, project_id in members.iterator(chunk_size=2000):
+        batch.append(ProjectReadWatermark(user_id=user_id, project_id=project_id))
+        if len(batch) == 2000:
+            ProjectReadWatermark.objects.bulk_create(batch)
+            batch = []
+    ProjectReadWatermark.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0004_notification_counter'),
+        ('projects', '0004_activity_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectReadWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='project',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='broadcasts', to='projects.project'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='recipient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['project', 'id'], name='notification_broadcast_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.CheckConstraint(condition=models.Q(models.Q(('project__isnull', True), ('recipient__isnull', False)), models.Q(('project__isnull', False), ('recipient__isnull', True)), _connector='OR'), name='notification_recipient_or_project'),
+        ),
+        migrations.AddField(
+            model_name='projectreadwatermark',
+            name='project',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_watermarks', to='projects.project'),
+        ),
+        migrations.AddField(
+            model_name='projectreadwatermark',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='project_read_watermarks', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='projectreadwatermark',
+            constraint=models.UniqueConstraint(fields=('user', 'project'), name='unique_project_read_watermark'),
+        ),
+        migrations.RunPython(create_watermarks, migrations.RunPython.noop),
+    ]
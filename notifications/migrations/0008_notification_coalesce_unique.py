@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:48
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_last_occurred_at(apps, schema_editor):
+    # Coalescing used to move created_at, which is when the event last happened
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.update(last_occurred_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0007_notificationcounter_read_version'),
+        ('projects', '0004_activity_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='coalesces',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='last_occurred_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(populate_last_occurred_at, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('coalesces', True), ('is_read', False)), fields=('recipient', 'notification_type', 'content_type', 'object_id'), name='notification_coalesce_unique'),
+        ),
+    ]
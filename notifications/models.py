@@ -1,10 +1,105 @@
-from django.db import models
+from collections import defaultdict
+from django.db import connections, models, transaction
+from django.db.models import Count, Exists, F, IntegerField, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.query import ModelIterable
+from django.db.models.sql import Query
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from projects.models import Project
+
+class FeedIterable(ModelIterable):
+    """
+    Yields broadcasts with `is_read` taken from the reader's watermark, so
+    serializers and validators treat both kinds of notification alike.
+    """
+    def __iter__(self):
+        for notification in super().__iter__():
+            if notification.recipient_id is None:
+                notification.is_read = notification.broadcast_read
+            yield notification
+
+class CappedCount(Subquery):
+    """
+    Number of rows of a sliced queryset: the count stops at the slice
+    instead of reading every matching row.
+    """
+    template = '(SELECT COUNT(*) FROM (%(subquery)s) AS subquery)'
+    output_field = IntegerField()
+
+class NotificationQuerySet(models.QuerySet):
+    def feed_for(self, user):
+        """
+        The user's direct notifications and the broadcasts of every project
+        they follow. Broadcasts are read up to the user's watermark.
+        """
+        followed = ProjectReadWatermark.objects.filter(user=user)
+        queryset = self.filter(
+            Q(recipient=user) | Q(project__in=followed.values('project_id'))
+        ).annotate(broadcast_read=Exists(followed.filter(
+            project_id=OuterRef('project_id'),
+            last_read_id__gte=OuterRef('pk')
+        )))
+        queryset._iterable_class = FeedIterable
+        return queryset
+
+    def coalesce(self, notifications):
+        """
+        Insert direct `notifications`, at most one per recipient and event,
+        each folded into its recipient's open unread row for the same event
+        if there is one. A single INSERT ... ON CONFLICT against
+        `notification_coalesce_unique`, so concurrent writers never both
+        insert. A folded row keeps its created_at and takes the new title,
+        message and last_occurred_at, and its `occurrences` go up by the
+        notification's. Returns the saved rows with the ids of the created
+        ones.
+        """
+        if not notifications:
+            return [], set()
+        connection = connections[self.db]
+        opts = self.model._meta
+        constraint = next(c for c in opts.constraints if c.name == 'notification_coalesce_unique')
+        fields = [field for field in opts.concrete_fields if not field.primary_key]
+        quote = connection.ops.quote_name
+        table = quote(opts.db_table)
+
+        now = timezone.now()
+        params = []
+        for notification in notifications:
+            notification.coalesces = True
+            notification.created_at = notification.last_occurred_at = now
+            params += [field.get_db_prep_save(getattr(notification, field.attname), connection) for field in fields]
+
+        # The conflict target must spell the index condition as the index
+        # does, with literals rather than parameters
+        query = Query(self.model, alias_cols=False)
+        condition, condition_params = query.build_where(constraint.condition).as_sql(
+            query.get_compiler(connection=connection), connection
+        )
+        condition %= tuple(connection.schema_editor().quote_value(value) for value in condition_params)
+        key = [opts.get_field(name).column for name in constraint.fields]
+        row = f"({', '.join(['%s'] * len(fields))})"
+        folded = ', '.join(f'{quote(column)} = excluded.{quote(column)}' for column in ('title', 'message', 'last_occurred_at'))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(quote(field.column) for field in fields)}) "
+                f"VALUES {', '.join([row] * len(notifications))} "
+                f"ON CONFLICT ({', '.join(quote(column) for column in key)}) WHERE {condition} "
+                f"DO UPDATE SET {folded}, {quote('occurrences')} = {table}.{quote('occurrences')} + excluded.{quote('occurrences')} "
+                f"RETURNING {quote('id')}",
+                params
+            )
+            pks = [pk for pk, in cursor.fetchall()]
+
+        # Folded rows keep the created_at of an earlier write
+        rows = list(self.model.objects.using(self.db).filter(pk__in=pks).order_by('pk'))
+        return rows, {row.pk for row in rows if row.created_at == now}
 
 class Notification(models.Model):
     NOTIFICATION_TYPES = (
+        ('task_created', 'Task Created'),
         ('task_assigned', 'Task Assigned'),
         ('task_updated', 'Task Updated'),
         ('task_commented', 'New Comment'),
@@ -12,11 +107,20 @@ class Notification(models.Model):
         ('project_updated', 'Project Updated'),
     )
 
-    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    # Broadcasts have no recipient, they are stored once for their project
+    # and read by every member through ProjectReadWatermark
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    project = models.ForeignKey(
+        Project, on_delete=models.CASCADE, null=True, blank=True, db_index=False, related_name='broadcasts'
+    )
     notification_type = models.CharField(max_length=20, choices=NOTIFICATION_TYPES)
     title = models.CharField(max_length=200)
     message = models.TextField()
     is_read = models.BooleanField(default=False)
+    # Repeats folded into this row while it was unread, see NOTIFICATIONS_COALESCE_WINDOW
+    occurrences = models.PositiveIntegerField(default=1)
+    # Open for repeats to fold into while unread, one per recipient and event
+    coalesces = models.BooleanField(default=False)
     
     # Generic relation to either Task or Project
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
@@ -24,9 +128,191 @@ class Notification(models.Model):
     content_object = GenericForeignKey('content_type', 'object_id')
     
     created_at = models.DateTimeField(auto_now_add=True)
+    # When the event last happened, later than created_at once repeats fold in
+    last_occurred_at = models.DateTimeField(default=timezone.now)
+
+    objects = NotificationQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at', 'id'], name='notification_recipient_idx'),
+            models.Index(fields=['recipient', 'is_read', '-created_at', 'id'], name='notification_unread_idx'),
+            models.Index(fields=['project', 'id'], name='notification_broadcast_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=Q(recipient__isnull=False, project__isnull=True) |
+                Q(recipient__isnull=True, project__isnull=False),
+                name='notification_recipient_or_project'
+            ),
+            models.UniqueConstraint(
+                fields=['recipient', 'notification_type', 'content_type', 'object_id'],
+                condition=Q(is_read=False, coalesces=True),
+                name='notification_coalesce_unique'
+            ),
+        ]
+
+    def __str__(self):
+        if self.recipient_id is None:
+            return f"{self.notification_type} for project {self.project_id}"
+        return f"{self.notification_type} for {self.recipient.username}"
+
+class NotificationCounter(models.Model):
+    """
+    Denormalized number of unread notifications per user.
+
+    Kept in step with Notification through F() updates wherever rows are
+    created or change read state, so the unread count is a primary key
+    lookup instead of a COUNT(*) over the user's history. `read_version`
+    goes up whenever any of the user's notifications, broadcasts included,
+    is marked read or unread, for the list validators: a read and an unread
+    in the same interval leave the unread count as it was.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread_count = models.PositiveIntegerField(default=0)
+    read_version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.unread_count} unread for {self.user_id}"
+
+    @classmethod
+    def adjust(cls, deltas, read_state_changed=False):
+        """
+        Apply a {user_id: delta} mapping of unread count changes.
+        Users sharing the same delta are updated by a single statement.
+        Pass `read_state_changed` when notifications were marked read or
+        unread, rather than created, to bump their read_version as well;
+        a delta of 0 then bumps the version alone.
+        """
+        by_delta = defaultdict(list)
+        for user_id, delta in deltas.items():
+            if delta or read_state_changed:
+                by_delta[delta].append(user_id)
+        if not by_delta:
+            return
+
+        cls.objects.bulk_create(
+            [cls(user_id=user_id) for user_ids in by_delta.values() for user_id in user_ids],
+            ignore_conflicts=True
+        )
+        for delta, user_ids in by_delta.items():
+            changes = {'unread_count': Greatest(F('unread_count') + delta, 0)}
+            if read_state_changed:
+                changes['read_version'] = F('read_version') + 1
+            cls.objects.filter(user_id__in=user_ids).update(**changes)
+
+    @classmethod
+    def rebuild(cls, user_ids):
+        """
+        Recompute the counters of `user_ids` from the notifications table,
+        for rows written without going through adjust(). Read versions
+        move on from their previous value.
+        """
+        unread = dict(
+            Notification.objects.filter(recipient_id__in=user_ids, is_read=False)
+            .values('recipient_id')
+            .annotate(unread_count=Count('id'))
+            .values_list('recipient_id', 'unread_count')
+            .order_by()
+        )
+        with transaction.atomic():
+            counters = cls.objects.filter(user_id__in=user_ids)
+            versions = dict(counters.values_list('user_id', 'read_version'))
+            counters.delete()
+            cls.objects.bulk_create(
+                [cls(user_id=user_id, unread_count=unread.get(user_id, 0), read_version=versions.get(user_id, -1) + 1)
+                 for user_id in unread.keys() | versions.keys()],
+                batch_size=1000
+            )
+
+    @classmethod
+    def read_state_queryset(cls, user):
+        # Selected from the user's row, so a user without a counter still
+        # gets one, and the broadcasts counted in the same statement
+        counter = cls.objects.filter(user=OuterRef('pk'))
+        cap = ProjectReadWatermark.unread_cap
+        return User.objects.filter(pk=user.pk).values_list(
+            Coalesce(Subquery(counter.values('unread_count')), 0),
+            CappedCount(ProjectReadWatermark.unread_queryset(user).values('pk')[:cap + 1]),
+            Coalesce(Subquery(counter.values('read_version')), 0),
+        )
+
+    @classmethod
+    def read_state_for(cls, user):
+        """
+        (unread count, capped, read version) of `user` in one query. The
+        count includes at most `ProjectReadWatermark.unread_cap` unread
+        broadcasts, `capped` tells whether there are more.
+        """
+        return cls.read_state(cls.read_state_queryset(user).first())
+
+    @classmethod
+    async def aread_state_for(cls, user):
+        return cls.read_state(await cls.read_state_queryset(user).afirst())
+
+    @staticmethod
+    def read_state(row):
+        direct, broadcasts, read_version = row or (0, 0, 0)
+        cap = ProjectReadWatermark.unread_cap
+        return direct + min(broadcasts, cap), broadcasts > cap, read_version
+
+class ProjectReadWatermark(models.Model):
+    """
+    A member's read position in the broadcasts of a project.
+
+    Members, except the manager, get one row when they join and lose it when
+    they leave, so the rows also decide whose feed shows the broadcasts.
+    Broadcasts with an id up to `last_read_id` are read, newer ones unread:
+    publishing a broadcast writes nothing per member, reading moves the mark.
+    Unread broadcasts are counted up to `unread_cap`, so the unread count
+    costs the same however far behind the user is.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='project_read_watermarks')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='read_watermarks')
+    last_read_id = models.BigIntegerField(default=0)
+
+    unread_cap = 99
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'project'], name='unique_project_read_watermark'),
+        ]
 
     def __str__(self):
-        return f"{self.notification_type} for {self.recipient.username}" 
\ No newline at end of file
+        return f"{self.user_id} read {self.project_id} up to {self.last_read_id}"
+
+    @classmethod
+    def subscribe(cls, pairs):
+        """
+        Create watermarks for (user_id, project_id) pairs. Broadcasts sent
+        before the user joined start out read.
+        """
+        pairs = list(pairs)
+        if not pairs:
+            return
+        latest = dict(
+            Notification.objects.filter(project_id__in={project_id for _, project_id in pairs})
+            .values('project_id')
+            .annotate(last_id=Max('pk'))
+            .values_list('project_id', 'last_id')
+            .order_by()
+        )
+        cls.objects.bulk_create(
+            [cls(user_id=user_id, project_id=project_id, last_read_id=latest.get(project_id, 0))
+             for user_id, project_id in pairs],
+            ignore_conflicts=True
+        )
+
+    @classmethod
+    def mark_all_read(cls, user):
+        """
+        Move the user's watermarks to the newest broadcast of each project.
+        Returns the number of watermarks that moved.
+        """
+        latest = Notification.objects.filter(project_id=OuterRef('project_id')).order_by('-pk').values('pk')[:1]
+        return cls.objects.filter(user=user, last_read_id__lt=latest).update(last_read_id=latest)
+
+    @classmethod
+    def unread_queryset(cls, user):
+        return cls.objects.filter(user=user, project__broadcasts__pk__gt=F('last_read_id'))
@@ -1,20 +1,55 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Notification
+from project_management.response_cache import invalidate_user_lists
+from project_management.serializers import DynamicFieldsMixin
+from .models import Notification, NotificationCounter, ProjectReadWatermark
 
-class NotificationSerializer(serializers.ModelSerializer):
+class NotificationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = [
-            'id', 'recipient', 'notification_type', 'title',
-            'message', 'is_read', 'content_type', 'object_id',
-            'created_at'
+            'id', 'recipient', 'project', 'notification_type', 'title',
+            'message', 'is_read', 'occurrences', 'content_type', 'object_id',
+            'created_at', 'last_occurred_at'
         ]
         read_only_fields = [
-            'recipient', 'notification_type', 'title',
-            'message', 'content_type', 'object_id', 'created_at'
+            'recipient', 'project', 'notification_type', 'title',
+            'message', 'occurrences', 'content_type', 'object_id', 'created_at',
+            'last_occurred_at'
         ]
 
     def update(self, instance, validated_data):
-        instance.is_read = validated_data.get('is_read', instance.is_read)
-        instance.save()
-        return instance 
\ No newline at end of file
+        is_read = validated_data.get('is_read', instance.is_read)
+        if is_read != instance.is_read:
+            if instance.recipient_id is None:
+                self.move_watermark(instance, is_read)
+            else:
+                # Only the request that actually flips the flag moves the counter
+                with transaction.atomic():
+                    changed = Notification.objects.filter(
+                        pk=instance.pk,
+                        is_read=not is_read
+                    ).update(is_read=is_read)
+                    if changed:
+                        NotificationCounter.adjust(
+                            {instance.recipient_id: -1 if is_read else 1},
+                            read_state_changed=True
+                        )
+                        invalidate_user_lists([instance.recipient_id])
+            instance.is_read = is_read
+        return instance
+
+    def move_watermark(self, instance, is_read):
+        """
+        Broadcasts are read up to a watermark: reading one also reads the
+        project's older broadcasts, unreading one unreads the newer ones.
+        """
+        user = self.context['request'].user
+        watermarks = ProjectReadWatermark.objects.filter(user=user, project_id=instance.project_id)
+        if is_read:
+            changed = watermarks.filter(last_read_id__lt=instance.pk).update(last_read_id=instance.pk)
+        else:
+            changed = watermarks.filter(last_read_id__gte=instance.pk).update(last_read_id=instance.pk - 1)
+        if changed:
+            NotificationCounter.adjust({user.id: 0}, read_state_changed=True)
+            invalidate_user_lists([user.id])
@@ -1,94 +1,291 @@
-from django.db.models.signals import post_save
+from collections import Counter, defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
 from projects.models import Project
 from tasks.models import Task, Comment
-from .models import Notification
+from tasks.signals import tasks_bulk_saved
+from project_management.response_cache import BROADCASTS, invalidate_user_lists, invalidate_project_lists
+from .models import Notification, NotificationCounter, ProjectReadWatermark
+from .broker import RESUBSCRIBE, get_broker, project_topic, user_topic
+from .serializers import NotificationSerializer
+
+def send_notifications(notifications):
+    """
+    Write `notifications` with a single bulk insert once the current
+    transaction commits, so a rolled back write never notifies anyone.
+    """
+    if notifications:
+        transaction.on_commit(lambda: _write_notifications(notifications))
+
+def _write_notifications(notifications):
+    with transaction.atomic():
+        coalesced, created, notifications = coalesce_notifications(notifications)
+        Notification.objects.bulk_create(notifications)
+        notifications = created + notifications
+        # Coalesced rows were unread and stay unread, only inserts count
+        NotificationCounter.adjust(Counter(
+            notification.recipient_id for notification in notifications
+            if notification.recipient_id is not None and not notification.is_read
+        ))
+        notifications = coalesced + notifications
+        invalidate_notification_lists(notifications)
+    publish_notifications(notifications)
+
+def coalesce_key(notification):
+    return (
+        notification.recipient_id, notification.notification_type,
+        notification.content_type_id, notification.object_id
+    )
+
+def coalesce_notifications(notifications):
+    """
+    Fold repeats of the NOTIFICATIONS_COALESCE_TYPES into the recipient's
+    unread notification for the same object, if it last occurred within
+    the last NOTIFICATIONS_COALESCE_WINDOW seconds: its `occurrences` go
+    up and it takes the new message and last_occurred_at. Repeats within
+    the batch are folded together too. Needs partial unique indexes, other
+    databases insert every repeat.
+
+    Returns the updated rows, the rows the upsert created and the
+    notifications left to insert.
+    """
+    window = getattr(settings, 'NOTIFICATIONS_COALESCE_WINDOW', 0)
+    types = set(getattr(settings, 'NOTIFICATIONS_COALESCE_TYPES', ()))
+    if not window or not connection.features.supports_partial_indexes:
+        return [], [], notifications
+    repeats = defaultdict(list)
+    inserts = []
+    for notification in notifications:
+        if notification.recipient_id is not None and notification.notification_type in types:
+            repeats[coalesce_key(notification)].append(notification)
+        else:
+            inserts.append(notification)
+    if not repeats:
+        return [], [], notifications
+
+    # Rows that went quiet for longer than the window stay unread but
+    # take no more repeats, the next one starts a new row
+    Notification.objects.filter(
+        coalesces=True,
+        is_read=False,
+        last_occurred_at__lt=timezone.now() - timedelta(seconds=window),
+        recipient_id__in={key[0] for key in repeats},
+        notification_type__in={key[1] for key in repeats},
+        object_id__in={key[3] for key in repeats},
+    ).update(coalesces=False)
+
+    latest = []
+    for group in repeats.values():
+        group[-1].occurrences = len(group)
+        latest.append(group[-1])
+    rows, created_ids = Notification.objects.coalesce(latest)
+    coalesced = [row for row in rows if row.pk not in created_ids]
+    created = [row for row in rows if row.pk in created_ids]
+    return coalesced, created, inserts
+
+def notification_topic(notification):
+    if notification.recipient_id is None:
+        return project_topic(notification.project_id)
+    return user_topic(notification.recipient_id)
+
+def invalidate_notification_lists(notifications):
+    """
+    Replace the list versions of the recipients of direct notifications and
+    the broadcast versions of the projects of broadcasts. Neither looks up
+    a project's followers, their lists are keyed by the broadcast versions.
+    """
+    invalidate_user_lists({notification.recipient_id for notification in notifications})
+    invalidate_project_lists(
+        {notification.project_id for notification in notifications if notification.recipient_id is None},
+        BROADCASTS
+    )
+
+def publish_notifications(notifications):
+    """
+    Push saved notifications to their recipients' open streams, and
+    broadcasts to their project's topic, which the streams of its followers
+    subscribe to. Only topics with a live subscription pay for serialization.
+    """
+    broker = get_broker()
+    for notification in notifications:
+        topic = notification_topic(notification)
+        if broker.has_subscribers(topic):
+            broker.publish(topic, NotificationSerializer(notification).data)
+
+def resubscribe_streams(user_ids):
+    """
+    Once the transaction commits, have the open streams of `user_ids`
+    subscribe to the topics of the projects they follow now.
+    """
+    def publish():
+        broker = get_broker()
+        for user_id in user_ids:
+            topic = user_topic(user_id)
+            if broker.has_subscribers(topic):
+                broker.publish(topic, RESUBSCRIBE)
+    if user_ids:
+        transaction.on_commit(publish)
+
+@receiver(post_save, sender=Notification)
+def count_created_notification(sender, instance, created, **kwargs):
+    # Rows written with bulk_create skip this signal and are counted
+    # and published by the code doing the bulk insert.
+    if created:
+        if instance.recipient_id is not None and not instance.is_read:
+            NotificationCounter.adjust({instance.recipient_id: 1})
+        transaction.on_commit(lambda: publish_notifications([instance]))
+    invalidate_notification_lists([instance])
+
+@receiver(post_delete, sender=Notification)
+def invalidate_deleted_notification_lists(sender, instance, origin=None, **kwargs):
+    # Broadcasts deleted with their project are covered by invalidate_deleted_broadcasts
+    if getattr(origin, 'model', type(origin)) is Project:
+        return
+    invalidate_notification_lists([instance])
+
+@receiver(pre_delete, sender=Project)
+def invalidate_deleted_broadcasts(sender, instance, **kwargs):
+    invalidate_project_lists([instance.pk], BROADCASTS)
+
+def build_task_notifications(task, created):
+    """
+    Notifications for a saved task. Uses `task.project`, so callers handling
+    many tasks should load the projects up front.
+    """
+    project = task.project
+    content_type = ContentType.objects.get_for_model(Task)
+    notifications = []
 
-@receiver(post_save, sender=Task)
-def task_notification(sender, instance, created, **kwargs):
     if created:
         # Notify project manager about new task
-        if instance.project.manager != instance.assigned_to:
-            Notification.objects.create(
-                recipient=instance.project.manager,
+        if project.manager_id != task.assigned_to_id:
+            notifications.append(Notification(
+                recipient_id=project.manager_id,
                 notification_type='task_created',
                 title='New Task Created',
-                message=f'A new task "{instance.title}" has been created in project "{instance.project.title}"',
-                content_type=ContentType.objects.get_for_model(instance),
-                object_id=instance.id
-            )
-        
+                message=f'A new task "{task.title}" has been created in project "{project.title}"',
+                content_type=content_type,
+                object_id=task.id
+            ))
+
         # Notify assigned user
-        if instance.assigned_to != instance.project.manager:
-            Notification.objects.create(
-                recipient=instance.assigned_to,
+        if task.assigned_to_id != project.manager_id:
+            notifications.append(Notification(
+                recipient_id=task.assigned_to_id,
                 notification_type='task_assigned',
                 title='Task Assigned',
-                message=f'You have been assigned to task "{instance.title}" in project "{instance.project.title}"',
-                content_type=ContentType.objects.get_for_model(instance),
-                object_id=instance.id
-            )
+                message=f'You have been assigned to task "{task.title}" in project "{project.title}"',
+                content_type=content_type,
+                object_id=task.id
+            ))
     else:
         # Notify relevant users about task updates
-        if instance.assigned_to != instance.project.manager:
-            Notification.objects.create(
-                recipient=instance.assigned_to,
+        if task.assigned_to_id != project.manager_id:
+            notifications.append(Notification(
+                recipient_id=task.assigned_to_id,
                 notification_type='task_updated',
                 title='Task Updated',
-                message=f'Task "{instance.title}" has been updated',
-                content_type=ContentType.objects.get_for_model(instance),
-                object_id=instance.id
-            )
+                message=f'Task "{task.title}" has been updated',
+                content_type=content_type,
+                object_id=task.id
+            ))
+    return notifications
+
+@receiver(post_save, sender=Task)
+def task_notification(sender, instance, created, **kwargs):
+    send_notifications(build_task_notifications(instance, created))
+
+@receiver(tasks_bulk_saved, sender=Task)
+def bulk_task_notification(sender, instances, created, **kwargs):
+    notifications = []
+    for task in instances:
+        notifications += build_task_notifications(task, created)
+    send_notifications(notifications)
 
 @receiver(post_save, sender=Comment)
 def comment_notification(sender, instance, created, **kwargs):
-    if created:
-        # Notify task assignee about new comment
-        if instance.user != instance.task.assigned_to:
-            Notification.objects.create(
-                recipient=instance.task.assigned_to,
-                notification_type='task_commented',
-                title='New Comment',
-                message=f'New comment on task "{instance.task.title}"',
-                content_type=ContentType.objects.get_for_model(instance.task),
-                object_id=instance.task.id
-            )
-        
-        # Notify project manager about new comment
-        if instance.user != instance.task.project.manager:
-            Notification.objects.create(
-                recipient=instance.task.project.manager,
-                notification_type='task_commented',
-                title='New Comment',
-                message=f'New comment on task "{instance.task.title}"',
-                content_type=ContentType.objects.get_for_model(instance.task),
-                object_id=instance.task.id
-            )
+    if not created:
+        return
+
+    task = Task.objects.filter(pk=instance.task_id).values(
+        'title', 'assigned_to_id', 'project__manager_id'
+    ).get()
+    content_type = ContentType.objects.get_for_model(Task)
+    message = f'New comment on task "{task["title"]}"'
+
+    # Notify the task assignee and the project manager, once each
+    recipients = {task['assigned_to_id'], task['project__manager_id']}
+    recipients.discard(instance.user_id)
+
+    send_notifications([
+        Notification(
+            recipient_id=recipient_id,
+            notification_type='task_commented',
+            title='New Comment',
+            message=message,
+            content_type=content_type,
+            object_id=instance.task_id
+        )
+        for recipient_id in recipients
+    ])
 
 @receiver(post_save, sender=Project)
 def project_notification(sender, instance, created, **kwargs):
     if created:
-        # Notify members about being added to the project
-        for member in instance.members.all():
-            if member != instance.manager:
-                Notification.objects.create(
-                    recipient=member,
-                    notification_type='project_added',
-                    title='Added to Project',
-                    message=f'You have been added to project "{instance.title}"',
-                    content_type=ContentType.objects.get_for_model(instance),
-                    object_id=instance.id
-                )
+        notification_type = 'project_added'
+        title = 'Added to Project'
+        message = f'You have been added to project "{instance.title}"'
     else:
-        # Notify members about project updates
-        for member in instance.members.all():
-            if member != instance.manager:
-                Notification.objects.create(
-                    recipient=member,
-                    notification_type='project_updated',
-                    title='Project Updated',
-                    message=f'Project "{instance.title}" has been updated',
-                    content_type=ContentType.objects.get_for_model(instance),
-                    object_id=instance.id
-                ) 
\ No newline at end of file
+        notification_type = 'project_updated'
+        title = 'Project Updated'
+        message = f'Project "{instance.title}" has been updated'
+
+    # A single broadcast, members read it through their watermarks
+    send_notifications([Notification(
+        project_id=instance.id,
+        notification_type=notification_type,
+        title=title,
+        message=message,
+        content_type=ContentType.objects.get_for_model(Project),
+        object_id=instance.id
+    )])
+
+@receiver(post_save, sender=Project)
+def sync_manager_watermark(sender, instance, created, **kwargs):
+    # The manager doesn't follow their own project's broadcasts
+    previous_manager_id = getattr(instance, '_previous_manager_id', None)
+    if created or previous_manager_id == instance.manager_id:
+        return
+    ProjectReadWatermark.objects.filter(project=instance, user_id=instance.manager_id).delete()
+    if previous_manager_id is not None and instance.members.filter(pk=previous_manager_id).exists():
+        ProjectReadWatermark.subscribe([(previous_manager_id, instance.pk)])
+    resubscribe_streams({instance.manager_id, previous_manager_id} - {None})
+
+@receiver(m2m_changed, sender=Project.members.through)
+def sync_member_watermarks(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add' and pk_set:
+        if reverse:
+            project_ids = Project.objects.filter(pk__in=pk_set).exclude(manager=instance).values_list('pk', flat=True)
+            pairs = [(instance.pk, project_id) for project_id in project_ids]
+        else:
+            pairs = [(user_id, instance.pk) for user_id in pk_set if user_id != instance.manager_id]
+        ProjectReadWatermark.subscribe(pairs)
+        resubscribe_streams([instance.pk] if reverse else pk_set)
+    elif action == 'post_remove' and pk_set:
+        if reverse:
+            lookup = {'user_id': instance.pk, 'project_id__in': pk_set}
+        else:
+            lookup = {'project_id': instance.pk, 'user_id__in': pk_set}
+        ProjectReadWatermark.objects.filter(**lookup).delete()
+        resubscribe_streams([instance.pk] if reverse else pk_set)
+    elif action == 'post_clear':
+        watermarks = ProjectReadWatermark.objects.filter(
+            **({'user_id': instance.pk} if reverse else {'project_id': instance.pk})
+        )
+        resubscribe_streams([instance.pk] if reverse else list(watermarks.values_list('user_id', flat=True)))
+        watermarks.delete()
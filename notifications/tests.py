@@ -1,13 +1,27 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+from datetime import timedelta
+from unittest import mock
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.db import OperationalError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.contrib.contenttypes.models import ContentType
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
 from datetime import date
 from projects.models import Project
-from tasks.models import Task
-from .models import Notification
+from project_management.retention import RetentionPolicy, get_policies
+from tasks.models import Task, Comment, TaskLog
+from .models import Notification, NotificationCounter, ProjectReadWatermark
+from .broker import InProcessBroker, get_broker, project_topic, user_topic
+from .signals import publish_notifications
 
 class NotificationTests(TestCase):
     def setUp(self):
@@ -27,15 +41,16 @@ class NotificationTests(TestCase):
         )
         self.project.members.add(self.member)
         
-        # Create task
-        self.task = Task.objects.create(
-            title='Test Task',
-            description='Test Description',
-            project=self.project,
-            assigned_to=self.member,
-            status='todo',
-            due_date=date(2024, 12, 31)
-        )
+        # Create task, notifications are written when the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task = Task.objects.create(
+                title='Test Task',
+                description='Test Description',
+                project=self.project,
+                assigned_to=self.member,
+                status='todo',
+                due_date=date(2024, 12, 31)
+            )
 
     def test_notification_creation(self):
         """Test notification creation on task assignment"""
@@ -106,4 +121,434 @@ class NotificationTests(TestCase):
         # Test access by correct user
         self.client.force_authenticate(user=self.member)
         response = self.client.get(url)
-        self.assertEqual(response.status_code, status.HTTP_200_OK) 
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_200_OK) 
+
+    def test_notification_cursor_pagination(self):
+        """Test walking notifications with keyset pagination"""
+        content_type = ContentType.objects.get_for_model(self.project)
+        for i in range(25):
+            Notification.objects.create(
+                recipient=self.member,
+                notification_type='project_updated',
+                title='Project Updated',
+                message=str(i),
+                content_type=content_type,
+                object_id=self.project.id
+            )
+        expected = list(
+            Notification.objects.filter(recipient=self.member)
+            .order_by('-created_at', 'id').values_list('id', flat=True)
+        )
+
+        self.client.force_authenticate(user=self.member)
+        url = reverse('notification-list') + '?cursor='
+        seen = []
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNotIn('count', response.data)
+                seen += [item['id'] for item in response.data['results']]
+                url = response.data['next']
+        self.assertEqual(seen, expected)
+        for query in queries:
+            self.assertNotIn('COUNT(', query['sql'])
+
+        response = self.client.get(reverse('notification-list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_notifications_deferred_until_commit(self):
+        """Test notifications are not written for rolled back saves"""
+        class Rollback(Exception):
+            pass
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Comment.objects.create(task=self.task, user=self.manager, content='Rolled back')
+                    raise Rollback
+            except Rollback:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Notification.objects.filter(notification_type='task_commented').exists())
+
+    def test_project_broadcasts(self):
+        """Test a project update is stored once and read through watermarks"""
+        others = [User.objects.create(username=f'user{i}') for i in range(10)]
+        self.project.members.add(*others)
+        list_url = reverse('notification-list')
+        count_url = reverse('unread-notification-count')
+        self.client.force_authenticate(user=self.member)
+        self.client.get(list_url)
+
+        # Nothing is read or written per member
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.project.save()
+        broadcast = Notification.objects.get(notification_type='project_updated')
+        self.assertIsNone(broadcast.recipient_id)
+        self.assertEqual(broadcast.project_id, self.project.id)
+        inserts = [q for q in queries if q['sql'].startswith('INSERT INTO "notifications_notification"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertFalse([q for q in queries if 'notifications_notificationcounter' in q['sql']])
+        self.assertFalse([q for q in queries if 'notifications_projectreadwatermark' in q['sql']])
+
+        direct_unread = Notification.objects.filter(recipient=self.member, is_read=False).count()
+        self.assertEqual(self.client.get(count_url).data['unread_count'], direct_unread + 1)
+        item = self.client.get(list_url).data['results'][0]
+        self.assertEqual((item['id'], item['project'], item['is_read']), (broadcast.id, self.project.id, False))
+
+        # Reading the broadcast moves the reader's watermark only
+        update_url = reverse('notification-update', args=[broadcast.id])
+        response = self.client.patch(update_url, {'is_read': True}, format='json')
+        self.assertTrue(response.data['is_read'])
+        self.assertEqual(self.client.get(count_url).data['unread_count'], direct_unread)
+        self.assertTrue(self.client.get(list_url).data['results'][0]['is_read'])
+        self.client.force_authenticate(user=others[0])
+        self.assertEqual(self.client.get(count_url).data['unread_count'], 1)
+        self.client.post(reverse('mark-all-notifications-read'))
+        self.assertEqual(self.client.get(count_url).data['unread_count'], 0)
+        self.assertTrue(self.client.get(update_url).data['is_read'])
+
+        # The manager isn't notified, and members who leave stop seeing it
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.client.get(update_url).status_code, status.HTTP_404_NOT_FOUND)
+        self.project.members.remove(others[1])
+        self.client.force_authenticate(user=others[1])
+        self.assertEqual(self.client.get(count_url).data['unread_count'], 0)
+        self.assertEqual(self.client.get(list_url).data['results'], [])
+
+        # Members joining later find earlier broadcasts read
+        self.project.members.add(others[1])
+        self.assertTrue(self.client.get(list_url).data['results'][0]['is_read'])
+        self.assertEqual(self.client.get(count_url).data['unread_count'], 0)
+
+    def test_task_updates_are_coalesced(self):
+        """Test repeated task updates fold into the unread notification"""
+        self.client.force_authenticate(user=self.member)
+        list_url = reverse('notification-list')
+        etag = self.client.get(list_url)['ETag']
+        unread = self.client.get(reverse('unread-notification-count')).data['unread_count']
+
+        def update_task(title):
+            self.task.title = title
+            with CaptureQueriesContext(connection) as queries:
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.task.save()
+            return [q for q in queries if q['sql'].startswith('INSERT INTO "notifications_notification"')]
+
+        # One upsert per update, whether it inserts or folds
+        for title in ('First', 'Second', 'Third'):
+            inserts = update_task(title)
+            self.assertEqual(len(inserts), 1)
+            self.assertIn('ON CONFLICT', inserts[0]['sql'])
+        updates = Notification.objects.filter(recipient=self.member, notification_type='task_updated')
+        self.assertEqual(updates.count(), 1)
+        update = updates.get()
+        self.assertEqual(update.occurrences, 3)
+        self.assertEqual(update.message, 'Task "Third" has been updated')
+        self.assertGreater(update.last_occurred_at, update.created_at)
+
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['occurrences'], 3)
+        self.assertEqual(self.client.get(reverse('unread-notification-count')).data['unread_count'], unread + 1)
+
+        # Read notifications aren't reopened, and a zero window turns coalescing off
+        self.client.patch(reverse('notification-update', args=[updates.get().id]), {'is_read': True}, format='json')
+        update_task('Fourth')
+        with override_settings(NOTIFICATIONS_COALESCE_WINDOW=0):
+            update_task('Fifth')
+        self.assertEqual(list(updates.order_by('id').values_list('occurrences', flat=True)), [3, 1, 1])
+
+        # An open row quiet for longer than the window takes no more repeats
+        updates.filter(occurrences=1).update(last_occurred_at=timezone.now() - timedelta(seconds=301))
+        update_task('Sixth')
+        self.assertEqual(list(updates.order_by('id').values_list('occurrences', flat=True)), [3, 1, 1, 1])
+        update_task('Seventh')
+        self.assertEqual(list(updates.order_by('id').values_list('occurrences', flat=True)), [3, 1, 1, 2])
+        self.assertEqual(
+            self.client.get(reverse('unread-notification-count')).data['unread_count'], unread + 3
+        )
+
+    def test_compact_history(self):
+        """Test compact_history deletes expired rows in batches and fixes the counters"""
+        content_type = ContentType.objects.get_for_model(self.project)
+        for is_read in (True, True, False, False):
+            Notification.objects.create(
+                recipient=self.member, notification_type='project_updated', title='Old',
+                message='Old', is_read=is_read, content_type=content_type, object_id=self.project.id
+            )
+        old = Notification.objects.filter(title='Old')
+        old.filter(is_read=True).update(created_at=timezone.now() - timedelta(days=31))
+        old.filter(is_read=False).update(created_at=timezone.now() - timedelta(days=181))
+        TaskLog.objects.create(task=self.task, user=self.manager, action='old', details='Old')
+        TaskLog.objects.create(task=self.task, user=self.manager, action='new', details='New')
+        TaskLog.objects.filter(action='old').update(created_at=timezone.now() - timedelta(days=3))
+        kept = set(Notification.objects.exclude(title='Old').values_list('pk', flat=True))
+        unread = NotificationCounter.objects.get(user=self.member).unread_count
+        self.task.refresh_from_db()
+        updated_at = self.task.updated_at
+        self.client.force_authenticate(user=self.member)
+        task_url = f"{reverse('task-detail', args=[self.task.id])}?expand=logs"
+        etag = self.client.get(task_url)['ETag']
+
+        out = io.StringIO()
+        call_command('compact_history', '--policy', 'task_logs=2', '--batch-size', '2', '--pause', '0',
+                     '--analyze', stdout=out)
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), kept)
+        self.assertEqual(NotificationCounter.objects.get(user=self.member).unread_count, unread - 2)
+        self.assertFalse(TaskLog.objects.filter(action='old').exists())
+        self.assertTrue(TaskLog.objects.filter(action='new').exists())
+        # Pruning history doesn't edit the task, its expanded ETag still changes
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.updated_at, updated_at)
+        response = self.client.get(task_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([log['action'] for log in response.data['logs']], ['new'])
+        output = out.getvalue()
+        self.assertIn('read_notifications: removed 2 rows', output)
+        self.assertIn('unread_notifications: removed 2 rows', output)
+        self.assertIn('task_logs: removed 1 rows', output)
+        self.assertNotIn('project_logs', output)
+        self.assertRegex(output, r'read_notifications: pk \d+-\d+: [12] rows in')
+
+    def test_compact_history_retries_locked_batches(self):
+        """Test a batch that finds the database locked is retried, not fatal"""
+        content_type = ContentType.objects.get_for_model(self.project)
+        Notification.objects.create(
+            recipient=self.member, notification_type='project_updated', title='Old',
+            message='Old', is_read=True, content_type=content_type, object_id=self.project.id
+        )
+        Notification.objects.filter(title='Old').update(created_at=timezone.now() - timedelta(days=31))
+        delete_range = RetentionPolicy._delete_range
+        calls = []
+
+        def locked_once(policy, *args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return delete_range(policy, *args)
+
+        policy = get_policies({'unread_notifications': None, 'broadcasts': None})[0]
+        policy.retry_delay = 0
+        with mock.patch.object(RetentionPolicy, '_delete_range', locked_once):
+            deleted = sum(batch[2] for batch in policy.compact(batch_size=10000))
+        self.assertEqual(deleted, 1)
+        self.assertEqual(calls[0], calls[1])
+        self.assertFalse(Notification.objects.filter(title='Old').exists())
+
+    def test_unread_count(self):
+        """Test the unread counter follows creation and read state changes"""
+        self.client.force_authenticate(user=self.member)
+        url = reverse('unread-notification-count')
+
+        def unread_count():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # The counter and the broadcasts past the user's watermarks
+            self.assertEqual(len(queries), 1)
+            return response.data['unread_count']
+
+        expected = Notification.objects.filter(recipient=self.member, is_read=False).count()
+        self.assertEqual(unread_count(), expected)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(task=self.task, user=self.manager, content='New comment')
+        self.assertEqual(unread_count(), expected + 1)
+
+        notification = Notification.objects.filter(recipient=self.member).first()
+        update_url = reverse('notification-update', args=[notification.id])
+        self.client.patch(update_url, {'is_read': True}, format='json')
+        self.client.patch(update_url, {'is_read': True}, format='json')
+        self.assertEqual(unread_count(), expected)
+
+        self.client.patch(update_url, {'is_read': False}, format='json')
+        self.assertEqual(unread_count(), expected + 1)
+
+        self.client.post(reverse('mark-all-notifications-read'))
+        self.assertEqual(unread_count(), 0)
+
+        # Unread broadcasts are counted up to the cap
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                self.project.save()
+        with mock.patch.object(ProjectReadWatermark, 'unread_cap', 2):
+            self.assertEqual(unread_count(), 2)
+            self.assertTrue(self.client.get(url).data['capped'])
+        self.assertEqual(unread_count(), 3)
+        self.assertFalse(self.client.get(url).data['capped'])
+
+    def test_conditional_get(self):
+        """Test the notification list ETag changes when a notification is read"""
+        self.client.force_authenticate(user=self.member)
+        url = reverse('notification-list')
+
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        notification = Notification.objects.filter(recipient=self.member).first()
+        self.client.patch(reverse('notification-update', args=[notification.id]), {'is_read': True}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['results'][0]['is_read'])
+
+        # Reading one and unreading another keeps the unread count
+        other = Notification.objects.create(
+            recipient=self.member,
+            notification_type='task_updated',
+            title='Task Updated',
+            message='Task details were updated',
+            content_type=ContentType.objects.get_for_model(self.task),
+            object_id=self.task.id
+        )
+        etag = self.client.get(url)['ETag']
+        self.client.patch(reverse('notification-update', args=[notification.id]), {'is_read': False}, format='json')
+        self.client.patch(reverse('notification-update', args=[other.id]), {'is_read': True}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            {item['id']: item['is_read'] for item in response.data['results']},
+            {notification.id: False, other.id: True}
+        )
+
+    def test_async_views_authenticate_tokens(self):
+        """Test the async views resolve users from access tokens"""
+        url = reverse('notification-list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.member)}')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['recipient'] for item in response.data['results']],
+            [self.member.id] * len(response.data['results'])
+        )
+        response = self.client.get(reverse('unread-notification-count'))
+        self.assertEqual(
+            response.data['unread_count'],
+            Notification.objects.filter(recipient=self.member, is_read=False).count()
+        )
+        response = self.client.get(url + '?page=99')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.member = User.objects.create_user(username='member', password='member123')
+        self.token = str(AccessToken.for_user(self.member))
+        client = APIClient()
+        client.force_authenticate(user=self.member)
+        self.ticket = client.post(reverse('notification-stream-ticket')).data['ticket']
+        self.project = Project.objects.create(
+            title='Test Project',
+            description='Test Description',
+            manager=self.manager,
+            start_date=date.today(),
+            end_date=date(2024, 12, 31)
+        )
+        self.notification = Notification.objects.create(
+            recipient=self.member,
+            notification_type='project_updated',
+            title='Project Updated',
+            message='Project details were updated',
+            content_type=ContentType.objects.get_for_model(self.project),
+            object_id=self.project.id
+        )
+
+    async def test_stream_requires_authentication(self):
+        """Test the stream rejects anonymous requests, bad tickets and tokens in the URL"""
+        url = reverse('notification-stream')
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.get(f'{url}?ticket=invalid')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = await self.async_client.get(f'{url}?token={self.token}')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_stream_ticket_is_single_use(self):
+        """Test a stream ticket opens one stream only"""
+        response = await self.async_client.post(reverse('notification-stream-ticket'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        url = f"{reverse('notification-stream')}?ticket={self.ticket}"
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        events = response.streaming_content
+        await events.__anext__()
+        await events.aclose()
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_stream_delivers_notifications(self):
+        """Test published notifications reach the recipient's open stream"""
+        response = await self.async_client.get(f"{reverse('notification-stream')}?ticket={self.ticket}")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        events = response.streaming_content
+        self.assertTrue((await events.__anext__()).startswith(b'retry:'))
+
+        broker = get_broker()
+        self.assertTrue(broker.has_subscribers(user_topic(self.member.id)))
+        self.assertFalse(broker.has_subscribers(user_topic(self.manager.id)))
+
+        await sync_to_async(publish_notifications)([self.notification])
+        event = await asyncio.wait_for(events.__anext__(), timeout=5)
+        self.assertTrue(event.startswith(b'event: notification\n'))
+        payload = json.loads(event.decode().split('data: ', 1)[1])
+        self.assertEqual(payload['id'], self.notification.id)
+        await events.aclose()
+
+    async def test_stream_delivers_broadcasts(self):
+        """Test streams follow the broadcasts of the projects their user joins"""
+        response = await self.async_client.get(
+            reverse('notification-stream'), headers={'Authorization': f'Bearer {self.token}'}
+        )
+        events = response.streaming_content
+        await events.__anext__()
+        broker = get_broker()
+        topic = project_topic(self.project.id)
+        self.assertFalse(broker.has_subscribers(topic))
+
+        def join():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.project.members.add(self.member)
+        await sync_to_async(join)()
+        next_event = asyncio.ensure_future(events.__anext__())
+        for _ in range(100):
+            if broker.has_subscribers(topic):
+                break
+            await asyncio.sleep(0.01)
+        self.assertTrue(broker.has_subscribers(topic))
+
+        broadcast = await Notification.objects.acreate(
+            project=self.project,
+            notification_type='project_updated',
+            title='Project Updated',
+            message='Project details were updated',
+            content_type=await sync_to_async(ContentType.objects.get_for_model)(self.project),
+            object_id=self.project.id
+        )
+        await sync_to_async(publish_notifications)([broadcast])
+        event = await asyncio.wait_for(next_event, timeout=5)
+        payload = json.loads(event.decode().split('data: ', 1)[1])
+        self.assertEqual((payload['id'], payload['project']), (broadcast.id, self.project.id))
+        await events.aclose()
+
+    async def test_broker_subscriptions(self):
+        """Test closed subscriptions stop receiving messages"""
+        broker = InProcessBroker()
+        subscription = broker.subscribe(['topic'])
+        await sync_to_async(broker.publish)('topic', {'id': 1})
+        self.assertEqual(await asyncio.wait_for(subscription.get(), timeout=5), {'id': 1})
+
+        subscription.close()
+        self.assertFalse(broker.has_subscribers('topic'))
+        broker.publish('topic', {'id': 2})
+        self.assertTrue(subscription.queue.empty())
@@ -1,8 +1,23 @@
+from django.conf import settings
 from django.urls import path
-from .views import NotificationListView, NotificationUpdateView, MarkAllNotificationsReadView
+from .views import (
+    NotificationListView, NotificationUpdateView, MarkAllNotificationsReadView, UnreadNotificationCountView,
+    AsyncNotificationListView, AsyncNotificationUpdateView, AsyncMarkAllNotificationsReadView,
+    AsyncUnreadNotificationCountView, NotificationStreamTicketView, NotificationStreamView
+)
+
+if getattr(settings, 'NOTIFICATIONS_ASYNC_VIEWS', False):
+    list_view, update_view = AsyncNotificationListView, AsyncNotificationUpdateView
+    mark_all_read_view, unread_count_view = AsyncMarkAllNotificationsReadView, AsyncUnreadNotificationCountView
+else:
+    list_view, update_view = NotificationListView, NotificationUpdateView
+    mark_all_read_view, unread_count_view = MarkAllNotificationsReadView, UnreadNotificationCountView
 
 urlpatterns = [
-    path('notifications/', NotificationListView.as_view(), name='notification-list'),
-    path('notifications/<int:pk>/', NotificationUpdateView.as_view(), name='notification-update'),
-    path('notifications/mark-all-read/', MarkAllNotificationsReadView.as_view(), name='mark-all-notifications-read'),
-] 
\ No newline at end of file
+    path('notifications/', list_view.as_view(), name='notification-list'),
+    path('notifications/<int:pk>/', update_view.as_view(), name='notification-update'),
+    path('notifications/mark-all-read/', mark_all_read_view.as_view(), name='mark-all-notifications-read'),
+    path('notifications/unread-count/', unread_count_view.as_view(), name='unread-notification-count'),
+    path('notifications/stream/ticket/', NotificationStreamTicketView.as_view(), name='notification-stream-ticket'),
+    path('notifications/stream/', NotificationStreamView.as_view(), name='notification-stream'),
+]
@@ -1,29 +1,227 @@
+import asyncio
+import json
+import secrets
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
 from rest_framework import generics, permissions
+from rest_framework.exceptions import AuthenticationFailed
+from accounts.authentication import CachedJWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Notification
+from .models import Notification, NotificationCounter, ProjectReadWatermark
 from .serializers import NotificationSerializer
+from project_management.async_views import AsyncAPIView
+from project_management.conditional import ConditionalGetMixin
+from project_management.response_cache import BROADCASTS, ProjectCachedListMixin, invalidate_user_lists
+from .broker import RESUBSCRIBE, get_broker, project_topic, user_topic
 
-class NotificationListView(generics.ListAPIView):
+class NotificationListView(ProjectCachedListMixin, ConditionalGetMixin, generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-created_at', 'id')
+    list_aggregates = {'count': Count('pk'), 'last_id': Max('pk'), 'last_occurred_at': Max('last_occurred_at')}
+    # A broadcast replaces its project's broadcast version, not one per follower
+    project_version_scope = BROADCASTS
+
+    def get_list_project_ids(self, user):
+        return ProjectReadWatermark.objects.filter(user=user).values_list('project_id', flat=True)
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.feed_for(self.request.user)
+
+    def get_list_validators(self, queryset):
+        # Notifications are inserted, coalesced and marked read: the newest
+        # id and the row count catch inserts, deletes and joined or left
+        # projects, the newest last_occurred_at catches coalesced repeats
+        # and the read version catches reads, even when a read and an
+        # unread leave the unread count as it was.
+        user = self.request.user
+        aggregate = queryset.order_by().aggregate(**self.list_aggregates)
+        unread_count, _, read_version = NotificationCounter.read_state_for(user)
+        return [*aggregate.values(), unread_count, read_version]
+
+    async def aget_list_validators(self, queryset):
+        user = self.request.user
+        aggregate = await queryset.order_by().aaggregate(**self.list_aggregates)
+        unread_count, _, read_version = await NotificationCounter.aread_state_for(user)
+        return [*aggregate.values(), unread_count, read_version]
+
+    def get_page_validators(self, page):
+        return [[(obj.pk, obj.is_read, obj.occurrences) for obj in page]]
 
-class NotificationUpdateView(generics.UpdateAPIView):
+class NotificationUpdateView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        return Notification.objects.feed_for(self.request.user)
+
+    def get_object_validators(self, obj):
+        return [obj.pk, obj.is_read, obj.occurrences], None
 
 class MarkAllNotificationsReadView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        Notification.objects.filter(
-            recipient=request.user,
-            is_read=False
-        ).update(is_read=True)
-        return Response(status=status.HTTP_200_OK) 
\ No newline at end of file
+        self.mark_all_read(request.user)
+        return Response(status=status.HTTP_200_OK)
+
+    def mark_all_read(self, user):
+        with transaction.atomic():
+            marked = Notification.objects.filter(
+                recipient=user,
+                is_read=False
+            ).update(is_read=True)
+            moved = ProjectReadWatermark.mark_all_read(user)
+            if marked or moved:
+                NotificationCounter.adjust({user.id: -marked}, read_state_changed=True)
+                invalidate_user_lists([user.id])
+
+class UnreadNotificationCountView(generics.GenericAPIView):
+    """
+    Number of unread notifications, answered from the per-user counter and
+    the broadcasts past the user's watermarks in a single query. `capped`
+    is true when there were more unread broadcasts than were counted, for
+    clients to show "99+".
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return self.get_response(NotificationCounter.read_state_for(request.user))
+
+    def get_response(self, read_state):
+        unread_count, capped, _ = read_state
+        return Response({'unread_count': unread_count, 'capped': capped})
+
+# Native async versions of the views above, served by notifications.urls
+# under ASGI. The synchronous ones stay for WSGI deployments, where an async
+# view costs an event loop per request.
+
+class AsyncNotificationListView(AsyncAPIView, NotificationListView):
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request, *args, **kwargs)
+
+class AsyncNotificationUpdateView(AsyncAPIView, NotificationUpdateView):
+    async def get(self, request, *args, **kwargs):
+        return await self.aretrieve(request, *args, **kwargs)
+
+    async def put(self, request, *args, **kwargs):
+        return await self.aupdate(request, *args, **kwargs)
+
+    async def patch(self, request, *args, **kwargs):
+        return await self.aupdate(request, *args, partial=True, **kwargs)
+
+    async def aupdate(self, request, *args, partial=False, **kwargs):
+        instance = await self.aget_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        # The read flag and the unread counter change in one transaction,
+        # which the async ORM can't open
+        await sync_to_async(serializer.save)()
+        return Response(serializer.data)
+
+class AsyncMarkAllNotificationsReadView(AsyncAPIView, MarkAllNotificationsReadView):
+    async def post(self, request, *args, **kwargs):
+        await sync_to_async(self.mark_all_read)(request.user)
+        return Response(status=status.HTTP_200_OK)
+
+class AsyncUnreadNotificationCountView(AsyncAPIView, UnreadNotificationCountView):
+    async def get(self, request, *args, **kwargs):
+        return self.get_response(await NotificationCounter.aread_state_for(request.user))
+
+STREAM_TICKET_KEY = 'stream-ticket:{}'
+
+class NotificationStreamTicketView(generics.GenericAPIView):
+    """
+    Issue a ticket to open the notification stream with. EventSource can't
+    set headers, and an access token in the URL would end up in server and
+    proxy logs, so the stream takes a random ticket instead: it names the
+    user, expires after `ticket_timeout` seconds and opens one stream only.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    ticket_timeout = 30
+
+    def post(self, request, *args, **kwargs):
+        ticket = secrets.token_urlsafe(32)
+        cache.set(STREAM_TICKET_KEY.format(ticket), request.user.pk, self.ticket_timeout)
+        return Response({'ticket': ticket, 'expires_in': self.ticket_timeout}, status=status.HTTP_201_CREATED)
+
+class NotificationStreamView(View):
+    """
+    Server-Sent Events stream of the user's new notifications.
+
+    Served natively by the ASGI application: an idle connection is a
+    coroutine waiting on its broker subscription to the user's topic and
+    the topics of the projects they follow, with a comment line sent
+    every `heartbeat` seconds to keep proxies from closing it. EventSource
+    can't set headers, so a ticket from NotificationStreamTicketView may be
+    passed as ?ticket= instead of the Authorization header.
+    """
+    heartbeat = 25
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            user = await self.authenticate(request)
+        except (InvalidToken, AuthenticationFailed) as exc:
+            return JsonResponse({'detail': str(exc.detail)}, status=401)
+        if user is None:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+        subscription = await self.subscribe(user)
+        response = StreamingHttpResponse(self.events(user, subscription), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def authenticate(self, request):
+        ticket = request.GET.get('ticket')
+        if ticket:
+            return await self.redeem_ticket(ticket)
+        authentication = CachedJWTAuthentication()
+        result = await authentication.aauthenticate(request)
+        return result[0] if result else None
+
+    async def redeem_ticket(self, ticket):
+        key = STREAM_TICKET_KEY.format(ticket)
+        user_id = await cache.aget(key)
+        # Only the request that deletes the ticket may use it
+        if user_id is None or not await cache.adelete(key):
+            raise AuthenticationFailed('Stream ticket is invalid or expired.')
+        user = await User.objects.filter(pk=user_id, is_active=True).afirst()
+        if user is None:
+            raise AuthenticationFailed('User not found or inactive.')
+        return user
+
+    async def subscribe(self, user):
+        """
+        Subscribe to the user's direct notifications and to the broadcasts
+        of every project they follow.
+        """
+        project_ids = ProjectReadWatermark.objects.filter(user=user).values_list('project_id', flat=True)
+        topics = [user_topic(user.id)] + [project_topic(project_id) async for project_id in project_ids]
+        return get_broker().subscribe(topics)
+
+    async def events(self, user, subscription):
+        try:
+            yield f'retry: {self.heartbeat * 1000}\n\n'
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                if message == RESUBSCRIBE:
+                    # The user joined or left projects. The new subscription
+                    # is open before the old one closes, so nothing is lost
+                    previous, subscription = subscription, await self.subscribe(user)
+                    previous.close()
+                    continue
+                yield f'event: notification\ndata: {json.dumps(message)}\n\n'
+        finally:
+            subscription.close()
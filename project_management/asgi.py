@@ -7,5 +7,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'project_management.settings')
+# Served by an event loop, the notification endpoints use their async views
+os.environ.setdefault('NOTIFICATIONS_ASYNC_VIEWS', 'true')
 
 application = get_asgi_application() 
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Native async API views.
+
+DRF runs views synchronously, so under ASGI every request holds a worker
+thread for its whole duration. AsyncAPIView keeps DRF's request, parsing,
+permissions, exception handling and rendering, and awaits the rest:
+authenticators providing `aauthenticate`, async handlers and the async
+ORM. Code that must stay synchronous, such as transactions, is wrapped
+with sync_to_async by the view.
+"""
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework import exceptions, generics
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+
+
+class AsyncAPIView(generics.GenericAPIView):
+    """
+    GenericAPIView whose handlers are coroutines. Subclasses define
+    `async def get(...)` and friends and read through `aget_object` and
+    `apaginate_queryset`; the mixins in project_management provide async
+    `alist`/`aretrieve` next to their synchronous versions.
+    """
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                # OPTIONS metadata may read the object
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        # Django renders deferred responses in a thread, render here instead
+        # unless the browsable API, which may query for its forms, was chosen
+        if isinstance(self.response, Response) and not isinstance(
+            getattr(self.response, 'accepted_renderer', None), BrowsableAPIRenderer
+        ):
+            self.response.render()
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        """
+        Request._authenticate with awaited authenticators. Ones without
+        `aauthenticate` run in a thread, they may query the database.
+        """
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filter_kwargs = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            obj = await queryset.aget(**filter_kwargs)
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def apaginate_queryset(self, queryset):
+        if self.paginator is None:
+            return None
+        return await self.paginator.apaginate_queryset(queryset, self.request, view=self)
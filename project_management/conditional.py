@@ -0,0 +1,159 @@
+"""
+Conditional GET support shared by the API views.
+"""
+
+import hashlib
+
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+class ConditionalGetMixin:
+    """
+    ETag and Last-Modified validators for list and retrieve.
+
+    A detail ETag is built from the object's primary key and
+    `last_modified_field`, which is also its Last-Modified; a list ETag
+    from the row count and the greatest `last_modified_field` over the
+    filtered queryset, plus the requesting user. Both include the query
+    string, which filters the list and selects the rendered fields. Keyset
+    pages (`?cursor=`) never count the queryset, their ETag is built from
+    the rows of the page instead. Validators are checked against
+    If-None-Match/If-Modified-Since after permissions and before the
+    serializer runs, so a match answers with an empty 304.
+
+    Lists have no Last-Modified: deleting a row that isn't the newest
+    leaves the greatest timestamp as it was, so only the ETag, which also
+    counts the rows, tells the lists apart.
+
+    Views whose payload embeds related rows must make sure changes to them
+    bump `last_modified_field`, or override the get_*_validators hooks.
+
+    `alist` and `aretrieve` are the same for async views (see
+    project_management.async_views), with `aget_list_validators` as the
+    async counterpart of `get_list_validators`.
+    """
+    last_modified_field = 'updated_at'
+
+    def get_object_validators(self, obj):
+        """
+        Return (etag parts, last modified datetime or None) for `obj`.
+        """
+        last_modified = getattr(obj, self.last_modified_field)
+        return [obj.pk, last_modified], last_modified
+
+    def get_list_validators(self, queryset):
+        """
+        Return the etag parts for `queryset`.
+        """
+        aggregate = queryset.order_by().aggregate(
+            count=Count('pk'),
+            last_modified=Max(self.last_modified_field)
+        )
+        return [aggregate['count'], aggregate['last_modified']]
+
+    async def aget_list_validators(self, queryset):
+        aggregate = await queryset.order_by().aaggregate(
+            count=Count('pk'),
+            last_modified=Max(self.last_modified_field)
+        )
+        return [aggregate['count'], aggregate['last_modified']]
+
+    def get_page_validators(self, page):
+        """
+        Return the etag parts for the rows of a keyset page.
+        """
+        return [[obj.pk for obj in page], [getattr(obj, self.last_modified_field) for obj in page]]
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.is_keyset_request(request):
+            page = self.paginate_queryset(queryset)
+            parts = self.get_page_validators(page)
+            parts.append(self.paginator.has_next)
+        else:
+            page = None
+            parts = self.get_list_validators(queryset)
+        etag, last_modified = self.make_validators([request.user.pk, request.get_full_path(), *parts], None)
+        not_modified = self.get_not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        if page is None:
+            page = self.paginate_queryset(queryset)
+        return self.set_validators(self.get_list_response(queryset, page), etag, last_modified)
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.is_keyset_request(request):
+            page = await self.apaginate_queryset(queryset)
+            parts = self.get_page_validators(page)
+            parts.append(self.paginator.has_next)
+        else:
+            page = None
+            parts = await self.aget_list_validators(queryset)
+        etag, last_modified = self.make_validators([request.user.pk, request.get_full_path(), *parts], None)
+        not_modified = self.get_not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        if page is None:
+            page = await self.apaginate_queryset(queryset)
+        if page is None:
+            queryset = [obj async for obj in queryset]
+        return self.set_validators(self.get_list_response(queryset, page), etag, last_modified)
+
+    def get_list_response(self, queryset, page):
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_object_response(request, self.get_object())
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return self.get_object_response(request, await self.aget_object())
+
+    def get_object_response(self, request, instance):
+        parts, last_modified = self.get_object_validators(instance)
+        # ?fields= and ?expand= select different representations
+        etag, last_modified = self.make_validators([request.get_full_path(), *parts], last_modified)
+        not_modified = self.get_not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        serializer = self.get_serializer(instance)
+        return self.set_validators(Response(serializer.data), etag, last_modified)
+
+    def is_keyset_request(self, request):
+        cursor_param = getattr(self.paginator, 'cursor_query_param', None)
+        return bool(getattr(self, 'cursor_ordering', None)) and cursor_param in request.query_params
+
+    def make_validators(self, parts, last_modified):
+        """
+        Hash `parts` into a strong ETag and turn `last_modified` into a
+        timestamp in whole seconds, as carried by HTTP dates.
+        """
+        digest = hashlib.sha1(repr([type(self).__name__, *parts]).encode()).hexdigest()
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        return quote_etag(digest), timestamp
+
+    def get_not_modified_response(self, request, etag, last_modified):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if isinstance(response, HttpResponseNotModified):
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Responses are per user, clients and private caches revalidate them
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Authorization'])
+        return response
@@ -0,0 +1,22 @@
+"""
+Model support for denormalized counters.
+"""
+
+
+class CounterFieldsMixin:
+    """
+    Keeps `counter_fields` out of saves of existing rows.
+
+    Counters are only written by signal receivers with F() updates. Saving
+    an instance loaded earlier would otherwise put back the values it was
+    loaded with, undoing every increment made in between.
+    """
+    counter_fields = ()
+
+    def save(self, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        return super().save(**kwargs)
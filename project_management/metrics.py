@@ -0,0 +1,254 @@
+"""
+In-process request and SQL metrics in the Prometheus text format.
+
+MetricsMiddleware times every request and a database execute wrapper
+counts the queries it runs and the time spent in them. Samples are labelled
+with the resolved URL name and method and recorded into buckets owned by
+the recording thread, so the request path never takes a lock; /metrics
+merges the buckets of every thread when it is scraped. Only the addresses
+in METRICS_ALLOWED_IPS may scrape it.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Queries and SQL seconds of the request being served in this context
+current_request_sql = ContextVar('current_request_sql', default=None)
+
+
+class RequestSQL:
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+class Series:
+    """
+    Totals of one (route, method) pair in one thread.
+    """
+    __slots__ = ('count', 'latency_sum', 'latency_buckets', 'query_buckets',
+                 'queries', 'sql_seconds', 'response_bytes', 'statuses')
+
+    def __init__(self):
+        self.count = 0
+        self.latency_sum = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.query_buckets = [0] * (len(QUERY_BUCKETS) + 1)
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.response_bytes = 0
+        self.statuses = {}
+
+    def merge(self, other):
+        self.count += other.count
+        self.latency_sum += other.latency_sum
+        self.latency_buckets = [a + b for a, b in zip(self.latency_buckets, other.latency_buckets)]
+        self.query_buckets = [a + b for a, b in zip(self.query_buckets, other.query_buckets)]
+        self.queries += other.queries
+        self.sql_seconds += other.sql_seconds
+        self.response_bytes += other.response_bytes
+        for status, count in list(other.statuses.items()):
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+
+class MetricsRegistry:
+    """
+    Per-thread series merged on scrape. A thread's bucket is registered
+    once, under the lock, and then only ever written by that thread. Buckets
+    of finished threads are kept, so the exported counters never go down.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.buckets = []
+        # Bumped by reset, threads holding a bucket of an older epoch
+        # register a new one instead of writing to the dropped one
+        self.epoch = 0
+
+    def bucket(self):
+        series = getattr(self.local, 'series', None)
+        if series is None or self.local.epoch != self.epoch:
+            series = {}
+            with self.lock:
+                self.local.series, self.local.epoch = series, self.epoch
+                self.buckets.append(series)
+        return series
+
+    def record(self, route, method, status, seconds, queries, sql_seconds, response_bytes):
+        bucket = self.bucket()
+        series = bucket.get((route, method))
+        if series is None:
+            series = bucket[(route, method)] = Series()
+        series.count += 1
+        series.latency_sum += seconds
+        series.latency_buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        series.query_buckets[bisect_left(QUERY_BUCKETS, queries)] += 1
+        series.queries += queries
+        series.sql_seconds += sql_seconds
+        series.response_bytes += response_bytes
+        series.statuses[status] = series.statuses.get(status, 0) + 1
+
+    def collect(self):
+        with self.lock:
+            buckets = list(self.buckets)
+        merged = {}
+        for bucket in buckets:
+            for key, series in list(bucket.items()):
+                merged.setdefault(key, Series()).merge(series)
+        return merged
+
+    def reset(self):
+        """
+        Start every series from zero, for tests. Buckets are dropped, not
+        cleared, as only their own thread may write to them.
+        """
+        with self.lock:
+            self.buckets = []
+            self.epoch += 1
+
+    def render(self):
+        """
+        The merged series in the Prometheus text exposition format.
+        """
+        merged = sorted(self.collect().items())
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, bounds, counts, total, labels, count):
+            cumulative = 0
+            for bound, bucket_count in zip((*bounds, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {total}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+
+        family('http_requests_total', 'counter', 'Requests served, by route, method and status.')
+        for (route, method), series in merged:
+            for status, count in sorted(series.statuses.items()):
+                lines.append(f'http_requests_total{{{label_pairs(route, method)},status="{status}"}} {count}')
+
+        family('http_request_duration_seconds', 'histogram', 'Request latency.')
+        for (route, method), series in merged:
+            histogram('http_request_duration_seconds', LATENCY_BUCKETS, series.latency_buckets,
+                      series.latency_sum, label_pairs(route, method), series.count)
+
+        family('http_request_db_queries', 'histogram', 'SQL queries run per request.')
+        for (route, method), series in merged:
+            histogram('http_request_db_queries', QUERY_BUCKETS, series.query_buckets,
+                      series.queries, label_pairs(route, method), series.count)
+
+        family('http_request_db_seconds_total', 'counter', 'Time spent executing SQL.')
+        for (route, method), series in merged:
+            lines.append(f'http_request_db_seconds_total{{{label_pairs(route, method)}}} {series.sql_seconds}')
+
+        family('http_response_size_bytes_total', 'counter', 'Bytes of non-streaming response bodies.')
+        for (route, method), series in merged:
+            lines.append(f'http_response_size_bytes_total{{{label_pairs(route, method)}}} {series.response_bytes}')
+
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+
+def label_pairs(route, method):
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    return f'route="{route}",method="{method}"'
+
+
+def record_sql(execute, sql, params, many, context):
+    """
+    Execute wrapper adding the query and its duration to the current request.
+    """
+    request_sql = current_request_sql.get()
+    if request_sql is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_sql.queries += 1
+        request_sql.seconds += time.perf_counter() - started
+
+
+def install_sql_wrapper(connection, **kwargs):
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_sql)
+
+connection_created.connect(install_sql_wrapper)
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL and response metrics of every request. List it
+    first in MIDDLEWARE so the other middleware is timed too. It runs in
+    the handler's mode, so it doesn't force async requests into a thread;
+    queries run through sync_to_async see the request's context variable.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # Connections opened before this middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            install_sql_wrapper(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        request_sql = RequestSQL()
+        token = current_request_sql.set(request_sql)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_sql.reset(token)
+        self.record(request, response, request_sql, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        request_sql = RequestSQL()
+        token = current_request_sql.set(request_sql)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_sql.reset(token)
+        self.record(request, response, request_sql, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, request_sql, seconds):
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else 'unmatched'
+        response_bytes = 0 if response.streaming else len(response.content)
+        registry.record(route, request.method, response.status_code, seconds,
+                        request_sql.queries, request_sql.seconds, response_bytes)
+
+
+def metrics_view(request):
+    """
+    The metrics of this process, for the addresses in METRICS_ALLOWED_IPS
+    (by default the local host) and a 404 for everyone else.
+    """
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1')):
+        raise Http404
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
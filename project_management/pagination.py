@@ -0,0 +1,145 @@
+"""
+Pagination shared by the API views.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Page-number pagination by default, keyset pagination on request.
+
+    Views opt in by declaring `cursor_ordering`, a tuple of model fields that
+    ends with a unique column, e.g. ('-created_at', 'id'). Clients then pass
+    `?cursor=` to get the first page and follow `next` from there. Every page
+    is a range seek on the ordering columns, so it costs the same as the first
+    one and no COUNT(*) is issued.
+
+    Async views call `apaginate_queryset`, which returns the same pages
+    read with the async ORM.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'cursor_ordering', None)
+        self.keyset = bool(ordering) and self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = self.keyset_queryset(queryset, request, ordering)
+        return self._set_keyset_page(list(queryset[:page_size + 1]), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        ordering = getattr(view, 'cursor_ordering', None)
+        self.keyset = bool(ordering) and self.cursor_query_param in request.query_params
+        self.request = request
+        page_size = self.get_page_size(request)
+        if self.keyset:
+            queryset = self.keyset_queryset(queryset, request, ordering)
+            return self._set_keyset_page([obj async for obj in queryset[:page_size + 1]], page_size)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        bottom = (number - 1) * page_size
+        objects = [obj async for obj in queryset[bottom:bottom + page_size]]
+        self.page = paginator._get_page(objects, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+    def keyset_queryset(self, queryset, request, ordering):
+        """
+        `queryset` ordered by `ordering` and starting after the cursor.
+        """
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+        queryset = queryset.order_by(*ordering)
+        position = self.decode_cursor(request, queryset.model)
+        if position is not None:
+            queryset = queryset.filter(self._keyset_filter(self.ordering, position))
+        return queryset
+
+    def _set_keyset_page(self, results, page_size):
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        position = [getattr(last, name) for name, _ in self.ordering]
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position))
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        return None
+
+    def encode_cursor(self, position):
+        values = [
+            value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+            for value in position
+        ]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(token.encode()))
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, binascii.Error, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _keyset_filter(self, ordering, position):
+        """
+        Rows strictly after `position` in `ordering`, written as
+        a <= x AND (a < x OR (b <= y AND (b < y OR ...))) so the leading
+        column always bounds an index range scan.
+        """
+        (name, descending), value = ordering[0], position[0]
+        after = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+        if len(ordering) == 1:
+            return after
+        from_here = Q(**{f'{name}__lte' if descending else f'{name}__gte': value})
+        return from_here & (after | self._keyset_filter(ordering[1:], position[1:]))
@@ -0,0 +1,260 @@
+"""
+Per-user response cache for the list endpoints.
+
+Cached responses are keyed by user, path, normalized query string and the
+data versions of what the list shows: the user's own version, plus for
+lists of project rows the version of each project the user can see (the
+notification list uses the projects' separate broadcast versions). Writes
+never delete cached entries, they replace the versions they affect (see
+`invalidate_user_lists` and `invalidate_project_lists`), which makes every
+cached list built from the old data unreachable at once; the cache
+backend's LRU eviction reclaims them. A write to a project replaces one
+version, however many members read it.
+"""
+
+import hashlib
+import threading
+import uuid
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+VERSION_KEY = 'list-version:{}'
+PROJECT_VERSION_KEY = 'list-project-version:{}:{}'
+PROJECT_IDS_KEY = 'list-projects:{}:{}:{}'
+RESPONSE_KEY = 'list-response:{}'
+
+# Scopes of the per-project versions
+PROJECTS = 'projects'
+BROADCASTS = 'broadcasts'
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+class CacheStats:
+    """
+    Hit and miss counters of this process, per view.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def record(self, name, hit):
+        with self.lock:
+            (self.hits if hit else self.misses)[name] += 1
+
+    def snapshot(self):
+        with self.lock:
+            names = sorted(set(self.hits) | set(self.misses))
+            return {
+                name: {'hits': self.hits[name], 'misses': self.misses[name]}
+                for name in names
+            }
+
+    def reset(self):
+        with self.lock:
+            self.hits.clear()
+            self.misses.clear()
+
+cache_stats = CacheStats()
+
+
+def _get_versions(keys):
+    """
+    Current versions stored under `keys`. A missing version, never set or
+    evicted, is replaced with a new random one, so it can't match a
+    response cached under an earlier version.
+    """
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+async def _aget_versions(keys):
+    cache = get_cache()
+    versions = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, uuid.uuid4().hex, timeout=None)
+        versions.update(await cache.aget_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def get_user_version(user_id):
+    """
+    Current data version of `user_id`.
+    """
+    return _get_versions([VERSION_KEY.format(user_id)])[0]
+
+
+async def aget_user_version(user_id):
+    return (await _aget_versions([VERSION_KEY.format(user_id)]))[0]
+
+
+def get_project_versions(project_ids, scope=PROJECTS):
+    """
+    Current data versions of `project_ids` in `scope`, in the same order.
+    """
+    return _get_versions([PROJECT_VERSION_KEY.format(scope, project_id) for project_id in project_ids])
+
+
+async def aget_project_versions(project_ids, scope=PROJECTS):
+    return await _aget_versions([PROJECT_VERSION_KEY.format(scope, project_id) for project_id in project_ids])
+
+
+def _bump_versions(keys):
+    get_cache().set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+
+
+def _invalidate(keys):
+    """
+    Replace the versions under `keys` right away, so the writing request
+    never reads its own stale lists, and again when the transaction
+    commits, so a list cached by a concurrent request from the pre-commit
+    data is dropped.
+    """
+    if not keys:
+        return
+    _bump_versions(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump_versions(keys))
+
+
+def invalidate_user_lists(user_ids):
+    """
+    Give every user in `user_ids` a new data version, for changes to what
+    only they see: their notifications, or the set of projects they see.
+    """
+    _invalidate({VERSION_KEY.format(user_id) for user_id in user_ids if user_id is not None})
+
+
+def invalidate_project_lists(project_ids, scope=PROJECTS):
+    """
+    Give every project in `project_ids` a new data version in `scope`: by
+    default for changes to the project or its tasks, BROADCASTS for the
+    project notifications every follower sees.
+    """
+    _invalidate({
+        PROJECT_VERSION_KEY.format(scope, project_id) for project_id in project_ids if project_id is not None
+    })
+
+
+class CachedListMixin:
+    """
+    Serve `list` from the response cache.
+
+    Put it before ConditionalGetMixin: the validators are cached with the
+    data, so a hit that matches If-None-Match is a 304 without any query.
+    `alist` is the same for async views.
+    """
+    list_cache_timeout = 300
+
+    def get_list_versions(self, request):
+        """
+        Versions of the data the list is built from, part of the cache key.
+        """
+        return [get_user_version(request.user.pk)]
+
+    async def aget_list_versions(self, request):
+        return [await aget_user_version(request.user.pk)]
+
+    def get_list_cache_key(self, request, versions):
+        query = sorted(
+            (key, value) for key, values in request.query_params.lists() for value in values
+        )
+        parts = [type(self).__name__, request.user.pk, request.path, query, versions]
+        return RESPONSE_KEY.format(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+    def list(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_list_cache_key(request, self.get_list_versions(request))
+        cached = cache.get(key)
+        cache_stats.record(type(self).__name__, cached is not None)
+        if cached is not None:
+            return self.get_cached_response(request, cached)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, self.get_cache_entry(response), self.list_cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def alist(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_list_cache_key(request, await self.aget_list_versions(request))
+        cached = await cache.aget(key)
+        cache_stats.record(type(self).__name__, cached is not None)
+        if cached is not None:
+            return self.get_cached_response(request, cached)
+
+        response = await super().alist(request, *args, **kwargs)
+        if response.status_code == 200:
+            await cache.aset(key, self.get_cache_entry(response), self.list_cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def get_cache_entry(self, response):
+        return response.data, response['ETag']
+
+    def get_cached_response(self, request, cached):
+        data, etag = cached
+        not_modified = self.get_not_modified_response(request, etag, None)
+        if not_modified is not None:
+            response = not_modified
+        else:
+            response = self.set_validators(Response(data), etag, None)
+        response['X-Cache'] = 'HIT'
+        return response
+
+
+class ProjectCachedListMixin(CachedListMixin):
+    """
+    CachedListMixin for lists of rows from the user's projects, keyed by
+    the version of each of those projects as well as the user's own. The
+    ids of the projects are cached under the user's version, which
+    membership changes replace, so a hit still runs no query.
+    `project_version_scope` picks which of the projects' versions apply.
+    """
+    project_version_scope = PROJECTS
+
+    def get_list_project_ids(self, user):
+        """
+        Ids of the projects whose rows `user` can see in the list.
+        """
+        raise NotImplementedError
+
+    def get_list_versions(self, request):
+        user_version = get_user_version(request.user.pk)
+        cache = get_cache()
+        key = PROJECT_IDS_KEY.format(self.project_version_scope, request.user.pk, user_version)
+        project_ids = cache.get(key)
+        if project_ids is None:
+            project_ids = sorted(self.get_list_project_ids(request.user))
+            cache.set(key, project_ids, self.list_cache_timeout)
+        return [user_version, *get_project_versions(project_ids, self.project_version_scope)]
+
+    async def aget_list_project_ids(self, user):
+        return await sync_to_async(lambda: list(self.get_list_project_ids(user)))()
+
+    async def aget_list_versions(self, request):
+        user_version = await aget_user_version(request.user.pk)
+        cache = get_cache()
+        key = PROJECT_IDS_KEY.format(self.project_version_scope, request.user.pk, user_version)
+        project_ids = await cache.aget(key)
+        if project_ids is None:
+            project_ids = sorted(await self.aget_list_project_ids(request.user))
+            await cache.aset(key, project_ids, self.list_cache_timeout)
+        return [user_version, *await aget_project_versions(project_ids, self.project_version_scope)]
@@ -0,0 +1,149 @@
+"""
+Retention policies for the history tables.
+
+`manage.py compact_history` deletes the rows older than their policy's
+HISTORY_RETENTION_DAYS. It walks the table in primary key ranges of
+`batch_size`, one short transaction per range, so no write lock is held for
+longer than a batch takes. A batch that can't get its locks because of live
+writes (SQLite answers "database is locked" right away when a transaction
+that has read can't upgrade to writing) is retried after a growing pause
+instead of ending the run. Rows are deleted with QuerySet.delete(), so
+the delete receivers run as for any other delete (logs have none, which
+keeps theirs a single DELETE); each policy then repairs what the receivers
+don't cover, such as unread counters and cached lists, once per batch.
+Parents keep their `updated_at`: pruning history doesn't edit them.
+"""
+
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from notifications.models import Notification, NotificationCounter
+from projects.models import ProjectLog
+from tasks.models import Task, TaskLog
+from .response_cache import invalidate_project_lists
+
+
+class RetentionPolicy:
+    model = None
+    # Values read from each deleted row, the primary key first
+    fields = ('pk',)
+    filters = {}
+    # Attempts at a batch that fails to lock, the pause doubling after each
+    attempts = 6
+    retry_delay = 0.05
+
+    def __init__(self, name, days):
+        self.name = name
+        self.days = days
+
+    def get_queryset(self):
+        return self.model.objects.filter(**self.filters).order_by()
+
+    def compact(self, batch_size, now=None):
+        """
+        Delete the expired rows, yielding (first pk, last pk, rows deleted,
+        seconds) for every range walked.
+        """
+        cutoff = (now or timezone.now()) - timedelta(days=self.days)
+        # Rows inserted after this point are never old enough to go
+        bounds = self.model.objects.order_by().aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            return
+        for start in range(bounds['first'], bounds['last'] + 1, batch_size):
+            stop = min(start + batch_size, bounds['last'] + 1)
+            started = time.perf_counter()
+            deleted = self.delete_range(start, stop, cutoff)
+            yield start, stop - 1, deleted, time.perf_counter() - started
+
+    def delete_range(self, start, stop, cutoff):
+        for attempt in range(self.attempts):
+            try:
+                return self._delete_range(start, stop, cutoff)
+            except OperationalError:
+                if attempt == self.attempts - 1:
+                    raise
+                time.sleep(self.retry_delay * 2 ** attempt)
+
+    def _delete_range(self, start, stop, cutoff):
+        with transaction.atomic():
+            rows = list(
+                self.get_queryset().select_for_update()
+                .filter(pk__gte=start, pk__lt=stop, created_at__lt=cutoff)
+                .values_list(*self.fields)
+            )
+            if rows:
+                self.model.objects.filter(pk__in=[row[0] for row in rows]).delete()
+                self.repair(rows)
+        return len(rows)
+
+    def repair(self, rows):
+        """
+        Update whatever the deleted `rows` were counted or cached in.
+        """
+
+
+class DirectNotificationPolicy(RetentionPolicy):
+    model = Notification
+    fields = ('pk', 'recipient_id', 'is_read')
+
+    def __init__(self, name, days, is_read):
+        super().__init__(name, days)
+        self.filters = {'recipient__isnull': False, 'is_read': is_read}
+
+    def repair(self, rows):
+        # The delete receiver replaces the recipients' list versions
+        unread = Counter(recipient_id for _, recipient_id, is_read in rows if not is_read)
+        NotificationCounter.adjust({user_id: -count for user_id, count in unread.items()})
+
+
+class BroadcastPolicy(RetentionPolicy):
+    # Unread broadcasts are counted from the watermarks when read, and the
+    # delete receiver replaces the projects' broadcast versions, so there
+    # is nothing to repair
+    model = Notification
+    fields = ('pk', 'project_id')
+    filters = {'recipient__isnull': True}
+
+
+class TaskLogPolicy(RetentionPolicy):
+    # Logs are part of the task representation (?expand=logs): the task
+    # ETag covers the expanded logs themselves (see TaskViewSet), cached
+    # lists are replaced here
+    model = TaskLog
+    fields = ('pk', 'task_id')
+
+    def repair(self, rows):
+        tasks = Task.objects.filter(pk__in={task_id for _, task_id in rows})
+        invalidate_project_lists(tasks.values_list('project_id', flat=True).distinct())
+
+
+class ProjectLogPolicy(RetentionPolicy):
+    model = ProjectLog
+    fields = ('pk', 'project_id')
+
+    def repair(self, rows):
+        invalidate_project_lists({project_id for _, project_id in rows})
+
+
+POLICIES = {
+    'read_notifications': lambda days: DirectNotificationPolicy('read_notifications', days, is_read=True),
+    'unread_notifications': lambda days: DirectNotificationPolicy('unread_notifications', days, is_read=False),
+    'broadcasts': lambda days: BroadcastPolicy('broadcasts', days),
+    'task_logs': lambda days: TaskLogPolicy('task_logs', days),
+    'project_logs': lambda days: ProjectLogPolicy('project_logs', days),
+}
+
+
+def get_policies(overrides=None):
+    """
+    The policies with a retention period, from HISTORY_RETENTION_DAYS
+    updated with `overrides`. None keeps a table's rows forever.
+    """
+    days = {**getattr(settings, 'HISTORY_RETENTION_DAYS', {}), **(overrides or {})}
+    return [POLICIES[name](days[name]) for name in POLICIES if days.get(name) is not None]
@@ -0,0 +1,61 @@
+"""
+Serializer helpers shared by the API apps.
+"""
+
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+def query_param_set(request, name):
+    """
+    Comma separated values of `?name=` as a set, or None when absent.
+    """
+    if request is None or name not in request.query_params:
+        return None
+    return {value.strip() for value in request.query_params[name].split(',') if value.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    Sparse fieldsets and opt-in expansion driven by the query string.
+
+    `?fields=id,title` limits the output to the listed fields and
+    `?expand=comments` adds fields named in `expandable_fields`, which are
+    left out otherwise. Only the serializer the view renders reads the
+    query string, nested ones render their default fields. `?fields=` is
+    ignored on writes so it can't drop input fields.
+
+    Views use `wants()` to decide which relations to select or prefetch,
+    so relations that aren't rendered are never queried.
+    """
+    expandable_fields = ()
+
+    @classmethod
+    def wants(cls, request, name):
+        """
+        Whether field `name` is rendered for `request`.
+        """
+        expand = query_param_set(request, 'expand') or set()
+        if name in cls.expandable_fields:
+            return name in expand
+        fields = query_param_set(request, 'fields')
+        if fields is None or request.method not in SAFE_METHODS:
+            return True
+        return name in fields or name in expand
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not self._is_rendered_serializer():
+            return {
+                name: field for name, field in fields.items()
+                if name not in self.expandable_fields
+            }
+        return {
+            name: field for name, field in fields.items()
+            if field.write_only or self.wants(request, name)
+        }
+
+    def _is_rendered_serializer(self):
+        root = self.root
+        return root is self or (isinstance(root, serializers.ListSerializer) and root.child is self)
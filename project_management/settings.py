@@ -38,9 +38,12 @@ INSTALLED_APPS = [
     'projects',
     'tasks',
     'notifications',
+    'search',
+    'benchmarks',
 ]
 
 MIDDLEWARE = [
+    'project_management.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -111,7 +114,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -121,7 +124,7 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'project_management.pagination.OptionalCursorPagination',
     'PAGE_SIZE': 10
 }
 
@@ -133,6 +136,24 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# The local-memory cache evicts least recently used entries beyond
+# MAX_ENTRIES, which bounds the memory used by cached list responses.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'project-management',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+RESPONSE_CACHE_ALIAS = 'default'
+
+# Users resolved from access tokens are cached in-process, saves and
+# deletes invalidate them and the TTL bounds staleness across processes.
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TTL = 60
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development
 
@@ -145,4 +166,29 @@ SWAGGER_SETTINGS = {
             'in': 'header'
         }
     }
-} 
\ No newline at end of file
+} 
+# Broker used to push new notifications to /api/v1/notifications/stream/
+NOTIFICATIONS_BROKER = 'notifications.broker.InProcessBroker'
+
+# Serve the notification endpoints with their native async views. Only on
+# under ASGI (asgi.py sets the variable): under WSGI every async view runs
+# in its own event loop.
+NOTIFICATIONS_ASYNC_VIEWS = os.environ.get('NOTIFICATIONS_ASYNC_VIEWS', '').lower() in ('1', 'true')
+
+# Unread notifications of these types are updated in place, their
+# `occurrences` bumped, when the same event repeats for the same recipient
+# and object within the window (in seconds). 0 always inserts a new row.
+NOTIFICATIONS_COALESCE_TYPES = ('task_updated',)
+NOTIFICATIONS_COALESCE_WINDOW = 300
+
+# Days of history kept by `manage.py compact_history`, None keeps the rows
+HISTORY_RETENTION_DAYS = {
+    'read_notifications': 30,
+    'unread_notifications': 180,
+    'broadcasts': 180,
+    'task_logs': None,
+    'project_logs': None,
+}
+
+# Client addresses allowed to scrape /metrics
+METRICS_ALLOWED_IPS = ('127.0.0.1', '::1')
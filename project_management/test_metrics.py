@@ -0,0 +1,95 @@
+"""
+Tests for the request metrics middleware and the /metrics endpoint.
+"""
+
+import re
+import threading
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from projects.models import Project
+from .metrics import MetricsRegistry, registry
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='member', password='member123')
+        Project.objects.create(
+            title='Project',
+            description='Description',
+            manager=self.user,
+            start_date=date.today(),
+            end_date=date(2024, 12, 31)
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def sample(self, text, name, **labels):
+        pattern = name + r'\{' + ','.join(
+            rf'{key}="{re.escape(str(value))}"' for key, value in labels.items()
+        ) + r'\} (\S+)'
+        match = re.search(pattern, text)
+        return float(match.group(1)) if match else None
+
+    def test_requests_are_recorded_per_route(self):
+        """Test latency, SQL and status metrics are labelled by URL name and method"""
+        self.client.get(reverse('project-list'))
+        self.client.get(reverse('project-list'))
+        self.client.get(reverse('project-detail', args=[999]))
+
+        text = self.client.get(reverse('metrics')).content.decode()
+        self.assertEqual(self.sample(text, 'http_requests_total', route='project-list', method='GET', status=200), 2)
+        self.assertEqual(self.sample(text, 'http_requests_total', route='project-detail', method='GET', status=404), 1)
+        self.assertEqual(self.sample(text, 'http_request_duration_seconds_count', route='project-list', method='GET'), 2)
+        self.assertEqual(
+            self.sample(text, 'http_request_duration_seconds_bucket', route='project-list', method='GET', le='+Inf'), 2
+        )
+        self.assertGreater(self.sample(text, 'http_request_db_queries_sum', route='project-list', method='GET'), 0)
+        self.assertGreater(self.sample(text, 'http_request_db_seconds_total', route='project-list', method='GET'), 0)
+        self.assertGreater(self.sample(text, 'http_response_size_bytes_total', route='project-list', method='GET'), 0)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', text)
+
+    def test_metrics_restricted_to_allowed_ips(self):
+        """Test only the allowed addresses can scrape the metrics"""
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 404)
+        with self.settings(METRICS_ALLOWED_IPS=['203.0.113.7']):
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.7')
+        self.assertEqual(response.status_code, 200)
+
+    def test_thread_buckets_are_merged(self):
+        """Test samples recorded by different threads add up on scrape"""
+        metrics = MetricsRegistry()
+
+        def record():
+            for _ in range(100):
+                metrics.record('task-list', 'GET', 200, 0.01, 3, 0.001, 10)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        series = metrics.collect()[('task-list', 'GET')]
+        self.assertEqual(series.count, 400)
+        self.assertEqual(series.queries, 1200)
+        self.assertEqual(series.statuses, {200: 400})
+        self.assertEqual(len(metrics.buckets), 4)
+
+    def test_reset_leaves_other_threads_buckets_alone(self):
+        """Test reset drops the buckets and threads register new ones"""
+        metrics = MetricsRegistry()
+        metrics.record('task-list', 'GET', 200, 0.01, 3, 0.001, 10)
+        bucket = metrics.bucket()
+        metrics.reset()
+        self.assertEqual(metrics.collect(), {})
+        # The dropped bucket is never cleared under its owner
+        self.assertEqual(bucket[('task-list', 'GET')].count, 1)
+        metrics.record('task-list', 'GET', 200, 0.01, 3, 0.001, 10)
+        self.assertEqual(metrics.collect()[('task-list', 'GET')].count, 1)
+        self.assertEqual(len(metrics.buckets), 1)
@@ -0,0 +1,129 @@
+"""
+Query-plan regression tests for the hot API endpoints.
+
+Every SELECT issued while serving the endpoints below is run through
+SQLite's EXPLAIN QUERY PLAN. The tests fail if a query scans a whole table
+or needs a temporary B-tree to sort, which means a composite index in
+Meta.indexes no longer matches the filter/order pattern of the view.
+"""
+
+import re
+from datetime import date
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from notifications.models import Notification
+from projects.models import Project, ProjectLog
+from tasks.models import Task, Comment, TaskLog
+
+FULL_SCAN = re.compile(r'^SCAN (?!\(?subquery|qualify)')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create(username='manager')
+        self.member = User.objects.create(username='member')
+
+        for i in range(3):
+            project = Project.objects.create(
+                title=f'Project {i}',
+                description='Description',
+                manager=self.manager,
+                start_date=date.today(),
+                end_date=date(2024, 12, 31)
+            )
+            project.members.add(self.member)
+            ProjectLog.objects.create(project=project, user=self.manager, action='created', details='')
+            for j in range(5):
+                task = Task.objects.create(
+                    title=f'Task {j}',
+                    description='Description',
+                    project=project,
+                    assigned_to=self.member,
+                    due_date=date(2024, 12, 31),
+                    is_pinned=j == 0
+                )
+                Comment.objects.create(task=task, user=self.manager, content='Comment')
+                TaskLog.objects.create(task=task, user=self.manager, action='created', details='')
+
+        self.project = project
+        self.task = task
+        Notification.objects.create(
+            recipient=self.member,
+            notification_type='project_updated',
+            title='Project Updated',
+            message='Project details were updated',
+            content_type=ContentType.objects.get_for_model(project),
+            object_id=project.id
+        )
+        self.client.force_authenticate(user=self.member)
+
+    def explain(self, url):
+        """
+        Request `url` and return (sql, plan lines) for every SELECT it ran.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plans.append((query['sql'], [row[3] for row in cursor.fetchall()]))
+        return plans
+
+    def assertIndexedPlans(self, url, allow_sort=False):
+        for sql, plan in self.explain(url):
+            for step in plan:
+                self.assertIsNone(FULL_SCAN.match(step), f'{url}: full table scan in {plan} for {sql}')
+                if not allow_sort:
+                    self.assertNotIn(TEMP_SORT, step, f'{url}: temp B-tree sort in {plan} for {sql}')
+
+    def test_task_endpoints(self):
+        """Test task list filters are served from composite indexes"""
+        url = reverse('task-list')
+        self.assertIndexedPlans(f'{url}?project={self.project.id}')
+        self.assertIndexedPlans(f'{url}?project={self.project.id}&cursor=')
+        self.assertIndexedPlans(f'{url}?project={self.project.id}&status=todo')
+        self.assertIndexedPlans(f'{url}?assigned_to={self.member.id}')
+        self.assertIndexedPlans(f'{url}?assigned_to={self.member.id}&cursor=')
+        self.assertIndexedPlans(reverse('task-detail', args=[self.task.id]) + '?expand=comments,logs')
+
+        # Without a project filter the rows come from every visible project,
+        # so they are sorted after the membership lookup; that sort is bounded
+        # by what the user can see rather than by the table size.
+        self.assertIndexedPlans(url, allow_sort=True)
+
+    def test_comment_endpoints(self):
+        """Test comment listing uses the (task, created_at) index"""
+        url = reverse('task-comments', args=[self.task.id])
+        self.assertIndexedPlans(url)
+        self.assertIndexedPlans(f'{url}?cursor=')
+
+    def test_notification_endpoints(self):
+        """Test notification listing uses the recipient and broadcast indexes"""
+        # Direct notifications and project broadcasts are read through two
+        # indexes and merged, so the sort is bounded by the user's feed
+        # rather than by the table size.
+        url = reverse('notification-list')
+        self.assertIndexedPlans(url, allow_sort=True)
+        self.assertIndexedPlans(f'{url}?cursor=', allow_sort=True)
+
+    def test_project_endpoints(self):
+        """Test project detail and logs use indexes"""
+        self.assertIndexedPlans(reverse('project-detail', args=[self.project.id]) + '?expand=members,logs')
+        self.assertIndexedPlans(reverse('project-logs', args=[self.project.id]))
+        self.assertIndexedPlans(reverse('project-logs', args=[self.project.id]) + '?cursor=')
+        self.assertIndexedPlans(reverse('project-list'), allow_sort=True)
@@ -3,6 +3,8 @@ from django.urls import path, include
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from .metrics import metrics_view
+from .views import CacheStatsView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -19,11 +21,13 @@ schema_view = get_schema_view(
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/v1/', include([
         path('', include('accounts.urls')),
         path('', include('projects.urls')),
         path('', include('tasks.urls')),
         path('', include('notifications.urls')),
+        path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
     ])),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
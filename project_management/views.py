@@ -0,0 +1,12 @@
+from rest_framework import generics, permissions
+from rest_framework.response import Response
+from .response_cache import cache_stats
+
+class CacheStatsView(generics.GenericAPIView):
+    """
+    Hit and miss counters of the list response cache in this process.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(cache_stats.snapshot())
@@ -0,0 +1,108 @@
+"""
+Streaming export of a project with its tasks, comments and activity logs.
+
+Rows are read with values() projections over QuerySet.iterator(), so memory
+use stays flat however large the project is. The same generators back the
+/projects/{id}/export/ endpoint and the export_project management command.
+"""
+
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+from tasks.models import Task, Comment, TaskLog
+from .models import Project, ProjectLog
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+DEFAULT_CHUNK_SIZE = 2000
+
+# Columns of the CSV export, each record type fills the ones it has
+CSV_COLUMNS = [
+    'type', 'id', 'project_id', 'task_id', 'user_id', 'manager_id', 'title', 'description',
+    'status', 'assigned_to_id', 'due_date', 'is_pinned', 'start_date',
+    'end_date', 'action', 'details', 'content', 'created_at', 'updated_at',
+]
+
+def export_records(project_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield (record type, row dict) for the project followed by its tasks,
+    comments, task logs and project logs, each in primary key order.
+    """
+    sections = [
+        ('project', Project.objects.filter(pk=project_id).values(
+            'id', 'title', 'description', 'manager_id', 'start_date',
+            'end_date', 'created_at', 'updated_at'
+        )),
+        ('task', Task.objects.filter(project_id=project_id).values(
+            'id', 'project_id', 'title', 'description', 'status',
+            'assigned_to_id', 'due_date', 'is_pinned', 'created_at', 'updated_at'
+        )),
+        ('comment', Comment.objects.filter(task__project_id=project_id).values(
+            'id', 'task_id', 'user_id', 'content', 'created_at', 'updated_at'
+        )),
+        ('task_log', TaskLog.objects.filter(task__project_id=project_id).values(
+            'id', 'task_id', 'user_id', 'action', 'details', 'created_at'
+        )),
+        ('project_log', ProjectLog.objects.filter(project_id=project_id).values(
+            'id', 'project_id', 'user_id', 'action', 'details', 'created_at'
+        )),
+    ]
+    for record_type, queryset in sections:
+        for row in queryset.order_by('id').iterator(chunk_size=chunk_size):
+            yield record_type, row
+
+def iter_ndjson(project_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    encoder = DjangoJSONEncoder()
+    for record_type, row in export_records(project_id, chunk_size):
+        yield encoder.encode({'type': record_type, **row}) + '\n'
+
+class _LineBuffer:
+    """
+    File-like object handing back what csv.writer writes to it.
+    """
+    def write(self, value):
+        return value
+
+def iter_csv(project_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    writer = csv.DictWriter(_LineBuffer(), fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    yield writer.writerow(dict(zip(CSV_COLUMNS, CSV_COLUMNS)))
+    for record_type, row in export_records(project_id, chunk_size):
+        yield writer.writerow({'type': record_type, **row})
+
+def iter_export(project_id, export_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    if export_format == 'csv':
+        return iter_csv(project_id, chunk_size)
+    return iter_ndjson(project_id, chunk_size)
+
+async def aiter_export(project_id, export_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    `iter_export` for responses served over ASGI, where Django reads a
+    synchronous streaming iterator into memory before sending any of it.
+    The rows are still read by the synchronous generator, advanced one
+    chunk at a time in the thread that owns the database connection.
+    """
+    lines = iter_export(project_id, export_format, chunk_size)
+    next_chunk = sync_to_async(lambda: ''.join(islice(lines, chunk_size)), thread_sensitive=True)
+    while chunk := await next_chunk():
+        yield chunk
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Lets `?format=ndjson` through content negotiation. Exports are streamed
+    by the view, so this only ever renders error responses.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+class CSVRenderer(NDJSONRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
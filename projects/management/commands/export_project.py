@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+from projects.export import EXPORT_FORMATS, DEFAULT_CHUNK_SIZE, iter_export
+from projects.models import Project
+
+class Command(BaseCommand):
+    help = 'Export a project with its tasks, comments and logs as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_id', type=int)
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--output', help='File to write to, defaults to stdout')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        project_id = options['project_id']
+        if not Project.objects.filter(pk=project_id).exists():
+            raise CommandError(f'Project {project_id} does not exist')
+
+        chunks = iter_export(project_id, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
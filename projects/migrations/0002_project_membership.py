@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_memberships(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    ProjectMembership = apps.get_model('projects', 'ProjectMembership')
+
+    rows = [
+        ProjectMembership(user_id=manager_id, project_id=project_id, role='manager')
+        for project_id, manager_id in Project.objects.values_list('id', 'manager_id').iterator()
+    ]
+    rows += [
+        ProjectMembership(user_id=user_id, project_id=project_id, role='member')
+        for project_id, user_id in Project.members.through.objects.values_list('project_id', 'user_id').iterator()
+    ]
+    ProjectMembership.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('manager', 'Manager'), ('member', 'Member')], max_length=10)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='projects.project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='project_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'project', 'role'), name='unique_project_membership'), models.UniqueConstraint(condition=models.Q(('role', 'manager')), fields=('project',), name='unique_project_manager')],
+            },
+        ),
+        migrations.RunPython(populate_memberships, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models.signals import pre_save, post_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from project_management.counters import CounterFieldsMixin
+from project_management.response_cache import invalidate_user_lists, invalidate_project_lists
 
-class Project(models.Model):
+class Project(CounterFieldsMixin, models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
     manager = models.ForeignKey(User, on_delete=models.CASCADE, related_name='managed_projects')
@@ -10,15 +15,66 @@ class Project(models.Model):
     end_date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by the receivers in tasks.models, repaired in bulk by the
+    # rebuild_activity_counters command
+    task_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    counter_fields = ('task_count', 'comment_count', 'last_activity_at')
 
     def __str__(self):
         return self.title
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='project_created_idx'),
+        ]
 
     def is_member(self, user):
-        return user == self.manager or user in self.members.all()
+        return user.is_authenticated and self.memberships.filter(user=user).exists()
+
+class ProjectMembership(models.Model):
+    """
+    Materialized view of who can see a project.
+
+    The manager and every member get one row each, so visibility checks are
+    a single indexed lookup instead of a join over `manager` and `members`.
+    Rows are maintained by the signal handlers below and never written directly.
+    """
+    ROLE_MANAGER = 'manager'
+    ROLE_MEMBER = 'member'
+    ROLE_CHOICES = (
+        (ROLE_MANAGER, 'Manager'),
+        (ROLE_MEMBER, 'Member'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='project_memberships')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='memberships')
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'project', 'role'], name='unique_project_membership'),
+            models.UniqueConstraint(
+                fields=['project'],
+                condition=models.Q(role='manager'),
+                name='unique_project_manager'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.role} - {self.project_id}"
+
+    @classmethod
+    def project_ids_for(cls, user):
+        """
+        Subquery of the ids of every project the user can see.
+        Backed by the (user, project, role) unique index, so filtering
+        with `project__in` is an index-only semi-join.
+        """
+        return cls.objects.filter(user=user).values('project_id')
 
 class ProjectLog(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='logs')
@@ -29,6 +85,86 @@ class ProjectLog(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['project', '-created_at', 'id'], name='projectlog_project_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.action} - {self.project.title}" 
\ No newline at end of file
+        return f"{self.user.username} - {self.action} - {self.project.title}"
+
+@receiver(post_save, sender=Project)
+def sync_manager_membership(sender, instance, **kwargs):
+    ProjectMembership.objects.update_or_create(
+        project=instance,
+        role=ProjectMembership.ROLE_MANAGER,
+        defaults={'user_id': instance.manager_id}
+    )
+
+@receiver(m2m_changed, sender=Project.members.through)
+def sync_member_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    role = ProjectMembership.ROLE_MEMBER
+
+    if action == 'post_add' and pk_set:
+        if reverse:
+            pairs = [(instance.pk, project_id) for project_id in pk_set]
+        else:
+            pairs = [(user_id, instance.pk) for user_id in pk_set]
+        ProjectMembership.objects.bulk_create(
+            [ProjectMembership(user_id=user_id, project_id=project_id, role=role)
+             for user_id, project_id in pairs],
+            ignore_conflicts=True
+        )
+    elif action == 'post_remove' and pk_set:
+        if reverse:
+            lookup = {'user_id': instance.pk, 'project_id__in': pk_set}
+        else:
+            lookup = {'project_id': instance.pk, 'user_id__in': pk_set}
+        ProjectMembership.objects.filter(role=role, **lookup).delete()
+    elif action == 'post_clear':
+        lookup = {'user_id': instance.pk} if reverse else {'project_id': instance.pk}
+        ProjectMembership.objects.filter(role=role, **lookup).delete()
+
+@receiver(m2m_changed, sender=Project.members.through)
+def touch_projects_on_member_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # Members are part of the project representation, bump updated_at so
+    # its ETag and Last-Modified change with them.
+    if action in ('post_add', 'post_remove') and pk_set:
+        project_ids = pk_set if reverse else [instance.pk]
+    elif action == 'pre_clear' and reverse:
+        project_ids = list(instance.member_projects.values_list('pk', flat=True))
+    elif action == 'post_clear' and not reverse:
+        project_ids = [instance.pk]
+    else:
+        return
+    Project.objects.filter(pk__in=project_ids).update(updated_at=timezone.now())
+
+@receiver(pre_save, sender=Project)
+def load_previous_manager(sender, instance, **kwargs):
+    if not instance._state.adding:
+        instance._previous_manager_id = Project.objects.filter(
+            pk=instance.pk
+        ).values_list('manager_id', flat=True).first()
+
+@receiver(post_save, sender=Project)
+def invalidate_saved_project_lists(sender, instance, created, **kwargs):
+    # One version for every member's lists, only a new manager and the one
+    # they replaced see a different set of projects
+    invalidate_project_lists([instance.pk])
+    previous_manager_id = getattr(instance, '_previous_manager_id', None)
+    if created or previous_manager_id != instance.manager_id:
+        invalidate_user_lists([instance.manager_id, previous_manager_id])
+
+@receiver(pre_delete, sender=Project)
+def invalidate_deleted_project_lists(sender, instance, **kwargs):
+    invalidate_project_lists([instance.pk])
+
+@receiver(m2m_changed, sender=Project.members.through)
+def invalidate_member_lists(sender, instance, action, reverse, pk_set, **kwargs):
+    # Only the added or removed users see different projects and tasks
+    if action in ('post_add', 'post_remove') and pk_set:
+        invalidate_user_lists([instance.pk] if reverse else pk_set)
+    elif action == 'pre_clear':
+        if reverse:
+            invalidate_user_lists([instance.pk])
+        else:
+            invalidate_user_lists(instance.members.values_list('pk', flat=True))
@@ -1,4 +1,31 @@
 from rest_framework import permissions
+from .models import ProjectMembership
+
+def get_project_roles(request):
+    """
+    Roles held by the requesting user, keyed by project id.
+
+    Loaded with a single query the first time a permission class needs it
+    and cached on the request, so repeated checks during the same request
+    never touch the database again.
+    """
+    roles = getattr(request, '_project_roles', None)
+    if roles is None:
+        roles = {}
+        if request.user and request.user.is_authenticated:
+            memberships = ProjectMembership.objects.filter(
+                user=request.user
+            ).values_list('project_id', 'role')
+            for project_id, role in memberships:
+                roles.setdefault(project_id, set()).add(role)
+        request._project_roles = roles
+    return roles
+
+def is_project_member(request, project_id):
+    return project_id in get_project_roles(request)
+
+def is_project_manager(request, project_id):
+    return ProjectMembership.ROLE_MANAGER in get_project_roles(request).get(project_id, ())
 
 class IsProjectManagerOrReadOnly(permissions.BasePermission):
     """
@@ -8,14 +35,14 @@ class IsProjectManagerOrReadOnly(permissions.BasePermission):
         # Read permissions are allowed to any request,
         # so we'll always allow GET, HEAD or OPTIONS requests.
         if request.method in permissions.SAFE_METHODS:
-            return obj.is_member(request.user)
+            return is_project_member(request, obj.pk)
 
         # Write permissions are only allowed to the project manager
-        return obj.manager == request.user
+        return is_project_manager(request, obj.pk)
 
 class IsProjectMember(permissions.BasePermission):
     """
     Custom permission to only allow project members to access project details.
     """
     def has_object_permission(self, request, view, obj):
-        return obj.is_member(request.user) 
\ No newline at end of file
+        return is_project_member(request, obj.pk)
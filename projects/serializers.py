@@ -1,13 +1,14 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from project_management.serializers import DynamicFieldsMixin
 from .models import Project, ProjectLog
 
-class ProjectMemberSerializer(serializers.ModelSerializer):
+class ProjectMemberSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'last_name', 'email']
 
-class ProjectLogSerializer(serializers.ModelSerializer):
+class ProjectLogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = ProjectMemberSerializer(read_only=True)
 
     class Meta:
@@ -15,10 +16,53 @@ class ProjectLogSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'action', 'details', 'created_at']
         read_only_fields = ['user']
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """
+    Compact representation used by the project list endpoint.
+    Members and logs are left out so a page costs a constant number of
+    queries, cards show the denormalized counters instead.
+    """
+    manager = ProjectMemberSerializer(read_only=True)
+
+    class Meta:
+        model = Project
+        fields = [
+            'id', 'title', 'description', 'manager', 'start_date',
+            'end_date', 'created_at', 'updated_at', 'task_count',
+            'comment_count', 'last_activity_at'
+        ]
+        read_only_fields = fields
+
+class ProjectMembersSerializer(serializers.Serializer):
+    """
+    Batch of users to add to or remove from a project.
+    """
+    MAX_BATCH_SIZE = 1000
+
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=MAX_BATCH_SIZE
+    )
+
+    def validate_user_ids(self, user_ids):
+        user_ids = set(user_ids)
+        existing = set(User.objects.filter(id__in=user_ids).values_list('pk', flat=True))
+        missing = sorted(user_ids - existing)
+        if missing:
+            raise serializers.ValidationError(f'Users not found: {", ".join(map(str, missing))}')
+        return user_ids
+
+class ProjectSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    # Number of log entries embedded in the detail representation,
+    # the full history is available from /projects/{id}/logs/.
+    RECENT_LOGS_LIMIT = 20
+    # Rendered only when requested with ?expand=
+    expandable_fields = ('members', 'logs')
+
     manager = ProjectMemberSerializer(read_only=True)
     members = ProjectMemberSerializer(many=True, read_only=True)
-    logs = ProjectLogSerializer(many=True, read_only=True)
+    logs = serializers.SerializerMethodField()
     member_ids = serializers.ListField(
         child=serializers.IntegerField(),
         write_only=True,
@@ -30,16 +74,22 @@ class ProjectSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'manager', 'members',
             'member_ids', 'start_date', 'end_date', 'created_at',
-            'updated_at', 'logs'
+            'updated_at', 'task_count', 'comment_count', 'last_activity_at',
+            'logs'
         ]
-        read_only_fields = ['manager', 'created_at', 'updated_at']
+        read_only_fields = [
+            'manager', 'created_at', 'updated_at', 'task_count',
+            'comment_count', 'last_activity_at'
+        ]
+
+    def get_logs(self, obj):
+        logs = obj.logs.select_related('user')[:self.RECENT_LOGS_LIMIT]
+        return ProjectLogSerializer(logs, many=True).data
 
     def create(self, validated_data):
         member_ids = validated_data.pop('member_ids', [])
-        project = Project.objects.create(
-            manager=self.context['request'].user,
-            **validated_data
-        )
+        validated_data['manager'] = self.context['request'].user
+        project = Project.objects.create(**validated_data)
         
         # Add members
         if member_ids:
@@ -64,11 +114,10 @@ class ProjectSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
         instance.save()
 
-        # Update members if provided
+        # Update members if provided. set() only inserts the added rows and
+        # deletes the removed ones, so m2m_changed carries just the difference.
         if member_ids is not None:
-            instance.members.clear()
-            members = User.objects.filter(id__in=member_ids)
-            instance.members.add(*members)
+            instance.members.set(User.objects.filter(id__in=member_ids).values_list('pk', flat=True))
             
         # Create log entry
         ProjectLog.objects.create(
@@ -78,4 +127,4 @@ class ProjectSerializer(serializers.ModelSerializer):
             details=f'Project "{instance.title}" was updated'
         )
         
-        return instance 
\ No newline at end of file
+        return instance
@@ -1,10 +1,21 @@
+import csv
+import io
+import json
+from unittest import mock
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.db import connection
+from django.db.models.signals import m2m_changed
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework import status
 from datetime import date
-from .models import Project
+from tasks.models import Task, Comment
+from .models import Project, ProjectLog, ProjectMembership
+from .serializers import ProjectSerializer
 
 class ProjectTests(TestCase):
     def setUp(self):
@@ -100,4 +111,224 @@ class ProjectTests(TestCase):
         # Test ordering
         response = self.client.get(f'{url}?ordering=-created_at')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data['results']), 2) 
\ No newline at end of file
+        self.assertEqual(len(response.data['results']), 2) 
+
+    def test_project_list_query_count(self):
+        """Test project list query count does not grow with projects or logs"""
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('project-list')
+
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(url)
+
+        for i in range(5):
+            project = Project.objects.create(
+                title=f'Project {i}',
+                description='Description',
+                manager=self.manager,
+                start_date=date.today(),
+                end_date=date(2024, 12, 31)
+            )
+            project.members.add(self.member, self.non_member)
+            for j in range(3):
+                ProjectLog.objects.create(project=project, user=self.manager, action='updated', details=str(j))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(len(queries), len(baseline))
+        self.assertNotIn('logs', response.data['results'][0])
+        self.assertNotIn('members', response.data['results'][0])
+
+    def test_list_cache_versioned_per_project(self):
+        """Test a project write invalidates its members' cached lists whatever their number"""
+        url = reverse('project-list')
+        self.client.force_authenticate(user=self.member)
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        # A save replaces the project's version alone, not one per member
+        self.project.members.add(*[User.objects.create_user(username=f'user{number}') for number in range(20)])
+        self.project.title = 'Renamed'
+        with mock.patch('project_management.response_cache._bump_versions') as bump_versions:
+            self.project.save()
+        self.assertEqual(
+            {key for call in bump_versions.call_args_list for key in call.args[0]},
+            {f'list-project-version:projects:{self.project.pk}'}
+        )
+        self.project.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed')
+
+        # Joining a project changes the projects a user's lists are keyed by
+        self.client.force_authenticate(user=self.non_member)
+        self.assertEqual(self.client.get(url).data['count'], 0)
+        self.project.members.add(self.non_member)
+        self.assertEqual(self.client.get(url).data['count'], 1)
+
+    def test_project_logs(self):
+        """Test paginated project logs endpoint and capped detail logs"""
+        for i in range(ProjectSerializer.RECENT_LOGS_LIMIT + 5):
+            ProjectLog.objects.create(project=self.project, user=self.manager, action='updated', details=str(i))
+
+        self.client.force_authenticate(user=self.member)
+        response = self.client.get(reverse('project-detail', args=[self.project.id]) + '?expand=logs')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['logs']), ProjectSerializer.RECENT_LOGS_LIMIT)
+
+        response = self.client.get(reverse('project-logs', args=[self.project.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], ProjectSerializer.RECENT_LOGS_LIMIT + 5)
+
+        # Non-members can't read the history
+        self.client.force_authenticate(user=self.non_member)
+        response = self.client.get(reverse('project-logs', args=[self.project.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_membership_sync(self):
+        """Test the membership table follows manager and member changes"""
+        def roles():
+            return set(ProjectMembership.objects.filter(project=self.project).values_list('user__username', 'role'))
+
+        self.assertEqual(roles(), {('manager', 'manager'), ('member', 'member')})
+
+        # Reassigning the manager moves the manager row
+        self.project.manager = self.non_member
+        self.project.save()
+        self.assertEqual(roles(), {('nonmember', 'manager'), ('member', 'member')})
+
+        # Reverse side of the relation is kept in sync as well
+        self.manager.member_projects.add(self.project)
+        self.assertIn(('manager', 'member'), roles())
+
+        self.project.members.remove(self.member)
+        self.assertEqual(roles(), {('nonmember', 'manager'), ('manager', 'member')})
+
+        self.project.members.clear()
+        self.assertEqual(roles(), {('nonmember', 'manager')})
+
+    def test_member_updates_are_diffs(self):
+        """Test member_ids updates only write and signal the changed members"""
+        others = [User.objects.create(username=f'user{i}') for i in range(3)]
+        self.project.members.add(*others[:2])
+        changes = []
+
+        def record(sender, action, pk_set, **kwargs):
+            if action in ('post_add', 'post_remove', 'post_clear'):
+                changes.append((action, pk_set))
+
+        m2m_changed.connect(record, sender=Project.members.through)
+        self.addCleanup(m2m_changed.disconnect, record, sender=Project.members.through)
+
+        self.client.force_authenticate(user=self.manager)
+        member_ids = [self.member.id, others[1].id, others[2].id]
+        response = self.client.patch(
+            reverse('project-detail', args=[self.project.id]), {'member_ids': member_ids}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(changes, [('post_remove', {others[0].id}), ('post_add', {others[2].id})])
+        self.assertEqual(set(self.project.members.values_list('pk', flat=True)), set(member_ids))
+
+    def test_member_endpoints(self):
+        """Test adding and removing member batches"""
+        users = User.objects.bulk_create([User(username=f'user{i}') for i in range(200)])
+        self.project.members.add(*users[:150])
+        url = reverse('project-members', args=[self.project.id])
+
+        self.client.force_authenticate(user=self.member)
+        response = self.client.post(url, {'user_ids': [users[150].id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.post(url, {'user_ids': [users[0].id, 999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        joining = [users[0].id, users[150].id, users[151].id]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {'user_ids': joining}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'added': sorted(joining[1:])})
+        inserts = [
+            q['sql'] for q in queries
+            if q['sql'].startswith('INSERT') and 'INTO "projects_project_members"' in q['sql']
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.project.members.count(), 153)
+        self.assertTrue(ProjectMembership.objects.filter(project=self.project, user=users[151]).exists())
+
+        response = self.client.delete(url, {'user_ids': [users[151].id, users[199].id]}, format='json')
+        self.assertEqual(response.data, {'removed': [users[151].id]})
+        self.assertEqual(self.project.members.count(), 152)
+        self.assertFalse(ProjectMembership.objects.filter(project=self.project, user=users[151]).exists())
+        self.assertEqual(
+            list(ProjectLog.objects.filter(project=self.project).values_list('action', flat=True)[:2]),
+            ['members_removed', 'members_added']
+        )
+
+    def test_project_visibility_query(self):
+        """Test project visibility resolves through the membership table"""
+        self.client.force_authenticate(user=self.member)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('project-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+        for query in queries:
+            self.assertNotIn('DISTINCT', query['sql'])
+
+    def test_project_export(self):
+        """Test streaming NDJSON and CSV exports"""
+        task = Task.objects.create(
+            title='Exported Task',
+            description='Description',
+            project=self.project,
+            assigned_to=self.member,
+            due_date=date(2024, 12, 31)
+        )
+        Comment.objects.create(task=task, user=self.member, content='Exported, comment')
+        url = reverse('project-export', args=[self.project.id])
+
+        self.client.force_authenticate(user=self.member)
+        response = self.client.get(url, {'format': 'ndjson'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['type'] for record in records], ['project', 'task', 'comment'])
+        self.assertEqual(records[1]['title'], 'Exported Task')
+
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['type'] for row in rows], ['project', 'task', 'comment'])
+        self.assertEqual(rows[2]['content'], 'Exported, comment')
+
+        # Non-members can't export
+        self.client.force_authenticate(user=self.non_member)
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # The management command uses the same engine
+        output = io.StringIO()
+        call_command('export_project', self.project.id, stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 3)
+
+    async def test_project_export_over_asgi(self):
+        """Test exports served over ASGI stream from an async iterator"""
+        await Task.objects.acreate(
+            title='Exported Task',
+            description='Description',
+            project=self.project,
+            assigned_to=self.member,
+            due_date=date(2024, 12, 31)
+        )
+        response = await self.async_client.get(
+            reverse('project-export', args=[self.project.id]),
+            headers={'Authorization': f'Bearer {AccessToken.for_user(self.member)}'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        records = [json.loads(line) for line in content.decode().splitlines()]
+        self.assertEqual([record['type'] for record in records], ['project', 'task'])
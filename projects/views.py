@@ -1,17 +1,33 @@
 from rest_framework import viewsets, filters
+from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from django.db.models import Sum
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Project
-from .serializers import ProjectSerializer
+from search.filters import FullTextSearchFilter
+from tasks.models import ProjectTaskStats, ProjectAssigneeStats, ProjectDueDateStats, TaskStatsDelta
+from .models import Project, ProjectLog, ProjectMembership
+from .serializers import ProjectSerializer, ProjectListSerializer, ProjectLogSerializer, ProjectMembersSerializer
 from .permissions import IsProjectManagerOrReadOnly, IsProjectMember
-from django.db import models
+from .export import iter_export, aiter_export, NDJSONRenderer, CSVRenderer
+from django.db import models, transaction
+from project_management.conditional import ConditionalGetMixin
+from project_management.response_cache import ProjectCachedListMixin
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(ProjectCachedListMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [IsProjectManagerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'start_date', 'end_date']
     ordering = ['-created_at']
+    cursor_ordering = ('-created_at', 'id')
+
+    def get_list_project_ids(self, user):
+        return ProjectMembership.project_ids_for(user).values_list('project_id', flat=True)
 
     def get_queryset(self):
         """
@@ -19,9 +35,141 @@ class ProjectViewSet(viewsets.ModelViewSet):
         for the currently authenticated user.
         """
         user = self.request.user
-        return Project.objects.filter(
-            models.Q(manager=user) | models.Q(members=user)
-        ).distinct()
+        queryset = Project.objects.filter(id__in=ProjectMembership.project_ids_for(user))
+
+        # Only load the relations the response renders
+        serializer_class = self.get_serializer_class()
+        if self.action in ('list', 'retrieve', 'update', 'partial_update'):
+            if serializer_class.wants(self.request, 'manager'):
+                queryset = queryset.select_related('manager')
+            if self.action != 'list' and serializer_class.wants(self.request, 'members'):
+                queryset = queryset.prefetch_related('members')
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ProjectListSerializer
+        if self.action == 'logs':
+            return ProjectLogSerializer
+        if self.action == 'members':
+            return ProjectMembersSerializer
+        return ProjectSerializer
+
+    def get_object_validators(self, obj):
+        parts, last_modified = super().get_object_validators(obj)
+        serializer_class = self.get_serializer_class()
+        if serializer_class.wants(self.request, 'logs'):
+            # compact_history prunes the oldest logs without touching the
+            # project, the ids of the rendered logs tell them apart
+            parts.append(list(obj.logs.values_list('pk', flat=True)[:serializer_class.RECENT_LOGS_LIMIT]))
+            last_modified = None
+        return parts, last_modified
 
     def perform_create(self, serializer):
-        serializer.save(manager=self.request.user) 
\ No newline at end of file
+        serializer.save(manager=self.request.user)
+
+    @action(detail=True, methods=['get'], filter_backends=[])
+    def logs(self, request, pk=None):
+        """
+        Paginated activity history of a project.
+        """
+        project = self.get_object()
+        queryset = ProjectLog.objects.filter(project=project).select_related('user')
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['post', 'delete'], filter_backends=[])
+    def members(self, request, pk=None):
+        """
+        Add (POST) or remove (DELETE) a batch of members, {"user_ids": [...]}.
+        Only the rows that change are written, whatever the project's size.
+        """
+        project = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_ids = serializer.validated_data['user_ids']
+
+        with transaction.atomic():
+            current = set(project.members.filter(pk__in=user_ids).values_list('pk', flat=True))
+            if request.method == 'POST':
+                changed, action, verb = user_ids - current, 'members_added', 'added to'
+                if changed:
+                    project.members.add(*changed)
+            else:
+                changed, action, verb = current, 'members_removed', 'removed from'
+                if changed:
+                    project.members.remove(*changed)
+            if changed:
+                ProjectLog.objects.create(
+                    project=project,
+                    user=request.user,
+                    action=action,
+                    details=f'{len(changed)} members were {verb} project "{project.title}"'
+                )
+
+        key = 'added' if request.method == 'POST' else 'removed'
+        return Response({key: sorted(changed)})
+
+    @action(detail=True, methods=['get'], filter_backends=[],
+            renderer_classes=[JSONRenderer, NDJSONRenderer, CSVRenderer])
+    def export(self, request, pk=None):
+        """
+        Stream the project with its tasks, comments and logs
+        as NDJSON (default) or CSV, selected with ?format=.
+        """
+        project = self.get_object()
+        export_format = 'csv' if request.accepted_renderer.format == 'csv' else 'ndjson'
+        content_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+
+        # ASGI servers are handed an async iterator, a sync one would be
+        # read whole into memory before the first byte goes out
+        if isinstance(request._request, ASGIRequest):
+            lines = aiter_export(project.pk, export_format)
+        else:
+            lines = iter_export(project.pk, export_format)
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="project-{project.pk}.{export_format}"'
+        return response
+
+    @action(detail=True, methods=['get'], filter_backends=[])
+    def stats(self, request, pk=None):
+        """
+        Dashboard aggregates answered from the project's summary rows,
+        so the cost doesn't depend on the number of tasks.
+        """
+        project = self.get_object()
+        summary = ProjectTaskStats.objects.filter(project=project).first() or ProjectTaskStats(project=project)
+        overdue = ProjectDueDateStats.objects.filter(
+            project=project,
+            due_date__lt=timezone.localdate()
+        ).aggregate(total=Sum('open_count'))['total'] or 0
+        assignees = ProjectAssigneeStats.objects.filter(
+            project=project,
+            task_count__gt=0
+        ).select_related('user').order_by('-open_count', 'user_id')
+
+        return Response({
+            'project': project.pk,
+            'task_count': summary.task_count,
+            'status': {
+                status: getattr(summary, field)
+                for status, field in TaskStatsDelta.STATUS_FIELDS.items()
+            },
+            'pinned': summary.pinned_count,
+            'overdue': overdue,
+            'assignees': [
+                {
+                    'user_id': stats.user_id,
+                    'username': stats.user.username,
+                    'task_count': stats.task_count,
+                    'open_count': stats.open_count,
+                }
+                for stats in assignees
+            ],
+        })
@@ -0,0 +1,151 @@
+"""
+Full-text search backends.
+
+A backend keeps a text index of the models listed in INDEXED_FIELDS and
+narrows a queryset to the rows matching a query, annotated with their
+`search_rank` (lower is better), so visibility, ranking and pagination all
+run in the same SQL statement. The SQLite backend uses one FTS5 virtual
+table per model; databases without a backend fall back to DRF's icontains
+search. Point SEARCH_BACKEND at the
+dotted path of a SearchBackend subclass to plug in another engine.
+"""
+
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F, FloatField, Func, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Indexed text columns per model, keyed by model label
+INDEXED_FIELDS = {
+    'projects.Project': ('title', 'description'),
+    'tasks.Task': ('title', 'description'),
+    'tasks.Comment': ('content',),
+}
+
+class SearchBackend:
+    """
+    Interface of a search backend. The base class indexes nothing and
+    answers every query with None, meaning "search not supported".
+    """
+    def setup(self):
+        pass
+
+    def index(self, instances):
+        pass
+
+    def remove(self, model, pks):
+        pass
+
+    def filter(self, queryset, query):
+        """
+        `queryset` narrowed to the rows matching `query` and annotated with
+        their `search_rank`, or None if search isn't supported.
+        """
+        return None
+
+    def search(self, model, query):
+        """
+        Primary keys of every `model` row matching `query`, best match first.
+        """
+        queryset = self.filter(model._default_manager.all(), query)
+        if queryset is None:
+            return None
+        return list(queryset.order_by('search_rank', 'pk').values_list('pk', flat=True))
+
+class FTSRank(Func):
+    """
+    FTS5 rank of the outer row in `table` for `match`. The rowid lookup
+    lets FTS5 seek straight to the row instead of walking every match.
+    """
+    arg_joiner = ' AND rowid = '
+    output_field = FloatField()
+
+    def __init__(self, table, match):
+        super().__init__(
+            Value(match), F('pk'),
+            template=f'(SELECT rank FROM {table} WHERE {table} MATCH %(expressions)s)',
+        )
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    SQLite FTS5 index. Each model gets a `search_<app>_<model>` table whose
+    rowid is the model's primary key, so results join straight back to it.
+    """
+    def table_name(self, model):
+        return f'search_{model._meta.app_label}_{model._meta.model_name}'
+
+    def setup(self):
+        with connection.cursor() as cursor:
+            for label, fields in INDEXED_FIELDS.items():
+                app_label, model_name = label.lower().split('.')
+                cursor.execute(
+                    f'CREATE VIRTUAL TABLE IF NOT EXISTS search_{app_label}_{model_name} '
+                    f'USING fts5({", ".join(fields)}, tokenize="unicode61 remove_diacritics 2")'
+                )
+
+    def index(self, instances):
+        instances = list(instances)
+        if not instances:
+            return
+        model = type(instances[0])
+        fields = INDEXED_FIELDS[model._meta.label]
+        table = self.table_name(model)
+        columns = ', '.join(fields)
+        placeholders = ', '.join(['%s'] * (len(fields) + 1))
+
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {table} WHERE rowid = %s',
+                [(instance.pk,) for instance in instances]
+            )
+            cursor.executemany(
+                f'INSERT INTO {table} (rowid, {columns}) VALUES ({placeholders})',
+                [
+                    (instance.pk, *(getattr(instance, field) for field in fields))
+                    for instance in instances
+                ]
+            )
+
+    def remove(self, model, pks):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {self.table_name(model)} WHERE rowid = %s',
+                [(pk,) for pk in pks]
+            )
+
+    def filter(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        # Filtered in the same statement, so the visibility filters of
+        # `queryset` apply to every match and the database sorts by rank
+        table = connection.ops.quote_name(self.table_name(queryset.model))
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match])
+        ).annotate(search_rank=FTSRank(table, match))
+
+    def match_expression(self, query):
+        """
+        Turn free text into an FTS5 query: every word must match, the last
+        one as a prefix so results show up while the user is still typing.
+        Words are quoted so FTS5 operators in user input are taken literally.
+        """
+        words = re.findall(r'\w+', query)
+        if not words:
+            return ''
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTSBackend()
+    return SearchBackend()
@@ -0,0 +1,28 @@
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+from .backends import get_search_backend
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    `?search=` backed by the full-text index.
+
+    Matches are joined with the view's queryset, so project visibility
+    still applies, and come back best match first unless the client asked
+    for an explicit `?ordering=`. Falls back to DRF's icontains search when
+    the configured backend doesn't support the database.
+
+    List it after OrderingFilter in `filter_backends` so the rank ordering
+    isn't replaced by the view's default ordering.
+    """
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+
+        matches = get_search_backend().filter(queryset, query)
+        if matches is None:
+            return super().filter_queryset(request, queryset, view)
+
+        if api_settings.ORDERING_PARAM not in request.query_params:
+            matches = matches.order_by('search_rank', 'pk')
+        return matches
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+from search.backends import INDEXED_FIELDS, SQLiteFTSBackend
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    backend = SQLiteFTSBackend()
+    backend.setup()
+    for label in INDEXED_FIELDS:
+        model = apps.get_model(label)
+        batch = []
+        for instance in model.objects.only('pk', *INDEXED_FIELDS[label]).iterator(chunk_size=1000):
+            batch.append(instance)
+            if len(batch) == 1000:
+                backend.index(batch)
+                batch = []
+        backend.index(batch)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        for label in INDEXED_FIELDS:
+            app_label, model_name = label.lower().split('.')
+            cursor.execute(f'DROP TABLE IF EXISTS search_{app_label}_{model_name}')
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('projects', '0003_composite_indexes'),
+        ('tasks', '0002_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,21 @@
+from django.apps import apps
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from tasks.models import Task
+from tasks.signals import tasks_bulk_saved
+from .backends import INDEXED_FIELDS, get_search_backend
+
+def update_search_index(sender, instance, **kwargs):
+    get_search_backend().index([instance])
+
+def remove_from_search_index(sender, instance, **kwargs):
+    get_search_backend().remove(sender, [instance.pk])
+
+for label in INDEXED_FIELDS:
+    model = apps.get_model(label)
+    post_save.connect(update_search_index, sender=model, dispatch_uid=f'search_index_{label}')
+    post_delete.connect(remove_from_search_index, sender=model, dispatch_uid=f'search_remove_{label}')
+
+@receiver(tasks_bulk_saved, sender=Task)
+def update_search_index_bulk(sender, instances, **kwargs):
+    get_search_backend().index(instances)
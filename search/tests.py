@@ -0,0 +1,109 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from datetime import date
+from projects.models import Project
+from tasks.models import Task, Comment
+from .backends import get_search_backend
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+        # Create users
+        self.manager = User.objects.create_user(username='manager', password='manager123')
+        self.outsider = User.objects.create_user(username='outsider', password='outsider123')
+
+        # Create projects, one of them invisible to the manager
+        self.project = Project.objects.create(
+            title='Payments Platform',
+            description='Billing and invoicing',
+            manager=self.manager,
+            start_date=date.today(),
+            end_date=date(2024, 12, 31)
+        )
+        self.other_project = Project.objects.create(
+            title='Payments Research',
+            description='Someone else',
+            manager=self.outsider,
+            start_date=date.today(),
+            end_date=date(2024, 12, 31)
+        )
+
+        self.task = self.create_task(self.project, 'Fix invoice rounding', 'Invoices round totals wrongly')
+        self.weak_match = self.create_task(self.project, 'Refactor exports', 'Mentions invoice once')
+        self.hidden = self.create_task(self.other_project, 'Invoice audit', 'Invoice invoice invoice')
+
+    def create_task(self, project, title, description):
+        return Task.objects.create(
+            title=title,
+            description=description,
+            project=project,
+            assigned_to=project.manager,
+            due_date=date(2024, 12, 31)
+        )
+
+    def search(self, url, query):
+        response = self.client.get(url, {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_task_search(self):
+        """Test ranked task search limited to visible projects"""
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('task-list')
+
+        self.assertEqual(self.search(url, 'invoice'), [self.task.id, self.weak_match.id])
+        # The last word matches as a prefix
+        self.assertEqual(self.search(url, 'fix invo'), [self.task.id])
+        # FTS5 syntax in user input is taken literally
+        self.assertEqual(self.search(url, 'invoice OR "exports'), [])
+
+    def test_visible_matches_beyond_other_users_matches(self):
+        """Test visible matches are found however many hidden rows rank higher"""
+        hidden = Task.objects.bulk_create([
+            Task(
+                title=f'Invoice batch {number}',
+                description='Invoice invoice invoice',
+                project=self.other_project,
+                assigned_to=self.outsider,
+                due_date=date(2024, 12, 31)
+            )
+            for number in range(1100)
+        ])
+        get_search_backend().index(hidden)
+        self.client.force_authenticate(user=self.manager)
+
+        response = self.client.get(reverse('task-list'), {'search': 'invoice'})
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.task.id, self.weak_match.id]
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test the index is kept in sync on save and delete"""
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('task-list')
+
+        self.task.title = 'Fix currency rounding'
+        self.task.description = 'Totals are off'
+        self.task.save()
+        self.assertEqual(self.search(url, 'currency'), [self.task.id])
+        self.assertEqual(self.search(url, 'invoice'), [self.weak_match.id])
+
+        self.weak_match.delete()
+        self.assertEqual(self.search(url, 'invoice'), [])
+        self.assertEqual(get_search_backend().search(Task, 'exports'), [])
+
+    def test_project_and_comment_search(self):
+        """Test project and comment search"""
+        self.client.force_authenticate(user=self.manager)
+        self.assertEqual(self.search(reverse('project-list'), 'payments'), [self.project.id])
+
+        comment = Comment.objects.create(task=self.task, user=self.manager, content='Reproduced on staging')
+        Comment.objects.create(task=self.task, user=self.manager, content='Unrelated')
+        url = reverse('task-comments', args=[self.task.id])
+        self.assertEqual(self.search(url, 'staging'), [comment.id])
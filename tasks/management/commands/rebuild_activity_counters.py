@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from projects.models import Project
+from tasks.models import rebuild_activity_counters
+
+class Command(BaseCommand):
+    help = 'Recompute the comment, task and last activity counters of projects and tasks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of projects recomputed per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        project_ids = list(Project.objects.order_by('pk').values_list('pk', flat=True))
+
+        for start in range(0, len(project_ids), batch_size):
+            rebuild_activity_counters(project_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt activity counters for {len(project_ids)} projects'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from projects.models import Project
+from tasks.models import rebuild_project_stats
+
+class Command(BaseCommand):
+    help = 'Rebuild the project dashboard counters from the tasks table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of projects recomputed per aggregate query')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        project_ids = list(Project.objects.order_by('pk').values_list('pk', flat=True))
+
+        for start in range(0, len(project_ids), batch_size):
+            rebuild_project_stats(project_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt task stats for {len(project_ids)} projects'))
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_stats(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    ProjectTaskStats = apps.get_model('tasks', 'ProjectTaskStats')
+    ProjectAssigneeStats = apps.get_model('tasks', 'ProjectAssigneeStats')
+    ProjectDueDateStats = apps.get_model('tasks', 'ProjectDueDateStats')
+
+    stats = {}
+    assignees = {}
+    due_dates = {}
+    groups = Task.objects.values(
+        'project_id', 'status', 'is_pinned', 'assigned_to_id', 'due_date'
+    ).annotate(count=models.Count('id')).order_by()
+    for group in groups:
+        count = group['count']
+        is_open = group['status'] != 'done'
+
+        project = stats.setdefault(group['project_id'], ProjectTaskStats(project_id=group['project_id']))
+        project.task_count += count
+        if group['status'] in ('todo', 'in_progress', 'done'):
+            setattr(project, f"{group['status']}_count", getattr(project, f"{group['status']}_count") + count)
+        if group['is_pinned']:
+            project.pinned_count += count
+
+        key = (group['project_id'], group['assigned_to_id'])
+        assignee = assignees.setdefault(key, ProjectAssigneeStats(project_id=key[0], user_id=key[1]))
+        assignee.task_count += count
+        if is_open:
+            assignee.open_count += count
+            key = (group['project_id'], group['due_date'])
+            due_date = due_dates.setdefault(key, ProjectDueDateStats(project_id=key[0], due_date=key[1]))
+            due_date.open_count += count
+
+    ProjectTaskStats.objects.bulk_create(stats.values(), batch_size=1000)
+    ProjectAssigneeStats.objects.bulk_create(assignees.values(), batch_size=1000)
+    ProjectDueDateStats.objects.bulk_create(due_dates.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0003_composite_indexes'),
+        ('tasks', '0002_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectTaskStats',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_stats', serialize=False, to='projects.project')),
+                ('task_count', models.IntegerField(default=0)),
+                ('todo_count', models.IntegerField(default=0)),
+                ('in_progress_count', models.IntegerField(default=0)),
+                ('done_count', models.IntegerField(default=0)),
+                ('pinned_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProjectAssigneeStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_count', models.IntegerField(default=0)),
+                ('open_count', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignee_stats', to='projects.project')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('project', 'user'), name='unique_project_assignee_stats')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectDueDateStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_date', models.DateField()),
+                ('open_count', models.IntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='due_date_stats', to='projects.project')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('project', 'due_date'), name='unique_project_due_date_stats')],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:13
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+
+def populate_counters(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    Comment = apps.get_model('tasks', 'Comment')
+    TaskLog = apps.get_model('tasks', 'TaskLog')
+    Project = apps.get_model('projects', 'Project')
+    ProjectLog = apps.get_model('projects', 'ProjectLog')
+
+    comments = Comment.objects.filter(task=OuterRef('pk')).order_by().values('task')
+    task_logs = TaskLog.objects.filter(task=OuterRef('pk')).order_by().values('task')
+    tasks = Task.objects.filter(project=OuterRef('pk')).order_by().values('project')
+    project_logs = ProjectLog.objects.filter(project=OuterRef('pk')).order_by().values('project')
+
+    def latest(queryset, field):
+        return Coalesce(Subquery(queryset.annotate(latest=Max(field)).values('latest')), 'created_at')
+
+    Task.objects.update(
+        comment_count=Coalesce(Subquery(comments.annotate(count=Count('pk')).values('count')), 0),
+        last_activity_at=Greatest('created_at', latest(comments, 'created_at'), latest(task_logs, 'created_at')),
+    )
+    Project.objects.update(
+        task_count=Coalesce(Subquery(tasks.annotate(count=Count('pk')).values('count')), 0),
+        comment_count=Coalesce(Subquery(tasks.annotate(count=Sum('comment_count')).values('count')), 0),
+        last_activity_at=Greatest('created_at', latest(tasks, 'last_activity_at'), latest(project_logs, 'created_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_activity_counters'),
+        ('tasks', '0003_project_task_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,17 @@
-from django.db import models
+from collections import Counter, defaultdict
+from django.db import models, transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from django.contrib.auth.models import User
-from projects.models import Project
+from projects.models import Project, ProjectLog
+from project_management.counters import CounterFieldsMixin
+from project_management.response_cache import invalidate_project_lists
+from .signals import tasks_bulk_saved
 
-class Task(models.Model):
+class Task(CounterFieldsMixin, models.Model):
     STATUS_CHOICES = (
         ('todo', 'To Do'),
         ('in_progress', 'In Progress'),
@@ -18,13 +27,56 @@ class Task(models.Model):
     is_pinned = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by the activity receivers below
+    comment_count = models.IntegerField(default=0)
+    last_activity_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-is_pinned', '-created_at']
+        indexes = [
+            models.Index(fields=['-is_pinned', '-created_at', 'id'], name='task_ordering_idx'),
+            models.Index(fields=['project', '-is_pinned', '-created_at', 'id'], name='task_project_idx'),
+            models.Index(fields=['project', 'status', '-is_pinned', '-created_at', 'id'], name='task_project_status_idx'),
+            models.Index(fields=['assigned_to', '-is_pinned', '-created_at', 'id'], name='task_assignee_idx'),
+            models.Index(fields=['project', 'due_date'], name='task_project_due_idx'),
+        ]
+
+    counter_fields = ('comment_count', 'last_activity_at')
+
+    # Fields that decide which dashboard counters a task contributes to
+    STATS_FIELDS = ('project_id', 'status', 'is_pinned', 'assigned_to_id', 'due_date')
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the row looked like, batch writers and cascading
+        # deletes move the counters from this state without re-reading it.
+        if not instance.get_deferred_fields().intersection(cls.STATS_FIELDS):
+            instance._stats_state = instance.stats_state()
+        return instance
+
+    def stats_state(self):
+        return tuple(getattr(self, field) for field in self.STATS_FIELDS)
+
+    def load_stored_state(self):
+        """
+        Replace the stats state and comment_count, which saves never
+        refresh, with what the row holds now: the instance may be stale.
+        """
+        stored = Task.objects.filter(pk=self.pk).values_list('comment_count', *self.STATS_FIELDS).first()
+        if stored is not None:
+            self.comment_count, self._stats_state = stored[0], stored[1:]
+        else:
+            self._stats_state = None
+
+    def delete(self, *args, **kwargs):
+        # Count what is actually being deleted
+        self.load_stored_state()
+        return super().delete(*args, **kwargs)
+
 class Comment(models.Model):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -34,6 +86,9 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['task', '-created_at', 'id'], name='comment_task_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user.username} on {self.task.title}"
@@ -47,6 +102,350 @@ class TaskLog(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['task', '-created_at', 'id'], name='tasklog_task_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.action} - {self.task.title}"
+
+class ProjectTaskStats(models.Model):
+    """
+    Per-project task counters behind the dashboard endpoint, maintained
+    incrementally by TaskStatsDelta as tasks are saved and deleted.
+    """
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='task_stats')
+    task_count = models.IntegerField(default=0)
+    todo_count = models.IntegerField(default=0)
+    in_progress_count = models.IntegerField(default=0)
+    done_count = models.IntegerField(default=0)
+    pinned_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Task stats for {self.project_id}"
+
+class ProjectAssigneeStats(models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='assignee_stats')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    task_count = models.IntegerField(default=0)
+    open_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'user'], name='unique_project_assignee_stats'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.action} - {self.task.title}" 
\ No newline at end of file
+        return f"Task stats for {self.user_id} in {self.project_id}"
+
+class ProjectDueDateStats(models.Model):
+    """
+    Open tasks per due date. Overdue tasks are the sum over the dates
+    before today, which stays correct as days pass without any writes.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='due_date_stats')
+    due_date = models.DateField()
+    open_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'due_date'], name='unique_project_due_date_stats'),
+        ]
+
+    def __str__(self):
+        return f"Open tasks due {self.due_date} in {self.project_id}"
+
+class TaskStatsDelta:
+    """
+    Accumulates counter changes for a batch of task states and writes them
+    with one F() update per touched row.
+    A state is the tuple returned by Task.stats_state().
+    """
+    STATUS_FIELDS = {status: f'{status}_count' for status, _ in Task.STATUS_CHOICES}
+
+    def __init__(self):
+        self.projects = defaultdict(Counter)
+        self.assignees = defaultdict(Counter)
+        self.due_dates = Counter()
+
+    def add(self, state, count=1):
+        project_id, status, is_pinned, assigned_to_id, due_date = state
+        is_open = status != 'done'
+
+        project = self.projects[project_id]
+        project['task_count'] += count
+        if status in self.STATUS_FIELDS:
+            project[self.STATUS_FIELDS[status]] += count
+        if is_pinned:
+            project['pinned_count'] += count
+
+        assignee = self.assignees[(project_id, assigned_to_id)]
+        assignee['task_count'] += count
+        if is_open:
+            assignee['open_count'] += count
+            self.due_dates[(project_id, due_date)] += count
+
+    def change(self, old_state, new_state):
+        if old_state != new_state:
+            if old_state is not None:
+                self.add(old_state, -1)
+            self.add(new_state)
+
+    def apply(self):
+        # Rows are only created for increments, so decrements issued while a
+        # project is being deleted never insert rows for it.
+        ProjectTaskStats.objects.bulk_create([
+            ProjectTaskStats(project_id=project_id)
+            for project_id, counts in self.projects.items() if counts['task_count'] > 0
+        ], ignore_conflicts=True)
+        ProjectAssigneeStats.objects.bulk_create([
+            ProjectAssigneeStats(project_id=project_id, user_id=user_id)
+            for (project_id, user_id), counts in self.assignees.items() if counts['task_count'] > 0
+        ], ignore_conflicts=True)
+        ProjectDueDateStats.objects.bulk_create([
+            ProjectDueDateStats(project_id=project_id, due_date=due_date)
+            for (project_id, due_date), count in self.due_dates.items() if count > 0
+        ], ignore_conflicts=True)
+
+        for project_id, counts in self.projects.items():
+            self._update(ProjectTaskStats.objects.filter(project_id=project_id), counts)
+        for (project_id, user_id), counts in self.assignees.items():
+            self._update(ProjectAssigneeStats.objects.filter(project_id=project_id, user_id=user_id), counts)
+        for (project_id, due_date), count in self.due_dates.items():
+            self._update(ProjectDueDateStats.objects.filter(project_id=project_id, due_date=due_date), {'open_count': count})
+
+    def _update(self, queryset, counts):
+        changes = {field: F(field) + count for field, count in counts.items() if count}
+        if changes:
+            queryset.update(**changes)
+
+    def rows(self):
+        """
+        Unsaved stats rows holding the accumulated counts, used when
+        rebuilding summaries from scratch.
+        """
+        stats = [ProjectTaskStats(project_id=project_id, **counts) for project_id, counts in self.projects.items()]
+        assignees = [
+            ProjectAssigneeStats(project_id=project_id, user_id=user_id, **counts)
+            for (project_id, user_id), counts in self.assignees.items()
+        ]
+        due_dates = [
+            ProjectDueDateStats(project_id=project_id, due_date=due_date, open_count=count)
+            for (project_id, due_date), count in self.due_dates.items() if count
+        ]
+        return stats, assignees, due_dates
+
+def rebuild_project_stats(project_ids):
+    """
+    Recompute the dashboard counters of `project_ids` from the tasks table
+    with a single grouped aggregate query.
+    """
+    delta = TaskStatsDelta()
+    groups = Task.objects.filter(project_id__in=project_ids).values(
+        *Task.STATS_FIELDS
+    ).annotate(count=Count('id')).order_by()
+    for group in groups:
+        delta.add(tuple(group[field] for field in Task.STATS_FIELDS), group['count'])
+
+    stats, assignees, due_dates = delta.rows()
+    with transaction.atomic():
+        for model in (ProjectTaskStats, ProjectAssigneeStats, ProjectDueDateStats):
+            model.objects.filter(project_id__in=project_ids).delete()
+        ProjectTaskStats.objects.bulk_create(stats)
+        ProjectAssigneeStats.objects.bulk_create(assignees)
+        ProjectDueDateStats.objects.bulk_create(due_dates)
+
+def rebuild_activity_counters(project_ids):
+    """
+    Recompute comment_count, task_count and last_activity_at of
+    `project_ids` and their tasks, with one correlated UPDATE per table.
+    Activity is the creation of the row itself, its comments and its logs.
+    """
+    comments = Comment.objects.filter(task=OuterRef('pk')).order_by().values('task')
+    task_logs = TaskLog.objects.filter(task=OuterRef('pk')).order_by().values('task')
+    tasks = Task.objects.filter(project=OuterRef('pk')).order_by().values('project')
+    project_logs = ProjectLog.objects.filter(project=OuterRef('pk')).order_by().values('project')
+
+    def latest(queryset, field):
+        return Coalesce(Subquery(queryset.annotate(latest=Max(field)).values('latest')), 'created_at')
+
+    with transaction.atomic():
+        Task.objects.filter(project_id__in=project_ids).update(
+            comment_count=Coalesce(Subquery(comments.annotate(count=Count('pk')).values('count')), 0),
+            last_activity_at=Greatest(
+                'created_at', latest(comments, 'created_at'), latest(task_logs, 'created_at')
+            ),
+        )
+        Project.objects.filter(pk__in=project_ids).update(
+            task_count=Coalesce(Subquery(tasks.annotate(count=Count('pk')).values('count')), 0),
+            comment_count=Coalesce(Subquery(tasks.annotate(count=Sum('comment_count')).values('count')), 0),
+            last_activity_at=Greatest(
+                'created_at', latest(tasks, 'last_activity_at'), latest(project_logs, 'created_at')
+            ),
+        )
+
+@receiver(pre_save, sender=Task)
+def load_task_stats_state(sender, instance, **kwargs):
+    # A single save may come from a stale instance, so it reads the stored
+    # state with one primary key lookup instead of trusting the snapshot.
+    # comment_count is read too, a moved task takes the stored count along.
+    if not instance._state.adding:
+        instance.load_stored_state()
+        instance._previous_project_id = instance._stats_state[0] if instance._stats_state else None
+
+@receiver(post_save, sender=Task)
+def update_task_stats(sender, instance, created, **kwargs):
+    delta = TaskStatsDelta()
+    new_state = instance.stats_state()
+    delta.change(None if created else instance._stats_state, new_state)
+    delta.apply()
+    instance._stats_state = new_state
+
+@receiver(post_delete, sender=Task)
+def remove_task_stats(sender, instance, **kwargs):
+    state = getattr(instance, '_stats_state', None) or instance.stats_state()
+    delta = TaskStatsDelta()
+    delta.add(state, -1)
+    delta.apply()
+
+@receiver(tasks_bulk_saved, sender=Task)
+def update_task_stats_bulk(sender, instances, created, **kwargs):
+    delta = TaskStatsDelta()
+    for task in instances:
+        new_state = task.stats_state()
+        delta.change(None if created else task._stats_state, new_state)
+        task._stats_state = new_state
+    delta.apply()
+
+def _origin_model(origin):
+    # post_delete's origin is the deleted instance or queryset, None on save
+    return getattr(origin, 'model', type(origin)) if origin is not None else None
+
+# Activity counters. Every change also bumps updated_at, the counters are
+# part of the task and project representations and their ETags and
+# Last-Modified must follow them.
+
+def _task_project(task_id):
+    return Project.objects.filter(pk__in=Task.objects.filter(pk=task_id).values('project_id'))
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, **kwargs):
+    now = timezone.now()
+    if not created:
+        # Comments are embedded in the task representation
+        Task.objects.filter(pk=instance.task_id).update(updated_at=now)
+        return
+    activity = {'comment_count': F('comment_count') + 1, 'last_activity_at': instance.created_at, 'updated_at': now}
+    Task.objects.filter(pk=instance.task_id).update(**activity)
+    _task_project(instance.task_id).update(**activity)
+
+def _surviving_task(comment, origin):
+    """
+    Queryset of the task of a deleted `comment`, or None if the same delete
+    removes the task: comments removed along with their task are counted by
+    remove_task_activity, ones removed with their project have nothing left
+    to count. Deleting users also deletes the tasks assigned to them, which
+    are still there while the comments go.
+    """
+    origin_model = _origin_model(origin)
+    if origin_model in (Task, Project):
+        return None
+    tasks = Task.objects.filter(pk=comment.task_id)
+    if origin_model is User:
+        users = [origin.pk] if isinstance(origin, User) else origin.values('pk')
+        tasks = tasks.exclude(assigned_to__in=users)
+    return tasks
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    tasks = _surviving_task(instance, origin)
+    if tasks is None:
+        return
+    changes = {'comment_count': F('comment_count') - 1, 'updated_at': timezone.now()}
+    tasks.update(**changes)
+    Project.objects.filter(pk__in=tasks.values('project_id')).update(**changes)
+
+@receiver(post_save, sender=TaskLog)
+def record_task_log_activity(sender, instance, created, **kwargs):
+    if created:
+        activity = {'last_activity_at': instance.created_at, 'updated_at': timezone.now()}
+        Task.objects.filter(pk=instance.task_id).update(**activity)
+        _task_project(instance.task_id).update(**activity)
+
+@receiver(post_save, sender=ProjectLog)
+def record_project_log_activity(sender, instance, created, **kwargs):
+    if created:
+        Project.objects.filter(pk=instance.project_id).update(
+            last_activity_at=instance.created_at, updated_at=timezone.now()
+        )
+
+@receiver(post_save, sender=Task)
+def count_saved_task(sender, instance, created, **kwargs):
+    now = timezone.now()
+    previous_project_id = getattr(instance, '_previous_project_id', None)
+    if created:
+        Project.objects.filter(pk=instance.project_id).update(
+            task_count=F('task_count') + 1, last_activity_at=instance.created_at, updated_at=now
+        )
+    elif previous_project_id is not None and previous_project_id != instance.project_id:
+        # The task takes its comments along to the new project
+        Project.objects.filter(pk=previous_project_id).update(
+            task_count=F('task_count') - 1,
+            comment_count=F('comment_count') - instance.comment_count,
+            updated_at=now
+        )
+        Project.objects.filter(pk=instance.project_id).update(
+            task_count=F('task_count') + 1,
+            comment_count=F('comment_count') + instance.comment_count,
+            last_activity_at=now,
+            updated_at=now
+        )
+
+@receiver(post_delete, sender=Task)
+def remove_task_activity(sender, instance, origin=None, **kwargs):
+    if _origin_model(origin) is Project:
+        return
+    Project.objects.filter(pk=instance.project_id).update(
+        task_count=F('task_count') - 1,
+        comment_count=F('comment_count') - instance.comment_count,
+        updated_at=timezone.now()
+    )
+
+@receiver(tasks_bulk_saved, sender=Task)
+def record_bulk_task_activity(sender, instances, created, **kwargs):
+    # Bulk writes log every task, so every task and project saw activity.
+    # Projects gaining the same number of tasks share one update.
+    now = timezone.now()
+    if created:
+        by_count = defaultdict(list)
+        for project_id, count in Counter(task.project_id for task in instances).items():
+            by_count[count].append(project_id)
+        for count, project_ids in by_count.items():
+            Project.objects.filter(pk__in=project_ids).update(
+                task_count=F('task_count') + count, last_activity_at=now, updated_at=now
+            )
+    else:
+        Task.objects.filter(pk__in=[task.pk for task in instances]).update(last_activity_at=now)
+        Project.objects.filter(pk__in={task.project_id for task in instances}).update(
+            last_activity_at=now, updated_at=now
+        )
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_task_lists(sender, instance, origin=None, **kwargs):
+    # Deleting a project invalidates its members' lists itself
+    if _origin_model(origin) is Project:
+        return
+    invalidate_project_lists({instance.project_id, getattr(instance, '_previous_project_id', None)})
+
+@receiver(tasks_bulk_saved, sender=Task)
+def invalidate_bulk_task_lists(sender, instances, **kwargs):
+    invalidate_project_lists({task.project_id for task in instances})
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_lists(sender, instance, origin=None, **kwargs):
+    tasks = _surviving_task(instance, origin)
+    if tasks is None:
+        return
+    invalidate_project_lists(tasks.values_list('project_id', flat=True))
@@ -1,4 +1,5 @@
 from rest_framework import permissions
+from projects.permissions import is_project_member, is_project_manager
 
 class IsTaskManagerOrAssignee(permissions.BasePermission):
     """
@@ -7,11 +8,11 @@ class IsTaskManagerOrAssignee(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         # Read permissions are allowed to project members
         if request.method in permissions.SAFE_METHODS:
-            return obj.project.is_member(request.user)
+            return is_project_member(request, obj.project_id)
 
         # Write permissions are only allowed to the project manager or task assignee
-        return (obj.project.manager == request.user or 
-                obj.assigned_to == request.user)
+        return (is_project_manager(request, obj.project_id) or
+                obj.assigned_to_id == request.user.id)
 
 class IsProjectMemberForTask(permissions.BasePermission):
     """
@@ -19,19 +20,15 @@ class IsProjectMemberForTask(permissions.BasePermission):
     """
     def has_permission(self, request, view):
         if request.method == 'POST':
-            project_id = request.data.get('project')
-            if not project_id:
-                return False
-            from projects.models import Project
             try:
-                project = Project.objects.get(id=project_id)
-                return project.is_member(request.user)
-            except Project.DoesNotExist:
+                project_id = int(request.data.get('project'))
+            except (TypeError, ValueError):
                 return False
+            return is_project_member(request, project_id)
         return True
 
     def has_object_permission(self, request, view, obj):
-        return obj.project.is_member(request.user)
+        return is_project_member(request, obj.project_id)
 
 class CanCommentOnTask(permissions.BasePermission):
     """
@@ -41,9 +38,8 @@ class CanCommentOnTask(permissions.BasePermission):
         task_id = view.kwargs.get('task_id')
         if task_id:
             from .models import Task
-            try:
-                task = Task.objects.get(id=task_id)
-                return task.project.is_member(request.user)
-            except Task.DoesNotExist:
+            project_id = Task.objects.filter(id=task_id).values_list('project_id', flat=True).first()
+            if project_id is None:
                 return False
-        return True 
\ No newline at end of file
+            return is_project_member(request, project_id)
+        return True
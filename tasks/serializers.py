@@ -2,8 +2,9 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Task, Comment, TaskLog
 from projects.serializers import ProjectMemberSerializer
+from project_management.serializers import DynamicFieldsMixin
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = ProjectMemberSerializer(read_only=True)
 
     class Meta:
@@ -15,7 +16,7 @@ class CommentSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
-class TaskLogSerializer(serializers.ModelSerializer):
+class TaskLogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user = ProjectMemberSerializer(read_only=True)
 
     class Meta:
@@ -23,7 +24,10 @@ class TaskLogSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'action', 'details', 'created_at']
         read_only_fields = ['user']
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    # Rendered only when requested with ?expand=
+    expandable_fields = ('comments', 'logs')
+
     assigned_to = ProjectMemberSerializer(read_only=True)
     comments = CommentSerializer(many=True, read_only=True)
     logs = TaskLogSerializer(many=True, read_only=True)
@@ -34,9 +38,10 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'description', 'project', 'assigned_to',
             'assigned_to_id', 'status', 'due_date', 'is_pinned',
-            'created_at', 'updated_at', 'comments', 'logs'
+            'created_at', 'updated_at', 'comment_count', 'last_activity_at',
+            'comments', 'logs'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at', 'comment_count', 'last_activity_at']
 
     def create(self, validated_data):
         assigned_to_id = validated_data.pop('assigned_to_id')
@@ -74,4 +79,22 @@ class TaskSerializer(serializers.ModelSerializer):
             details=f'Task "{instance.title}" was updated'
         )
         
-        return instance 
\ No newline at end of file
+        return instance
+
+class TaskBulkSerializer(serializers.ModelSerializer):
+    """
+    Flat task representation used by the bulk endpoint. Relations are plain
+    ids, so validating a batch runs no queries; the view checks projects,
+    assignees and permissions for the whole batch at once.
+    """
+    id = serializers.IntegerField(required=False)
+    project = serializers.IntegerField(source='project_id')
+    assigned_to_id = serializers.IntegerField()
+
+    class Meta:
+        model = Task
+        fields = [
+            'id', 'title', 'description', 'project', 'assigned_to_id',
+            'status', 'due_date', 'is_pinned', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['created_at', 'updated_at']
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Sent after tasks are written with bulk_create/bulk_update, which don't
+# send post_save. Receivers get `instances` (with `project` loaded) and
+# `created`, and should do in batches what their post_save handler does
+# for a single task.
+tasks_bulk_saved = Signal()
@@ -1,11 +1,18 @@
+import io
+import time
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.utils.http import http_date
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework import status
 from datetime import date
 from projects.models import Project
-from .models import Task, Comment
+from notifications.models import Notification
+from .models import Task, Comment, TaskLog
 
 class TaskTests(TestCase):
     def setUp(self):
@@ -137,4 +144,422 @@ class TaskTests(TestCase):
         self.client.force_authenticate(user=self.member)
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        self.assertEqual(Comment.objects.count(), 0) 
\ No newline at end of file
+        self.assertEqual(Comment.objects.count(), 0) 
+
+    def test_permission_checks_use_cached_roles(self):
+        """Test permission checks don't scale with the number of project members"""
+        self.client.force_authenticate(user=self.member)
+        url = reverse('task-detail', args=[self.task.id])
+
+        with CaptureQueriesContext(connection) as baseline:
+            self.client.get(url)
+
+        self.project.members.add(*[
+            User.objects.create(username=f'user{i}') for i in range(20)
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), len(baseline))
+        for query in queries:
+            self.assertNotIn('projects_project_members', query['sql'])
+
+    def test_task_cursor_pagination(self):
+        """Test keyset pagination follows the pinned-first ordering"""
+        for i in range(12):
+            Task.objects.create(
+                title=f'Task {i}',
+                description='Description',
+                project=self.project,
+                assigned_to=self.member,
+                due_date=date(2024, 12, 31),
+                is_pinned=i % 4 == 0
+            )
+        expected = list(Task.objects.order_by('-is_pinned', '-created_at', 'id').values_list('id', flat=True))
+
+        self.client.force_authenticate(user=self.member)
+        url = reverse('task-list') + '?cursor='
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_bulk_create_tasks(self):
+        """Test creating many tasks in one request with per-item errors"""
+        self.client.force_authenticate(user=self.manager)
+        url = reverse('task-bulk')
+        other_project = Project.objects.create(
+            title='Other Project',
+            description='Not managed by the manager',
+            manager=self.other_user,
+            start_date=date.today(),
+            end_date=date(2024, 12, 31)
+        )
+
+        def item(i, **overrides):
+            data = {
+                'title': f'Bulk Task {i}',
+                'description': 'Imported',
+                'project': self.project.id,
+                'assigned_to_id': self.member.id,
+                'due_date': '2024-12-31'
+            }
+            data.update(overrides)
+            return data
+
+        with CaptureQueriesContext(connection) as small:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, [item(0)], format='json')
+        with CaptureQueriesContext(connection) as large:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, [item(i) for i in range(1, 51)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Only the notification insert is split, in batches of SQLite's
+        # bound parameter limit
+        def notification_inserts(queries):
+            return len([q for q in queries if q['sql'].startswith('INSERT INTO "notifications_notification"')])
+        batch_size = connection.ops.bulk_batch_size(
+            [field for field in Notification._meta.concrete_fields if not field.primary_key], [None] * 100
+        )
+        self.assertEqual(notification_inserts(large), -(-100 // batch_size))
+        self.assertEqual(len(large) - notification_inserts(large), len(small) - notification_inserts(small))
+        self.assertEqual(Task.objects.filter(title__startswith='Bulk Task').count(), 51)
+        self.assertEqual(TaskLog.objects.filter(task__title__startswith='Bulk Task').count(), 51)
+        self.assertEqual(
+            Notification.objects.filter(recipient=self.member, notification_type='task_assigned').count(),
+            51
+        )
+
+        response = self.client.post(url, [
+            item(100),
+            item(101, project=other_project.id),
+            item(102, assigned_to_id=999999),
+            item(103, due_date='not a date'),
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            [201, 403, 400, 400]
+        )
+        self.assertFalse(Task.objects.filter(title='Bulk Task 101').exists())
+
+    def test_bulk_update_tasks(self):
+        """Test transitioning many tasks in one request"""
+        tasks = [
+            Task.objects.create(
+                title=f'Task {i}',
+                description='Description',
+                project=self.project,
+                assigned_to=self.manager,
+                due_date=date(2024, 12, 31)
+            )
+            for i in range(3)
+        ]
+        url = reverse('task-bulk')
+
+        # The member is neither manager nor assignee of the new tasks
+        self.client.force_authenticate(user=self.member)
+        response = self.client.patch(url, [
+            {'id': self.task.id, 'status': 'in_progress'},
+            {'id': tasks[0].id, 'status': 'done'},
+            {'id': 999999, 'status': 'done'},
+            # Not task 1, even though True == 1 in Python
+            {'id': True, 'status': 'done'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([result['status'] for result in response.data['results']], [200, 403, 404, 404])
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, 'in_progress')
+
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.patch(url, [
+            {'id': task.id, 'status': 'done', 'is_pinned': True} for task in tasks
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Task.objects.filter(status='done', is_pinned=True).count(), 3)
+        self.assertEqual(TaskLog.objects.filter(action='updated').count(), 4)
+
+    def test_project_stats(self):
+        """Test dashboard counters follow task saves, deletes and rebuilds"""
+        url = reverse('project-stats', args=[self.project.id])
+        self.client.force_authenticate(user=self.member)
+
+        def stats():
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return response.data
+
+        overdue = Task.objects.create(
+            title='Overdue Task',
+            description='Description',
+            project=self.project,
+            assigned_to=self.manager,
+            due_date=date(2000, 1, 1),
+            is_pinned=True
+        )
+        data = stats()
+        self.assertEqual(data['task_count'], 2)
+        self.assertEqual(data['status'], {'todo': 2, 'in_progress': 0, 'done': 0})
+        self.assertEqual(data['pinned'], 1)
+        # Both tasks are due in the past
+        self.assertEqual(data['overdue'], 2)
+
+        # Status transition and reassignment through the API
+        self.client.patch(reverse('task-detail', args=[self.task.id]), {'status': 'done'}, format='json')
+        overdue.assigned_to = self.member
+        overdue.status = 'in_progress'
+        overdue.save()
+        data = stats()
+        self.assertEqual(data['status'], {'todo': 0, 'in_progress': 1, 'done': 1})
+        self.assertEqual(data['overdue'], 1)
+        self.assertEqual(
+            [(row['username'], row['task_count'], row['open_count']) for row in data['assignees']],
+            [('member', 2, 1)]
+        )
+
+        # Bulk transitions and deletes
+        self.client.force_authenticate(user=self.manager)
+        self.client.patch(reverse('task-bulk'), [{'id': overdue.id, 'status': 'done'}], format='json')
+        self.task.delete()
+        self.client.force_authenticate(user=self.member)
+        data = stats()
+        self.assertEqual(data['task_count'], 1)
+        self.assertEqual(data['status'], {'todo': 0, 'in_progress': 0, 'done': 1})
+        self.assertEqual(data['overdue'], 0)
+
+        # Rebuilding from scratch gives the same answer
+        call_command('rebuild_project_stats', stdout=io.StringIO())
+        self.assertEqual(stats(), data)
+
+    def test_activity_counters(self):
+        """Test comment, task and activity counters follow writes and rebuilds"""
+        def counters():
+            self.project.refresh_from_db()
+            self.task.refresh_from_db()
+            return (self.project.task_count, self.project.comment_count, self.task.comment_count)
+
+        self.assertEqual(counters(), (1, 0, 0))
+        stale_task = Task.objects.get(pk=self.task.pk)
+        self.client.force_authenticate(user=self.member)
+        comments_url = reverse('task-comments', args=[self.task.id])
+        for content in ('First', 'Second'):
+            self.client.post(comments_url, {'content': content}, format='json')
+        other = Task.objects.create(
+            title='Other Task',
+            description='Description',
+            project=self.project,
+            assigned_to=self.member,
+            due_date=date(2024, 12, 31)
+        )
+        comment = Comment.objects.create(task=other, user=self.member, content='Third')
+        self.assertEqual(counters(), (2, 3, 2))
+        self.assertEqual(self.task.last_activity_at, self.task.comments.latest('created_at').created_at)
+        self.assertEqual(self.project.last_activity_at, comment.created_at)
+
+        # Saving an instance loaded before the comments keeps the counters
+        stale_task.status = 'done'
+        stale_task.save()
+        self.assertEqual(counters(), (2, 3, 2))
+
+        self.task.comments.first().delete()
+        self.assertEqual(counters(), (2, 2, 1))
+        other.delete()
+        self.assertEqual(counters(), (1, 1, 1))
+
+        self.client.force_authenticate(user=self.manager)
+        self.client.post(reverse('task-bulk'), [
+            {'title': f'Bulk {i}', 'description': 'Description', 'project': self.project.id,
+             'assigned_to_id': self.member.id, 'due_date': '2024-12-31'}
+            for i in range(3)
+        ], format='json')
+        self.assertEqual(counters(), (4, 1, 1))
+
+        response = self.client.get(reverse('project-list'))
+        self.assertEqual(response.data['results'][0]['task_count'], 4)
+        self.assertEqual(response.data['results'][0]['comment_count'], 1)
+        response = self.client.get(reverse('task-list'), {'fields': 'id,comment_count'})
+        self.assertEqual(
+            {item['id']: item['comment_count'] for item in response.data['results']}[self.task.id], 1
+        )
+
+        # Rebuilding from scratch gives the same counters
+        Project.objects.update(task_count=0, comment_count=0)
+        Task.objects.update(comment_count=0)
+        call_command('rebuild_activity_counters', stdout=io.StringIO())
+        self.assertEqual(counters(), (4, 1, 1))
+        self.assertEqual(self.task.last_activity_at, self.task.comments.get().created_at)
+
+    def test_activity_counters_follow_cascades_and_moves(self):
+        """Test counters follow user deletions and tasks moved from stale instances"""
+        def counts(instance):
+            instance.refresh_from_db()
+            return (instance.task_count, instance.comment_count) if isinstance(instance, Project) else instance.comment_count
+
+        # Deleting a user removes their comments and the tasks assigned to them
+        self.project.members.add(self.other_user)
+        Comment.objects.create(task=self.task, user=self.member, content='Kept')
+        Comment.objects.create(task=self.task, user=self.other_user, content='Removed')
+        Comment.objects.create(task=self.task, user=self.other_user, content='Removed too')
+        assigned = Task.objects.create(
+            title='Assigned Task',
+            description='Description',
+            project=self.project,
+            assigned_to=self.other_user,
+            due_date=date(2024, 12, 31)
+        )
+        Comment.objects.create(task=assigned, user=self.member, content='Removed with the task')
+        Comment.objects.create(task=assigned, user=self.other_user, content='Removed with the task')
+        self.assertEqual(counts(self.project), (2, 5))
+        self.other_user.delete()
+        self.assertEqual(counts(self.task), 1)
+        self.assertEqual(counts(self.project), (1, 1))
+
+        # A task loaded before its comments moves them all to the new project
+        stale_task = Task.objects.get(pk=self.task.pk)
+        Comment.objects.create(task=self.task, user=self.member, content='Posted later')
+        target = Project.objects.create(
+            title='Target Project',
+            description='Description',
+            manager=self.manager,
+            start_date=date.today(),
+            end_date=date(2024, 12, 31)
+        )
+        stale_task.project = target
+        stale_task.save()
+        self.assertEqual(stale_task.comment_count, 2)
+        self.assertEqual(counts(target), (1, 2))
+        self.assertEqual(counts(self.project), (0, 0))
+        self.assertEqual(counts(self.task), 2)
+
+    def test_conditional_get(self):
+        """Test task ETags answer 304 until the task or its comments change"""
+        self.client.force_authenticate(user=self.member)
+        detail_url = reverse('task-detail', args=[self.task.id])
+        list_url = reverse('task-list')
+
+        response = self.client.get(detail_url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        # Nothing below the task lookup runs, comments and logs are not loaded
+        self.assertFalse(any('tasks_comment' in query['sql'] for query in queries))
+
+        response = self.client.get(detail_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        list_etag = self.client.get(list_url)['ETag']
+        self.assertEqual(self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        filtered = self.client.get(f'{list_url}?status=done', HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(filtered.status_code, status.HTTP_200_OK)
+
+        # A new comment is part of the task representation
+        self.client.post(reverse('task-comments', args=[self.task.id]), {'content': 'New'}, format='json')
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_conditional_get_after_delete(self):
+        """Test deleting an older task invalidates the list validators"""
+        self.client.force_authenticate(user=self.manager)
+        older, _ = [
+            Task.objects.create(
+                title=f'Task {i}',
+                description='Description',
+                project=self.project,
+                assigned_to=self.member,
+                due_date=date(2024, 12, 31)
+            )
+            for i in range(2)
+        ]
+        list_url = reverse('task-list')
+        response = self.client.get(list_url)
+        etag = response['ETag']
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        self.client.delete(reverse('task-detail', args=[older.id]))
+        # The newest task is untouched, the list still changed
+        response = self.client.get(list_url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(older.id, [task['id'] for task in response.data['results']])
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_sparse_fields_and_expand(self):
+        """Test ?fields= trims tasks and relations are only loaded with ?expand="""
+        Comment.objects.create(task=self.task, user=self.manager, content='Comment')
+        TaskLog.objects.create(task=self.task, user=self.manager, action='created', details='')
+        self.client.force_authenticate(user=self.member)
+        url = reverse('task-detail', args=[self.task.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertNotIn('comments', response.data)
+        self.assertNotIn('logs', response.data)
+        self.assertEqual(response.data['assigned_to']['username'], 'member')
+        self.assertFalse(any('tasks_comment' in query['sql'] or 'tasks_tasklog' in query['sql'] for query in queries))
+
+        response = self.client.get(f'{reverse("task-list")}?fields=id,title,status')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'status'})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'{url}?fields=id&expand=comments')
+        self.assertEqual(set(response.data), {'id', 'comments'})
+        self.assertEqual(response.data['comments'][0]['user']['username'], 'manager')
+        self.assertFalse(any('tasks_tasklog' in query['sql'] for query in queries))
+        self.assertFalse(any('auth_user' in query['sql'] and 'assigned_to' in query['sql'] for query in queries))
+
+        # Writes keep their input fields whatever ?fields= says
+        response = self.client.patch(f'{url}?fields=id', {'status': 'done'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Task.objects.get(pk=self.task.id).status, 'done')
+
+    def test_list_response_cache(self):
+        """Test task lists are cached per user until a write touches their projects"""
+        self.client.force_authenticate(user=self.member)
+        url = reverse('task-list')
+
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['count'], 1)
+        self.assertFalse(any('tasks_task' in query['sql'] for query in queries))
+        # The query string is part of the key
+        self.assertEqual(self.client.get(f'{url}?status=done')['X-Cache'], 'MISS')
+
+        # Another member's write invalidates this member's lists
+        self.client.force_authenticate(user=self.manager)
+        self.client.patch(reverse('task-detail', args=[self.task.id]), {'title': 'Renamed'}, format='json')
+        self.client.force_authenticate(user=self.member)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'Renamed')
+
+        # Users outside the project keep their cached lists
+        self.client.force_authenticate(user=self.other_user)
+        self.client.get(url)
+        self.client.force_authenticate(user=self.manager)
+        self.client.patch(reverse('task-bulk'), [{'id': self.task.id, 'status': 'done'}], format='json')
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.client.force_authenticate(user=self.member)
+        self.assertEqual(self.client.get(url).data['results'][0]['status'], 'done')
+
+        # Joining a project changes which tasks are visible
+        self.project.members.add(self.other_user)
+        self.client.force_authenticate(user=self.other_user)
+        self.assertEqual(self.client.get(url).data['count'], 1)
+
+        staff = User.objects.create_user(username='staff', password='staff123', is_staff=True)
+        self.client.force_authenticate(user=staff)
+        response = self.client.get(reverse('cache-stats'))
+        self.assertGreater(response.data['TaskViewSet']['hits'], 0)
@@ -1,9 +1,24 @@
-from rest_framework import viewsets, generics, filters
+from rest_framework import viewsets, generics, filters, permissions, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Task, Comment
-from .serializers import TaskSerializer, CommentSerializer
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from .models import Task, Comment, TaskLog
+from .serializers import TaskSerializer, CommentSerializer, TaskBulkSerializer
 from .permissions import IsTaskManagerOrAssignee, IsProjectMemberForTask, CanCommentOnTask
+from .signals import tasks_bulk_saved
 from django_filters import rest_framework as django_filters
+from projects.models import Project, ProjectMembership
+from projects.permissions import is_project_member, is_project_manager
+from search.filters import FullTextSearchFilter
+from project_management.conditional import ConditionalGetMixin
+from project_management.response_cache import ProjectCachedListMixin
+
+def is_task_id(value):
+    # JSON true and false are ints to Python, but never task ids
+    return isinstance(value, int) and not isinstance(value, bool)
 
 class TaskFilter(django_filters.FilterSet):
     due_date_before = django_filters.DateFilter(field_name='due_date', lookup_expr='lte')
@@ -18,14 +33,19 @@ class TaskFilter(django_filters.FilterSet):
             'is_pinned': ['exact'],
         }
 
-class TaskViewSet(viewsets.ModelViewSet):
+class TaskViewSet(ProjectCachedListMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = TaskSerializer
     permission_classes = [IsTaskManagerOrAssignee]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_class = TaskFilter
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'due_date', 'is_pinned']
     ordering = ['-is_pinned', '-created_at']
+    cursor_ordering = ('-is_pinned', '-created_at', 'id')
+    MAX_BULK_SIZE = 500
+
+    def get_list_project_ids(self, user):
+        return ProjectMembership.project_ids_for(user).values_list('project_id', flat=True)
 
     def get_queryset(self):
         """
@@ -33,19 +53,200 @@ class TaskViewSet(viewsets.ModelViewSet):
         for projects the user is a member of.
         """
         user = self.request.user
-        return Task.objects.filter(
-            project__in=user.managed_projects.all() |
-            user.member_projects.all()
-        ).distinct()
+        queryset = Task.objects.filter(
+            project_id__in=ProjectMembership.project_ids_for(user)
+        )
+
+        # Only load the relations the response renders
+        if self.action in ('list', 'retrieve'):
+            serializer_class = self.get_serializer_class()
+            if serializer_class.wants(self.request, 'assigned_to'):
+                queryset = queryset.select_related('assigned_to')
+            for relation in ('comments', 'logs'):
+                if serializer_class.wants(self.request, relation):
+                    queryset = queryset.prefetch_related(f'{relation}__user')
+        return queryset
+
+    def get_object_validators(self, obj):
+        parts, last_modified = super().get_object_validators(obj)
+        if self.get_serializer_class().wants(self.request, 'logs'):
+            # compact_history prunes the oldest logs without touching the
+            # task, the prefetched logs tell the representations apart
+            logs = obj.logs.all()
+            parts.append([len(logs), min((log.pk for log in logs), default=None)])
+            last_modified = None
+        return parts, last_modified
+
+    @action(detail=False, methods=['post', 'patch'], url_path='bulk',
+            permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        """
+        Create (POST) or update (PATCH) a list of tasks in one request.
+
+        Every item is validated and permission checked up front, the valid
+        ones are written with bulk_create/bulk_update in a single transaction
+        and the response reports the outcome of each item by position.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'detail': 'Expected a non-empty list of tasks.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.MAX_BULK_SIZE:
+            return Response(
+                {'detail': f'At most {self.MAX_BULK_SIZE} tasks can be sent at once.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if request.method == 'POST':
+            results, success_status = self.bulk_create_tasks(items), status.HTTP_201_CREATED
+        else:
+            results, success_status = self.bulk_update_tasks(items), status.HTTP_200_OK
+
+        succeeded = sum(1 for result in results if result['status'] == success_status)
+        if succeeded == len(results):
+            response_status = success_status
+        elif succeeded:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=response_status)
+
+    def bulk_create_tasks(self, items):
+        results = [None] * len(items)
+        valid = []
+        for index, item in enumerate(items):
+            serializer = TaskBulkSerializer(data=item)
+            if serializer.is_valid():
+                serializer.validated_data.pop('id', None)
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors}
+
+        users = self.existing_user_ids(data['assigned_to_id'] for _, data in valid)
+        projects = Project.objects.only('id', 'title', 'manager_id').in_bulk(
+            {data['project_id'] for _, data in valid}
+        )
+
+        created = []
+        for index, data in valid:
+            if not is_project_member(self.request, data['project_id']):
+                results[index] = {
+                    'status': status.HTTP_403_FORBIDDEN,
+                    'errors': {'project': ['You are not a member of this project.']}
+                }
+            elif data['assigned_to_id'] not in users:
+                results[index] = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': {'assigned_to_id': ['User not found.']}
+                }
+            else:
+                task = Task(**data)
+                task.project = projects[data['project_id']]
+                created.append((index, task))
+
+        tasks = [task for _, task in created]
+        with transaction.atomic():
+            Task.objects.bulk_create(tasks)
+            self.write_logs(tasks, 'created')
+            tasks_bulk_saved.send(sender=Task, instances=tasks, created=True)
+
+        for index, task in created:
+            results[index] = {'status': status.HTTP_201_CREATED, 'data': TaskBulkSerializer(task).data}
+        return results
+
+    def bulk_update_tasks(self, items):
+        results = [None] * len(items)
+        ids = [item.get('id') for item in items if isinstance(item, dict)]
+        tasks = self.get_queryset().select_related('project').in_bulk(
+            [pk for pk in ids if is_task_id(pk)]
+        )
+
+        valid = []
+        seen = set()
+        for index, item in enumerate(items):
+            pk = item.get('id') if isinstance(item, dict) else None
+            task = tasks.get(pk) if is_task_id(pk) else None
+            serializer = TaskBulkSerializer(task, data=item, partial=True)
+            if task is None:
+                results[index] = {'status': status.HTTP_404_NOT_FOUND, 'errors': {'id': ['Task not found.']}}
+            elif pk in seen:
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': {'id': ['Duplicate task in batch.']}}
+            elif not serializer.is_valid():
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors}
+            elif not (is_project_manager(self.request, task.project_id) or
+                      task.assigned_to_id == self.request.user.id):
+                results[index] = {
+                    'status': status.HTTP_403_FORBIDDEN,
+                    'errors': {'detail': ['You do not have permission to perform this action.']}
+                }
+            elif serializer.validated_data.get('project_id', task.project_id) != task.project_id:
+                results[index] = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': {'project': ['Tasks can not be moved between projects in bulk.']}
+                }
+            else:
+                data = serializer.validated_data
+                data.pop('id', None)
+                data.pop('project_id', None)
+                valid.append((index, task, data))
+            seen.add(pk)
+
+        users = self.existing_user_ids(
+            data['assigned_to_id'] for _, _, data in valid if 'assigned_to_id' in data
+        )
+
+        updated = []
+        fields = {'updated_at'}
+        now = timezone.now()
+        for index, task, data in valid:
+            if 'assigned_to_id' in data and data['assigned_to_id'] not in users:
+                results[index] = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'errors': {'assigned_to_id': ['User not found.']}
+                }
+                continue
+            for attr, value in data.items():
+                setattr(task, attr, value)
+            task.updated_at = now
+            fields.update(data)
+            updated.append((index, task))
+
+        tasks = [task for _, task in updated]
+        with transaction.atomic():
+            Task.objects.bulk_update(tasks, sorted(fields))
+            self.write_logs(tasks, 'updated')
+            tasks_bulk_saved.send(sender=Task, instances=tasks, created=False)
+
+        for index, task in updated:
+            results[index] = {'status': status.HTTP_200_OK, 'data': TaskBulkSerializer(task).data}
+        return results
+
+    def existing_user_ids(self, user_ids):
+        return set(User.objects.filter(id__in=set(user_ids)).values_list('id', flat=True))
+
+    def write_logs(self, tasks, action):
+        TaskLog.objects.bulk_create([
+            TaskLog(
+                task=task,
+                user=self.request.user,
+                action=action,
+                details=f'Task "{task.title}" was {action}'
+            )
+            for task in tasks
+        ])
 
-class CommentListCreateView(generics.ListCreateAPIView):
+class CommentListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = CommentSerializer
     permission_classes = [CanCommentOnTask]
-    filter_backends = [filters.OrderingFilter]
+    filter_backends = [filters.OrderingFilter, FullTextSearchFilter]
+    search_fields = ['content']
     ordering = ['-created_at']
+    cursor_ordering = ('-created_at', 'id')
 
     def get_queryset(self):
-        return Comment.objects.filter(task_id=self.kwargs['task_id'])
+        queryset = Comment.objects.filter(task_id=self.kwargs['task_id'])
+        if CommentSerializer.wants(self.request, 'user'):
+            queryset = queryset.select_related('user')
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(
@@ -53,7 +254,7 @@ class CommentListCreateView(generics.ListCreateAPIView):
             user=self.request.user
         )
 
-class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CommentDetailView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CommentSerializer
     permission_classes = [CanCommentOnTask]
 